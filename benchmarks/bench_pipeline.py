@@ -0,0 +1,230 @@
+"""End-to-end benchmark of the analysis pipeline on generated receipts.
+
+Times every stage from loading receipts to rendering the dashboard and
+records its peak traced memory. Categorization runs against a stub model
+that answers instantly and deterministically, and every run starts with an
+empty category cache, so results only change when the code does:
+
+    python benchmarks/bench_pipeline.py --scale 100k
+    python benchmarks/bench_pipeline.py --receipts 20000 --output bench.json
+    python benchmarks/bench_pipeline.py --scale 100k --baseline bench.json
+
+With --baseline the run fails when a stage got slower or used more memory
+than the saved results by more than --tolerance. Charts render in worker
+processes, so their memory is not included in the save_report peak.
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from categorizer import ProductCategorizer  # noqa: E402
+from dashboard import generate_dashboard_html  # noqa: E402
+from generate_receipts import SCALES, write_receipts  # noqa: E402
+from local_categorizer import parse_prompt_categories  # noqa: E402
+from main import AHReceiptAnalyzer  # noqa: E402
+from prompt_template import PromptTemplate  # noqa: E402
+from receipt_archive import is_archive, read_table  # noqa: E402
+from receipt_io import load_receipts  # noqa: E402
+
+METRICS = ('total_spending', 'average_transaction', 'most_bought_items', 'bonus_savings',
+           'spending_by_day', 'categorize_products')
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Stands in for the Gemini model: assigns each product a category derived from its name"""
+
+    def __init__(self, header, categories):
+        self.header = header
+        self.categories = categories
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None):
+        self.calls += 1
+        products = [line for line in prompt[len(self.header):].split('\n') if line.strip()]
+        answer = [{"product_name": product,
+                   "category": self.categories[zlib.crc32(product.encode('utf-8')) % len(self.categories)]}
+                  for product in products]
+        return StubResponse(json.dumps(answer))
+
+
+class StageTimer:
+    """Wall time and peak traced memory of each pipeline stage"""
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.results = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - baseline if self.trace_memory else None
+        self.results[name] = {'seconds': elapsed, 'peak_bytes': peak}
+
+
+def run_pipeline(receipts_file, work_dir, trace_memory=True, charts=None):
+    """Run every stage once in work_dir; returns {stage: {seconds, peak_bytes}} and the stub's call count"""
+    timer = StageTimer(trace_memory)
+    # Streaming mode skips loading in the constructor, so loading and parsing are timed separately
+    categorizer = ProductCategorizer(cache_dir=str(work_dir / 'category_cache'))
+    template = PromptTemplate.from_file('prompt.txt')
+    categorizer.model = StubModel(template.header, sorted(set(parse_prompt_categories(template.instructions))))
+    analyzer = AHReceiptAnalyzer(receipts_file, categorizer, stream=True)
+
+    if is_archive(receipts_file):
+        with timer.stage('read_table'):
+            analyzer.table = read_table(receipts_file)
+    else:
+        with timer.stage('load_receipts'):
+            analyzer.data = load_receipts(receipts_file)
+        with timer.stage('process_data'):
+            analyzer.process_data()
+    with timer.stage('scan'):
+        analyzer.get_report().scan()
+    for metric in METRICS:
+        with timer.stage(metric):
+            getattr(analyzer, metric)()
+    output_dir = work_dir / 'analysis_output'
+    with timer.stage('save_report'):
+        analyzer.save_report(str(output_dir), charts)
+    with open(output_dir / 'analysis_report.json', 'r', encoding='utf-8') as f:
+        report = json.load(f)
+    with timer.stage('generate_dashboard_html'):
+        generate_dashboard_html(report)
+    return timer.results, categorizer.model.calls
+
+
+def benchmark(receipts_file, repeat, trace_memory=True, charts=None):
+    """Best time and largest peak of each stage over `repeat` fresh runs"""
+    receipts_file = str(Path(receipts_file).resolve())
+    best = {}
+    calls = 0
+    cwd = os.getcwd()
+    if trace_memory:
+        tracemalloc.start()
+        # Chart workers are forked from this process; tracing would slow them down without being reported
+        os.register_at_fork(after_in_child=tracemalloc.stop)
+    try:
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as tmp:
+                work_dir = Path(tmp)
+                # The analyzer reads prompt.txt and writes analysis_output/ relative to the working directory
+                shutil.copy(REPO_ROOT / 'prompt.txt', work_dir / 'prompt.txt')
+                os.chdir(work_dir)
+                try:
+                    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                        results, calls = run_pipeline(receipts_file, work_dir, trace_memory, charts)
+                finally:
+                    os.chdir(cwd)
+            for stage, result in results.items():
+                if stage not in best:
+                    best[stage] = result
+                    continue
+                best[stage] = {
+                    'seconds': min(best[stage]['seconds'], result['seconds']),
+                    'peak_bytes': result['peak_bytes'] if not trace_memory
+                    else max(best[stage]['peak_bytes'], result['peak_bytes']),
+                }
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return best, calls
+
+
+def compare(results, baseline, tolerance):
+    """Stages that got slower or used more memory than the baseline by more than tolerance"""
+    regressions = []
+    for stage, result in results.items():
+        before = baseline.get(stage)
+        if before is None:
+            continue
+        for key in ('seconds', 'peak_bytes'):
+            # Tiny stages are dominated by noise, so they get a fixed allowance on top of the tolerance
+            slack = 0.005 if key == 'seconds' else 1 << 20
+            if result[key] is not None and before.get(key) is not None \
+                    and result[key] > before[key] * (1 + tolerance) + slack:
+                regressions.append((stage, key, before[key], result[key]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the receipt analysis pipeline')
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument('--scale', choices=SCALES, default='1k', help='Preset number of generated receipts')
+    size.add_argument('--receipts', type=int, help='Exact number of generated receipts')
+    size.add_argument('--input', type=str, help='Benchmark an existing receipts file instead')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed of the generated receipts')
+    parser.add_argument('--format', choices=('json', 'jsonl', 'ahr'), default='json',
+                        help='File format of the generated receipts')
+    parser.add_argument('--repeat', type=int, default=3, help='Pipeline runs (best time is reported)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='Skip memory tracing, which slows Python-heavy stages down')
+    parser.add_argument('--no-charts', action='store_true', help='Skip chart rendering in save_report')
+    parser.add_argument('--output', type=str, help='Save the results as JSON')
+    parser.add_argument('--baseline', type=str, help='Fail on regressions against results saved with --output')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown or memory growth against the baseline (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.input:
+            receipts_file = args.input
+        else:
+            num_receipts = args.receipts if args.receipts is not None else SCALES[args.scale]
+            receipts_file = Path(tmp) / f"receipts.{args.format}"
+            start = time.perf_counter()
+            write_receipts(receipts_file, num_receipts, args.seed)
+            print(f"Generated {num_receipts} receipts ({receipts_file.stat().st_size / 1e6:.1f} MB) "
+                  f"in {time.perf_counter() - start:.1f}s")
+        charts = () if args.no_charts else None
+        results, calls = benchmark(receipts_file, args.repeat, not args.no_memory, charts)
+
+    print(f"{'stage':<26}{'best ms':>12}{'peak MB':>12}")
+    for stage, result in results.items():
+        peak = f"{result['peak_bytes'] / 1e6:>12.1f}" if result['peak_bytes'] is not None else f"{'-':>12}"
+        print(f"{stage:<26}{result['seconds'] * 1000:>12.1f}{peak}")
+    total = sum(result['seconds'] for result in results.values())
+    # ru_maxrss is in kilobytes on Linux
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+    print(f"{'total':<26}{total * 1000:>12.1f}")
+    print(f"{calls} stub LLM calls per run, max RSS {max_rss:.0f} MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'stages': results, 'llm_calls': calls, 'receipts': args.input or num_receipts,
+                       'seed': args.seed}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['stages']
+        regressions = compare(results, baseline, args.tolerance)
+        for stage, key, before, after in regressions:
+            print(f"Regression: {stage} {key} {before:.4g} -> {after:.4g}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Startup benchmark for the CLI, to catch heavy imports creeping back in.
+
+Times `import main` and `main.py --help` in fresh interpreters and checks that
+optional heavy dependencies are not imported at module level:
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --max-ms 250   # exit with status 1 if slower
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Only loaded on the code paths that use them: fetching, categorization misses, charts
+LAZY_MODULES = ('google.generativeai', 'matplotlib', 'requests', 'dotenv', 'webbrowser')
+
+
+def time_command(args, repeat):
+    """Median and best wall time in seconds of running a Python command in a fresh interpreter"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), min(times)
+
+
+def eagerly_imported():
+    """Lazy modules that `import main` loads anyway"""
+    code = ("import sys, main; "
+            f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout.strip()
+    return [module for module in output.split(',') if module]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CLI startup time')
+    parser.add_argument('--repeat', type=int, default=10, help='Interpreter launches per command')
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='Fail if the median time of `import main` exceeds this many milliseconds')
+    args = parser.parse_args()
+
+    results = [
+        ("python", time_command(['-c', 'pass'], args.repeat)),
+        ("import main", time_command(['-c', 'import main'], args.repeat)),
+        ("main.py --help", time_command(['main.py', '--help'], args.repeat)),
+    ]
+    print(f"{'command':<16}{'median ms':>12}{'best ms':>12}")
+    for name, (median, best) in results:
+        print(f"{name:<16}{median * 1000:>12.1f}{best * 1000:>12.1f}")
+
+    failed = False
+    eager = eagerly_imported()
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+        failed = True
+    import_median = results[1][1][0] * 1000
+    if args.max_ms is not None and import_median > args.max_ms:
+        print(f"FAIL: `import main` took {import_median:.1f} ms, more than {args.max_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
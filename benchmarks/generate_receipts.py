@@ -0,0 +1,146 @@
+"""Seeded generator of synthetic AH receipts for benchmarks.
+
+Writes receipts in the format fetch_and_save_receipts produces, with product
+popularity following a long-tailed distribution, multi-year shopping
+patterns, BONUS and ACTIE discounts, STATIEGELD deposits and PINNEN lines:
+
+    python benchmarks/generate_receipts.py --scale 100k receipts_100k.json
+    python benchmarks/generate_receipts.py --receipts 5000 --seed 7 receipts.jsonl
+
+The same seed and size always produce the same file.
+"""
+import argparse
+import bisect
+import itertools
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from receipt_io import is_jsonl, save_receipts  # noqa: E402
+from receipt_archive import is_archive  # noqa: E402
+
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+
+# (description, price in cents, deposit in cents) of common products, most popular first
+CATALOG: List[Tuple[str, int, int]] = [
+    ('AH HALFVOLLE MELK', 119, 0), ('AH BANANEN', 189, 0), ('KOMKOMMER', 89, 0),
+    ('AH VOLKORENBROOD', 219, 0), ('AVOCADO', 149, 0), ('CHERRYTOMATEN', 199, 0),
+    ('AH SCHARRELEIEREN', 329, 0), ('JONGE KAAS 48+', 549, 0), ('AH KIPFILET', 589, 0),
+    ('AH ELSTAR APPELS', 249, 0), ('AH GEHAKT', 449, 0), ('PAPRIKA ROOD', 99, 0),
+    ('COCA-COLA ZERO 1,5L', 249, 25), ('AH MAGERE YOGHURT', 139, 0), ('AH ROOMBOTER', 299, 0),
+    ('UIEN', 129, 0), ('AH ZALMFILET', 699, 0), ('CROISSANTS', 199, 0), ('AH PINDAKAAS', 239, 0),
+    ('SPAGHETTI', 109, 0), ('HEINEKEN PILS 6X33CL', 699, 60), ('AH SPA BLAUW 1,5L', 79, 25),
+    ('AARDAPPELEN', 279, 0), ('AH KOFFIEBONEN', 599, 0), ('CHAMPIGNONS', 159, 0),
+    ('AH HUMMUS', 179, 0), ('BROCCOLI', 149, 0), ('AH GRIEKSE YOGHURT', 229, 0),
+    ('AH NAAN', 169, 0), ('CALVE PINDAKAAS', 369, 0), ('DUYVIS NOTENMIX', 329, 0),
+    ('AH TOILETPAPIER', 399, 0), ('DOVE DOUCHE', 349, 0), ('AH SINAASAPPELSAP', 229, 0),
+    ('CHIQUITA BANANEN', 229, 0), ('AH SPINAZIE', 169, 0), ('AH RUNDERGEHAKT', 499, 0),
+    ('AH ZOUTE CRACKERS', 129, 0), ('LAY\'S NATUREL', 229, 0), ('TONY CHOCOLONELY', 349, 0),
+    ('AH PASTASAUS', 159, 0), ('AH RIJST', 189, 0), ('WORTELEN', 99, 0), ('AH CITROENEN', 149, 0),
+    ('AH KIPDIJFILET', 549, 0), ('AH VLA VANILLE', 149, 0), ('GOUDA BELEGEN 48+', 629, 0),
+    ('AH WASMIDDEL', 799, 0), ('AH VAATWASTABLETTEN', 599, 0), ('CASSIS 1,5L', 229, 25),
+    ('AH APPELSAP', 169, 0), ('AH TORTILLA WRAPS', 169, 0), ('AH MOZZARELLA', 119, 0),
+    ('AH ROOKWORST', 299, 0), ('AH SLAGROOM', 149, 0), ('AH KWARK', 179, 0),
+    ('AH MUESLI', 249, 0), ('AH HAVERMOUT', 129, 0), ('AH BLAUWE BESSEN', 299, 0),
+    ('AH AARDBEIEN', 349, 0), ('AH TUINERWTEN', 99, 0), ('AH CHILI SAUS', 199, 0),
+]
+# Long tail of less common products, built from brands and product words
+BRANDS = ['AH', 'AH BIOLOGISCH', 'AH EXCELLENT', 'AH TERRA', 'JUMBO', 'UNOX', 'HONIG', 'CONIMEX',
+          'VERKADE', 'BOLLETJE', 'ALPRO', 'CAMPINA', 'OLVARIT', 'GROLSCH', 'HERTOG JAN', 'ROYCO']
+PRODUCT_WORDS = ['SOEP', 'PASTA', 'KOEKJES', 'CHIPS', 'NOTEN', 'SAUS', 'KRUIDEN', 'BOUILLON', 'DRINK',
+                 'TOETJE', 'RIJSTWAFELS', 'ONTBIJTKOEK', 'MAYONAISE', 'KETCHUP', 'BIER', 'WIJN',
+                 'THEE', 'KOFFIE', 'HAGELSLAG', 'JAM', 'KAAS', 'WORST', 'SALADE', 'PIZZA', 'PANNENKOEK']
+FLAVOURS = ['', ' NATUREL', ' TOMAAT', ' KIP', ' PAPRIKA', ' CHOCOLADE', ' AARDBEI', ' VANILLE', ' KRUIDEN']
+ACTIE_DESCRIPTIONS = ['25% KORTING', '2E HALVE PRIJS', '1+1 GRATIS', 'AH VOORDEEL']
+# Receipts are spread over this period, so a thousand receipts is about three shopping trips a week
+# and larger scales look like a busier household rather than a longer history
+START_DATE = datetime(2019, 1, 1)
+HISTORY_DAYS = 6 * 365
+
+
+def build_products(rng: random.Random) -> Tuple[List[Tuple[str, int, int]], List[float]]:
+    """All products with cumulative popularity weights (Zipf-like, common products first)"""
+    tail = []
+    for brand, word, flavour in itertools.product(BRANDS, PRODUCT_WORDS, FLAVOURS):
+        tail.append((f"{brand} {word}{flavour}", rng.randint(59, 899), 0))
+    rng.shuffle(tail)
+    products = CATALOG + tail
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(len(products))]
+    return products, list(itertools.accumulate(weights))
+
+
+def generate_receipts(num_receipts: int, seed: int = 42) -> Iterator[Dict[str, Any]]:
+    """Yield receipts in the ah_receipts.json format, ordered by day"""
+    rng = random.Random(seed)
+    products, cumulative = build_products(rng)
+    total_weight = cumulative[-1]
+    mean_gap = HISTORY_DAYS / max(1, num_receipts)
+    moment = START_DATE
+    for i in range(num_receipts):
+        moment += timedelta(days=rng.expovariate(1 / mean_gap))
+        shopped_at = moment.replace(hour=rng.randint(8, 21), minute=rng.randint(0, 59))
+        lines = []
+        for _ in range(max(1, int(rng.lognormvariate(2.3, 0.6)))):
+            description, price, deposit = products[bisect.bisect(cumulative, rng.random() * total_weight)]
+            quantity = rng.choices((1, 2, 3, 4), weights=(80, 13, 5, 2))[0]
+            amount = price * quantity
+            lines.append({"quantity": str(quantity), "description": description, "amount_cents": amount})
+            if rng.random() < 0.2:
+                discount = round(amount * rng.choice((0.25, 0.3, 0.5)))
+                lines.append({"quantity": "BONUS", "description": f"BONUS {description}"[:30],
+                              "amount_cents": -discount})
+            if deposit:
+                lines.append({"quantity": str(quantity), "description": "STATIEGELD",
+                              "amount_cents": deposit * quantity})
+        if rng.random() < 0.08:
+            lines.append({"quantity": "ACTIE", "description": rng.choice(ACTIE_DESCRIPTIONS),
+                          "amount_cents": -rng.randint(50, 300)})
+        if rng.random() < 0.05:
+            lines.append({"quantity": "1", "description": "EMBALLAGE", "amount_cents": -25 * rng.randint(1, 8)})
+        total = sum(line["amount_cents"] for line in lines)
+        lines.append({"quantity": None, "description": "PINNEN", "amount_cents": total})
+        yield {
+            "transactionId": f"AH{seed:04d}{i:010d}",
+            "date": shopped_at.strftime('%Y-%m-%d %H:%M'),
+            "amount_cents": total,
+            "products": lines,
+        }
+
+
+def write_receipts(path, num_receipts: int, seed: int = 42):
+    """Write generated receipts as .json (streamed, like the fetcher's indented output), .jsonl or .ahr"""
+    path = Path(path)
+    receipts = generate_receipts(num_receipts, seed)
+    if is_jsonl(path) or is_archive(path):
+        save_receipts(path, receipts)
+        return
+    # A JSON array written element by element, so a million receipts never sit in memory at once
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for i, receipt in enumerate(receipts):
+            f.write(',\n' if i else '\n')
+            f.write(json.dumps(receipt, indent=2, ensure_ascii=False))
+        f.write('\n]')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic AH receipts')
+    parser.add_argument('output', help='Receipts file to write (.json, .jsonl or .ahr)')
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument('--scale', choices=SCALES, default='1k', help='Preset number of receipts')
+    size.add_argument('--receipts', type=int, help='Exact number of receipts')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    num_receipts = args.receipts if args.receipts is not None else SCALES[args.scale]
+    write_receipts(args.output, num_receipts, args.seed)
+    print(f"Wrote {num_receipts} receipts to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
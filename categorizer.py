@@ -0,0 +1,327 @@
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from category_cache import CategoryCache, normalize_description
+from instrumentation import Metrics
+from local_categorizer import LocalCategorizer
+from product_index import ProductIndex
+from prompt_template import PromptTemplate, estimate_tokens
+
+# HTTP status codes worth retrying: rate limited, overloaded or briefly unavailable
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """Whether an exception from generate_content looks like a transient failure"""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    # google.api_core exceptions expose the HTTP status as .code
+    code = getattr(exc, 'code', None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+        return True
+    message = str(exc)
+    return any(marker in message for marker in ('429', 'Resource has been exhausted', 'rate limit', '503'))
+
+
+def parse_categories(response_text: str) -> List[Dict[str, Any]]:
+    """Extract the JSON array of {product_name, category} objects from a model reply"""
+    # Find the start and end of the JSON array
+    start_idx = response_text.find('[')
+    end_idx = response_text.rfind(']') + 1
+    if start_idx < 0 or end_idx <= start_idx:
+        raise ValueError("No JSON array in response")
+    items = json.loads(response_text[start_idx:end_idx])
+    if not isinstance(items, list):
+        raise ValueError("Response JSON is not an array")
+    return [item for item in items
+            if isinstance(item, dict) and 'product_name' in item and 'category' in item]
+
+
+class BatchDispatcher:
+    """Sends product batches to the model concurrently, retrying failures.
+
+    Rate limits and other transient errors are retried with exponential
+    backoff. When a reply is malformed or leaves products out, only the
+    missing products are requested again. A batch that keeps failing is
+    reported and skipped; categories from other batches are kept.
+
+    Requests, retries and tokens are recorded in `metrics`: token counts come
+    from the reply's usage metadata when the model reports it, and are
+    estimated from the prompt and reply text otherwise.
+    """
+
+    def __init__(self, model, generation_config=None, max_concurrency: int = 4,
+                 batch_size: int = 50, max_attempts: int = 5, base_delay: float = 1.0,
+                 max_delay: float = 30.0, sleep: Callable[[float], None] = time.sleep,
+                 metrics: Optional[Metrics] = None):
+        self.model = model
+        self.generation_config = generation_config
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.metrics = metrics or Metrics()
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _request(self, prompt: str) -> str:
+        """Call the model, retrying transient errors with exponential backoff"""
+        for attempt in range(self.max_attempts):
+            self.metrics.count('llm.requests')
+            try:
+                with self.metrics.timed('llm.request', attempt=attempt) as span:
+                    response = self.model.generate_content(prompt, generation_config=self.generation_config)
+                    text = response.text
+                    span.update(self._record_tokens(prompt, response, text))
+                return text
+            except Exception as e:
+                if not is_retryable_error(e) or attempt == self.max_attempts - 1:
+                    self.metrics.count('llm.errors')
+                    raise
+                self.metrics.count('llm.retries')
+                self.sleep(self._backoff(attempt))
+
+    def _record_tokens(self, prompt: str, response, text: str) -> Dict[str, int]:
+        """Count a request's prompt and reply tokens, as reported by the model or estimated"""
+        usage = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(usage, 'prompt_token_count', None)
+        reply_tokens = getattr(usage, 'candidates_token_count', None)
+        if not isinstance(prompt_tokens, int) or not isinstance(reply_tokens, int):
+            prompt_tokens, reply_tokens = estimate_tokens(prompt), estimate_tokens(text)
+            self.metrics.count('llm.estimated_token_requests')
+        self.metrics.count('llm.prompt_tokens', prompt_tokens)
+        self.metrics.count('llm.reply_tokens', reply_tokens)
+        return {'prompt_tokens': prompt_tokens, 'reply_tokens': reply_tokens}
+
+    def _run_batch(self, batch: List[str], build_prompt: Callable[[List[str]], str]) -> Dict[str, str]:
+        """Categorize one batch, re-requesting products missing from malformed replies"""
+        # Spellings differing only in case or spacing come back as one reply item
+        by_key: Dict[str, List[str]] = {}
+        for product in batch:
+            by_key.setdefault(normalize_description(product), []).append(product)
+        categories = {}
+        remaining = list(batch)
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self.metrics.count('llm.reprompts')
+            try:
+                items = parse_categories(self._request(build_prompt(remaining)))
+            except ValueError as e:
+                # json.JSONDecodeError is a ValueError too
+                print(f"Warning: Could not parse response for {len(remaining)} products: {str(e)}")
+                self.metrics.count('llm.parse_errors')
+                items = []
+            for item in items:
+                for product in by_key.get(normalize_description(str(item['product_name'])), ()):
+                    categories[product] = item['category']
+            remaining = [product for product in batch if product not in categories]
+            if not remaining:
+                break
+            if attempt < self.max_attempts - 1:
+                self.sleep(self._backoff(attempt))
+        if remaining:
+            print(f"Warning: No category returned for {len(remaining)} products after {self.max_attempts} attempts")
+            self.metrics.count('llm.uncategorized_products', len(remaining))
+        return categories
+
+    def _timed_batch(self, batch: List[str], build_prompt: Callable[[List[str]], str]) -> Dict[str, str]:
+        with self.metrics.timed('llm.batch', products=len(batch)):
+            return self._run_batch(batch, build_prompt)
+
+    def dispatch(self, products: List[str], build_prompt: Callable[[List[str]], str],
+                 on_batch: Optional[Callable[[Dict[str, str]], None]] = None,
+                 pack: Optional[Callable[[List[str]], List[List[str]]]] = None) -> Dict[str, str]:
+        """Categorize all products, calling on_batch with each finished batch's results.
+
+        pack splits the products into batches; by default each batch holds batch_size products.
+        """
+        if pack is not None:
+            batches = pack(products)
+        else:
+            batches = [products[i:i + self.batch_size] for i in range(0, len(products), self.batch_size)]
+        categories = {}
+        if not batches:
+            return categories
+        self.metrics.count('llm.batches', len(batches))
+        self.metrics.count('llm.products', len(products))
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+            futures = {executor.submit(self._timed_batch, batch, build_prompt): n
+                       for n, batch in enumerate(batches, 1)}
+            for future in as_completed(futures):
+                try:
+                    batch_categories = future.result()
+                except Exception as e:
+                    print(f"Warning: Batch {futures[future]} failed: {str(e)}")
+                    self.metrics.count('llm.failed_batches')
+                    continue
+                categories.update(batch_categories)
+                if on_batch is not None:
+                    on_batch(batch_categories)
+        return categories
+
+
+class ProductCategorizer:
+    """Maps product descriptions to categories, asking Gemini only for products not known yet.
+
+    Products are grouped into spellings of the same product, answered from
+    the category cache, then by the local categorizer, and the rest are sent
+    to Gemini in concurrent batches. The analyzer and the batch runner share
+    one instance, which also holds the product index used to combine item
+    counts per product.
+    """
+
+    MODEL_NAME = 'gemini-1.5-flash-8b'
+    DEFAULT_LLM_CONCURRENCY = 4
+
+    def __init__(self, cache_dir: str = '.category_cache', llm_concurrency: int = DEFAULT_LLM_CONCURRENCY,
+                 local_confidence: float = LocalCategorizer.DEFAULT_MIN_CONFIDENCE,
+                 dedup_products: bool = True, receipt_width: Optional[int] = None,
+                 max_prompt_tokens: int = PromptTemplate.DEFAULT_MAX_PROMPT_TOKENS,
+                 reuse_prompt_prefix: bool = False, prompt_file: str = 'prompt.txt',
+                 output_dir: str = 'analysis_output', metrics: Optional[Metrics] = None):
+        # The Gemini client is created on the first cache miss, see the model property
+        self._model = None
+        self.cache_dir = cache_dir
+        self.llm_concurrency = llm_concurrency
+        self.local_confidence = local_confidence
+        self.max_prompt_tokens = max_prompt_tokens
+        self.reuse_prompt_prefix = reuse_prompt_prefix
+        self.prompt_file = prompt_file
+        # other_category_products.txt is written here
+        self.output_dir = output_dir
+        self.metrics = metrics or Metrics()
+        # Receipt spellings, truncations and weight variants of a product share one entry
+        self.product_index = ProductIndex(receipt_width) if dedup_products else None
+
+    def _gemini(self):
+        """The google.generativeai module, configured with GEMINI_API_KEY from the environment or .env"""
+        # It takes about half a second to import, so it is only loaded on a cache miss
+        import google.generativeai as genai
+        from dotenv import load_dotenv
+        load_dotenv()
+        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+        return genai
+
+    @property
+    def model(self):
+        """Gemini model used for categorization, created on first use"""
+        if self._model is None:
+            self._model = self._gemini().GenerativeModel(self.MODEL_NAME)
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    @property
+    def canonical(self) -> Optional[Callable[[str], str]]:
+        """Maps a description to its product name, or None when products aren't deduplicated"""
+        return self.product_index.canonical if self.product_index is not None else None
+
+    def categorize(self, products: Set[str]) -> Dict[str, str]:
+        """Map product descriptions to categories, asking Gemini for the ones not cached yet"""
+        # Create prompt for Gemini
+        template = PromptTemplate.from_file(self.prompt_file, max_prompt_tokens=self.max_prompt_tokens)
+        
+        # Only products we haven't categorized with this prompt and model go to Gemini
+        cache = CategoryCache(template.instructions, self.MODEL_NAME, self.cache_dir)
+        cached_categories = cache.lookup(products, self.local_confidence)
+        categories_map = dict(cached_categories)
+        num_products = len(products)
+        
+        # Variants of a product share its category: a cached variant answers for all of them,
+        # and otherwise only the product name is categorized
+        if self.product_index is not None:
+            variants = self.product_index.group(sorted(products))
+        else:
+            variants = {product: [product] for product in products}
+        pending = {}
+        for name, members in variants.items():
+            category = next((cached_categories[member] for member in members if member in cached_categories), None)
+            if category is None:
+                pending[name] = members
+            else:
+                categories_map.update((member, category) for member in members)
+        products = set(pending)
+        # Hits include products answered by a cached spelling of the same product
+        self.metrics.count('categories.products', num_products)
+        self.metrics.count('categories.cache_hits', len(categories_map))
+        if num_products:
+            self.metrics.gauge('categories.cache_hit_rate', round(len(categories_map) / num_products, 4))
+        
+        def assign(categories):
+            for name, category in categories.items():
+                categories_map.update((member, category) for member in pending.get(name, [name]))
+        
+        # Products the local categorizer is confident about never reach Gemini; it also learns
+        # from the answers Gemini gave before. Its own results are cached too, so what it learns
+        # later can't send a product back to Gemini, but they never train it.
+        local = LocalCategorizer.from_prompt(template.instructions, self.local_confidence)
+        local.learn(cache.model_categories())
+        with self.metrics.stage('categorize_locally'):
+            local_categories = local.categorize(products)
+        products = products - local_categories.keys()
+        assign({name: category for name, (category, _) in local_categories.items()})
+        cache.update_local(local_categories)
+        self.metrics.count('categories.local', len(local_categories))
+        self.metrics.count('categories.sent_to_llm', len(products))
+        if local_categories or products:
+            print(f"Categorized {len(local_categories)} products locally, sending {len(products)} to Gemini")
+        
+        def on_batch(batch_categories):
+            # Keep every finished batch, even if a later one fails
+            assign(batch_categories)
+            cache.update(batch_categories)
+            
+        try:
+            # The Gemini client is only created when some products missed every cache
+            if products:
+                if self.reuse_prompt_prefix:
+                    # The instructions are sent as the model's system instruction, so requests only carry products
+                    model = self._gemini().GenerativeModel(self.MODEL_NAME, system_instruction=template.header)
+                    build_prompt = template.build_products
+                else:
+                    model, build_prompt = self.model, template.build
+                dispatcher = BatchDispatcher(
+                    model,
+                    # A plain dict is accepted in place of genai.GenerationConfig
+                    generation_config={
+                        'temperature': 0.1,
+                        'candidate_count': 1,
+                    },
+                    max_concurrency=self.llm_concurrency,
+                    metrics=self.metrics,
+                )
+                # Batches are filled up to the token budget rather than a fixed number of products
+                with self.metrics.stage('llm.dispatch', products=len(products)):
+                    dispatcher.dispatch(
+                        sorted(products),
+                        build_prompt,
+                        on_batch=on_batch,
+                        pack=template.pack,
+                    )
+                
+            # Save OTHER category products to a separate file
+            other_products = [product for product, category in categories_map.items() if category == 'OTHER']
+            output_path = Path(self.output_dir)
+            output_path.mkdir(exist_ok=True)
+            with open(output_path / 'other_category_products.txt', 'w', encoding='utf-8') as f:
+                f.write("Products in OTHER category:\n")
+                for product in sorted(other_products):
+                    f.write(f"- {product}\n")
+                
+        except Exception as e:
+            print(f"Warning: Error processing AI categorization: {str(e)}. Using 'OTHER' for uncategorized products.")
+        finally:
+            cache.save()
+        
+        return categories_map
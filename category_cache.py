@@ -0,0 +1,87 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Tuple
+
+from atomic_file import atomic_write
+
+# Where a cached category came from: the LLM, or the local categorizer
+MODEL_SOURCE = 'model'
+LOCAL_SOURCE = 'local'
+
+
+def normalize_description(description: str) -> str:
+    """Normalize a product description for cache lookups"""
+    return ' '.join(description.upper().split())
+
+
+class CategoryCache:
+    """Persistent product -> category cache, namespaced by prompt and model.
+
+    Each (prompt, model) pair gets its own file named after a hash of both, so
+    editing prompt.txt or switching models starts from an empty cache.
+    Entries record their source: categories from the local categorizer keep
+    their confidence, so they are only reused while that confidence still
+    meets the threshold, and only model answers train the local categorizer.
+    """
+
+    def __init__(self, prompt: str, model_name: str, cache_dir: str = '.category_cache'):
+        digest = hashlib.sha256(f"{model_name}\0{prompt}".encode('utf-8')).hexdigest()[:16]
+        self.path = Path(cache_dir) / f"{digest}.json"
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """Load cached categories from disk, if any"""
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries.update(json.load(f))
+
+    def lookup(self, products: Iterable[str], min_local_confidence: float = 0.0) -> Dict[str, str]:
+        """Return the cached category for every product that has one.
+
+        Local categories less confident than min_local_confidence are left out.
+        """
+        hits = {}
+        for product in products:
+            entry = self.entries.get(normalize_description(product))
+            if entry is None:
+                continue
+            if entry['source'] == LOCAL_SOURCE and entry['confidence'] < min_local_confidence:
+                continue
+            hits[product] = entry['category']
+        return hits
+
+    def model_categories(self) -> Dict[str, str]:
+        """Cached categories returned by the model"""
+        return {product: entry['category'] for product, entry in self.entries.items()
+                if entry['source'] == MODEL_SOURCE}
+
+    def update(self, categories: Dict[str, str]):
+        """Add product categories returned by the model"""
+        for product, category in categories.items():
+            self.entries[normalize_description(product)] = {'category': category, 'source': MODEL_SOURCE}
+        self.dirty = self.dirty or bool(categories)
+
+    def update_local(self, categories: Dict[str, Tuple[str, float]]):
+        """Add product categories and their confidence from the local categorizer"""
+        for product, (category, confidence) in categories.items():
+            self.entries[normalize_description(product)] = {
+                'category': category, 'source': LOCAL_SOURCE, 'confidence': round(confidence, 4)}
+        self.dirty = self.dirty or bool(categories)
+
+    def save(self):
+        """Write the cache to disk, merging entries written by other processes meanwhile"""
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        merged = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                merged.update(json.load(f))
+        merged.update(self.entries)
+        with atomic_write(self.path) as f:
+            json.dump(merged, f, indent=2, ensure_ascii=False, sort_keys=True)
+        self.entries = merged
+        self.dirty = False
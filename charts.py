@@ -0,0 +1,92 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from parsing import cents_to_euros
+
+
+def _new_figure(figsize: Tuple[float, float]):
+    """A figure drawn with the Agg canvas directly, without pyplot's global figure state"""
+    # Imported here, so runs that skip charts never load matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    figure = Figure(figsize=figsize)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def render_category_spending(categories: Optional[Dict[str, int]], path: Path) -> bool:
+    """Pie chart of spending per category; False if there is nothing to draw"""
+    if not categories:  # Handle empty or None categories
+        print("Warning: No category spending data available")
+        return False
+
+    # Filter out negative values
+    positive_categories = {k: v for k, v in categories.items() if v > 0}
+    if not positive_categories:
+        print("Warning: No positive category spending values to create pie chart")
+        return False
+
+    figure = _new_figure((10, 8))
+    ax = figure.add_subplot()
+    ax.pie(list(positive_categories.values()), labels=list(positive_categories.keys()), autopct='%1.1f%%')
+    ax.set_title('Spending by Category (Positive Values Only)')
+    figure.savefig(path)
+    return True
+
+
+def render_daily_spending(daily_spending: Optional[Dict[str, int]], path: Path) -> bool:
+    """Line chart of spending per day; False if there is nothing to draw"""
+    if not daily_spending:
+        print("Warning: No daily spending data available")
+        return False
+
+    figure = _new_figure((12, 6))
+    ax = figure.add_subplot()
+    ax.plot(list(daily_spending.keys()), [cents_to_euros(cents) for cents in daily_spending.values()], marker='o')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.set_title('Daily Spending')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Amount (€)')
+    figure.tight_layout()
+    figure.savefig(path)
+    return True
+
+
+# Chart name -> (report section it draws, render function, output file name)
+CHARTS: Dict[str, Tuple[str, Callable[[Any, Path], bool], str]] = {
+    'category_spending': ('spending_by_category', render_category_spending, 'category_spending.png'),
+    'daily_spending': ('spending_by_day', render_daily_spending, 'daily_spending.png'),
+}
+
+
+def _render(name: str, data: Any, path: Path) -> bool:
+    return CHARTS[name][1](data, path)
+
+
+def render_charts(report: Mapping[str, Any], output_dir: str = 'analysis_output',
+                  charts: Optional[Iterable[str]] = None, processes: Optional[int] = None) -> List[Path]:
+    """Render the selected charts (all by default) of a report, in parallel worker processes.
+
+    Only the report sections of the selected charts are accessed, so skipping
+    the category chart doesn't by itself trigger categorization. Returns the
+    paths of the charts written.
+    """
+    names = list(CHARTS) if charts is None else list(charts)
+    unknown = [name for name in names if name not in CHARTS]
+    if unknown:
+        raise ValueError(f"Unknown charts: {', '.join(unknown)} (available: {', '.join(CHARTS)})")
+    if not names:
+        return []
+
+    output_path = Path(output_dir)
+    output_path.mkdir(exist_ok=True)
+    # Workers only receive the plain section data they draw, not the report
+    jobs = [(name, report.get(CHARTS[name][0]), output_path / CHARTS[name][2]) for name in names]
+    processes = max(1, min(processes or len(jobs), len(jobs)))
+    if processes == 1:
+        rendered = [_render(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            rendered = list(executor.map(_render, *zip(*jobs)))
+    return [path for (_, _, path), ok in zip(jobs, rendered) if ok]
@@ -1,33 +1,98 @@
+import argparse
+import hashlib
 import json
-from datetime import datetime
-import operator
-from collections import defaultdict
+from pathlib import Path
+from atomic_file import atomic_write
+from downsampling import daily_series, downsample, encode_int32, rollup
+from instrumentation import Metrics
+from parsing import cents_to_euros, format_cents
 
-def format_currency(amount):
-    return f"€{amount:.2f}"
+MONEY_FIELDS = ('total_spending', 'average_transaction', 'total_bonus_savings')
+MONEY_MAPS = ('spending_by_day', 'spending_by_category')
 
-def generate_dashboard_html(data):
-    # Process time series data
-    spending_by_day = [(datetime.strptime(date, '%Y-%m-%d'), amount) 
-                      for date, amount in data['spending_by_day'].items()]
-    spending_by_day.sort(key=operator.itemgetter(0))
+PLOTLY_CDN_URL = "https://cdn.plot.ly/plotly-latest.min.js"
+FONT_AWESOME_CDN_URL = "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css"
+DATA_FILE = 'dashboard_data.js'
+SHELL_FILE = 'index.html'
+
+# Points per time series; about the pixel width of a chart, so longer histories don't add detail
+DEFAULT_MAX_POINTS = 1000
+
+def format_currency(cents):
+    return format_cents(cents)
+
+def to_cents(data):
+    """Return the report with money amounts in integer cents, converting reports written in euros"""
+    if data.get('amount_unit') == 'cents':
+        return data
+    converted = dict(data, amount_unit='cents')
+    for field in MONEY_FIELDS:
+        converted[field] = round(data[field] * 100)
+    for field in MONEY_MAPS:
+        converted[field] = {key: round(value * 100) for key, value in data[field].items()}
+    return converted
+
+def euro_values(amounts):
+    """Cents mapping to euros, for chart axes"""
+    return {key: cents_to_euros(cents) for key, cents in amounts.items()}
+
+def encode_series(days, cents):
+    """A time series as compact typed arrays: base64 int32 days since the epoch and cents"""
+    return {'days': encode_int32(days), 'cents': encode_int32(cents)}
+
+def time_series(days, cents, max_points=DEFAULT_MAX_POINTS, method='lttb'):
+    """Daily, weekly and monthly spending from a daily series, each downsampled to at most max_points points"""
+    series = {'daily': downsample(days, cents, max_points, method)}
+    for name, period in (('weekly', 'week'), ('monthly', 'month')):
+        series[name] = downsample(*rollup(days, cents, period), max_points, method)
+    return series
+
+def dashboard_data(data, max_points=DEFAULT_MAX_POINTS, method='lttb'):
+    """Everything the dashboard shows, as a JSON-serializable payload for the HTML shell"""
+    data = to_cents(data)
     
-    # Process monthly data
-    monthly_spending = defaultdict(float)
-    for date, amount in spending_by_day:
-        month_key = date.strftime('%Y-%m')
-        monthly_spending[month_key] += amount
+    # Pre-aggregate on the server, so the page stays the same size however long the history is
+    days, cents = daily_series(data['spending_by_day'])
+    month_days, monthly_cents = rollup(days, cents, 'month')
+    series = time_series(days, cents, max_points, method)
     
     # Calculate month-over-month change
-    months = sorted(monthly_spending.keys())
-    if len(months) >= 2:
-        current = monthly_spending[months[-1]]
-        previous = monthly_spending[months[-2]]
+    if len(monthly_cents) >= 2:
+        current = int(monthly_cents[-1])
+        previous = int(monthly_cents[-2])
         monthly_change = ((current - previous) / previous * 100) if previous != 0 else 0
     else:
         monthly_change = 0
+    
+    top_categories = dict(sorted(data['spending_by_category'].items(), key=lambda x: x[1], reverse=True)[:10])
+    return {
+        'stats': {
+            'total_spending': format_currency(data['total_spending']),
+            'monthly_average': format_currency(round(data['total_spending'] / len(month_days))),
+            'monthly_change': f"{monthly_change:+.1f}% vs last month",
+            'num_transactions': str(data['num_transactions']),
+            'average_transaction': f"Avg {format_currency(data['average_transaction'])}",
+            'total_bonus_savings': format_currency(data['total_bonus_savings']),
+        },
+        'time_series': {name: encode_series(*points) for name, points in series.items()},
+        'categories': euro_values(top_categories),
+        'items': dict(data['most_bought_items']),
+    }
+
+def data_script(payload):
+    """JavaScript defining the dashboard payload; a script file also loads from file:// URLs, unlike fetch()"""
+    # Escape '</' so product names can't close an inline <script> element
+    payload_json = json.dumps(payload).replace('</', '<\\/')
+    return f"window.dashboardData = {payload_json};\n"
+
+def render_shell(head, data_tag, icons=True):
+    """The dashboard page, with the given <head> asset tags and the tag providing dashboardData.
+
+    icons adds Font Awesome icons to the titles; head must then load its stylesheet.
+    """
+    def icon(name):
+        return f'<i class="fas fa-{name}"></i> ' if icons else ''
 
-    # Generate HTML
     html = f"""
 <!DOCTYPE html>
 <html lang="en">
@@ -35,8 +100,7 @@ def generate_dashboard_html(data):
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Shopping Analytics Dashboard</title>
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css">
+    {head}
     <style>
         :root {{
             --primary-color: #8884d8;
@@ -145,69 +209,97 @@ def generate_dashboard_html(data):
 <body>
     <div class="dashboard">
         <div class="dashboard-header">
-            <h1 class="dashboard-title"><i class="fas fa-chart-line"></i> Shopping Analytics Dashboard</h1>
+            <h1 class="dashboard-title">{icon('chart-line')}Shopping Analytics Dashboard</h1>
         </div>
         
         <div class="stats-grid">
             <div class="stat-card">
-                <div class="stat-card-title"><i class="fas fa-wallet"></i> Total Spending</div>
-                <div class="stat-card-value">{format_currency(data['total_spending'])}</div>
+                <div class="stat-card-title">{icon('wallet')}Total Spending</div>
+                <div class="stat-card-value" id="totalSpending"></div>
             </div>
             <div class="stat-card">
-                <div class="stat-card-title"><i class="fas fa-calendar"></i> Monthly Average</div>
-                <div class="stat-card-value">{format_currency(data['total_spending'] / len(set([d.strftime('%Y-%m') for d, _ in spending_by_day])))}</div>
-                <div class="stat-card-trend">{monthly_change:+.1f}% vs last month</div>
+                <div class="stat-card-title">{icon('calendar')}Monthly Average</div>
+                <div class="stat-card-value" id="monthlyAverage"></div>
+                <div class="stat-card-trend" id="monthlyChange"></div>
             </div>
             <div class="stat-card">
-                <div class="stat-card-title"><i class="fas fa-shopping-cart"></i> Total Transactions</div>
-                <div class="stat-card-value">{data['num_transactions']}</div>
-                <div class="stat-card-trend">Avg {format_currency(data['average_transaction'])}</div>
+                <div class="stat-card-title">{icon('shopping-cart')}Total Transactions</div>
+                <div class="stat-card-value" id="numTransactions"></div>
+                <div class="stat-card-trend" id="averageTransaction"></div>
             </div>
             <div class="stat-card">
-                <div class="stat-card-title"><i class="fas fa-piggy-bank"></i> Total Savings</div>
-                <div class="stat-card-value">{format_currency(data['total_bonus_savings'])}</div>
+                <div class="stat-card-title">{icon('piggy-bank')}Total Savings</div>
+                <div class="stat-card-value" id="totalBonusSavings"></div>
             </div>
         </div>
         
         <div class="chart-grid">
             <div class="chart-card">
-                <div class="chart-title"><i class="fas fa-chart-area"></i> Spending Over Time</div>
+                <div class="chart-title">{icon('chart-area')}Spending Over Time</div>
                 <div id="timeSeriesChart" class="chart"></div>
             </div>
             <div class="chart-card">
-                <div class="chart-title"><i class="fas fa-tags"></i> Top Categories</div>
+                <div class="chart-title">{icon('tags')}Top Categories</div>
                 <div id="categoriesChart" class="chart"></div>
             </div>
             <div class="chart-card">
-                <div class="chart-title"><i class="fas fa-shopping-basket"></i> Most Purchased Items</div>
+                <div class="chart-title">{icon('shopping-basket')}Most Purchased Items</div>
                 <div id="itemsChart" class="chart"></div>
             </div>
             <div class="chart-card">
-                <div class="chart-title"><i class="fas fa-chart-bar"></i> Monthly Spending Trends</div>
+                <div class="chart-title">{icon('chart-bar')}Monthly Spending Trends</div>
                 <div id="monthlyChart" class="chart"></div>
             </div>
         </div>
     </div>
 
+    {data_tag}
     <script>
-        // Time Series Chart
-        const timeSeriesData = {json.dumps(data['spending_by_day'])};
-        const dates = Object.keys(timeSeriesData);
-        const amounts = Object.values(timeSeriesData);
+        const stats = dashboardData.stats;
+        document.getElementById('totalSpending').textContent = stats.total_spending;
+        document.getElementById('monthlyAverage').textContent = stats.monthly_average;
+        document.getElementById('monthlyChange').textContent = stats.monthly_change;
+        document.getElementById('numTransactions').textContent = stats.num_transactions;
+        document.getElementById('averageTransaction').textContent = stats.average_transaction;
+        document.getElementById('totalBonusSavings').textContent = stats.total_bonus_savings;
+        
+        // Time series arrive as base64 little-endian int32 arrays of days since the epoch and cents
+        function decodeInt32(base64) {{
+            const bytes = Uint8Array.from(atob(base64), c => c.charCodeAt(0));
+            return new Int32Array(bytes.buffer);
+        }}
+        function decodeSeries(series) {{
+            return {{
+                "x": Float64Array.from(decodeInt32(series.days), day => day * 86400000),
+                "y": Float64Array.from(decodeInt32(series.cents), cents => cents / 100)
+            }};
+        }}
+        const timeSeries = dashboardData.time_series;
+        const daily = decodeSeries(timeSeries.daily);
+        const weekly = decodeSeries(timeSeries.weekly);
+        const monthly = decodeSeries(timeSeries.monthly);
         
+        // Time Series Chart
         Plotly.newPlot('timeSeriesChart', [{{
-            "x": dates,
-            "y": amounts,
+            "x": daily.x,
+            "y": daily.y,
             "type": 'scatter',
             "fill": 'tozeroy',
             "name": 'Daily Spending'
+        }}, {{
+            "x": weekly.x,
+            "y": weekly.y,
+            "type": 'scatter',
+            "name": 'Weekly Spending',
+            "visible": 'legendonly'
         }}], {{
             "margin": {{ "t": 10 }},
-            "yaxis": {{ "title": 'Amount (\u20AC)' }}
+            "xaxis": {{ "type": 'date' }},
+            "yaxis": {{ "title": {{ "text": 'Amount (\u20AC)' }} }}
         }});
         
         // Categories Chart
-        const categoryData = {json.dumps(dict(sorted(data['spending_by_category'].items(), key=lambda x: x[1], reverse=True)[:10]))};
+        const categoryData = dashboardData.categories;
         Plotly.newPlot('categoriesChart', [{{
             "x": Object.keys(categoryData),
             "y": Object.values(categoryData),
@@ -215,12 +307,12 @@ def generate_dashboard_html(data):
             "marker": {{ "color": '#8884d8' }}
         }}], {{
             "margin": {{ "t": 10 }},
-            "yaxis": {{ "title": 'Amount (\u20AC)' }},
+            "yaxis": {{ "title": {{ "text": 'Amount (\u20AC)' }} }},
             "xaxis": {{ "tickangle": -45 }}
         }});
         
         // Most Bought Items Chart
-        const itemsData = {json.dumps(dict(data['most_bought_items']))};
+        const itemsData = dashboardData.items;
         Plotly.newPlot('itemsChart', [{{
             "x": Object.values(itemsData),
             "y": Object.keys(itemsData),
@@ -229,20 +321,19 @@ def generate_dashboard_html(data):
             "marker": {{ "color": '#82ca9d' }}
         }}], {{
             "margin": {{ "t": 10, "l": 150 }},
-            "xaxis": {{ "title": 'Count' }}
+            "xaxis": {{ "title": {{ "text": 'Count' }} }}
         }});
         
         // Monthly Spending Chart
-        const monthlyData = {json.dumps(dict(monthly_spending))};
         Plotly.newPlot('monthlyChart', [{{
-            "x": Object.keys(monthlyData),
-            "y": Object.values(monthlyData),
+            "x": monthly.x,
+            "y": monthly.y,
             "type": 'scatter',
             "name": 'Monthly Spending'
         }}], {{
             "margin": {{ "t": 10 }},
-            "yaxis": {{ "title": 'Amount (\u20AC)' }},
-            "xaxis": {{ "tickangle": -45 }}
+            "yaxis": {{ "title": {{ "text": 'Amount (\u20AC)' }} }},
+            "xaxis": {{ "type": 'date', "tickangle": -45 }}
         }});
     </script>
 </body>
@@ -250,17 +341,92 @@ def generate_dashboard_html(data):
 """
     return html
 
+def generate_dashboard_html(data, max_points=DEFAULT_MAX_POINTS, method='lttb', metrics=None):
+    """Single-file dashboard with the data inline, loading Plotly and icons from CDNs"""
+    metrics = metrics or Metrics()
+    with metrics.stage('dashboard.data'):
+        script = data_script(dashboard_data(data, max_points, method))
+    head = (f'<script src="{PLOTLY_CDN_URL}"></script>\n'
+            f'    <link rel="stylesheet" href="{FONT_AWESOME_CDN_URL}">')
+    with metrics.stage('dashboard.render'):
+        return render_shell(head, f"<script>{script}</script>")
+
+def vendor_plotly(output_dir):
+    """Copy the minified Plotly bundled with the plotly package under a content-hashed name"""
+    import plotly
+    source = Path(plotly.__file__).parent / 'package_data' / 'plotly.min.js'
+    content = source.read_bytes()
+    name = f"plotly-{hashlib.sha256(content).hexdigest()[:16]}.min.js"
+    target = Path(output_dir) / name
+    # The name changes with the content, so an existing file is already up to date
+    if not target.exists():
+        with atomic_write(target, 'wb') as f:
+            f.write(content)
+    for stale in Path(output_dir).glob('plotly-*.min.js'):
+        if stale != target:
+            stale.unlink()
+    return name
+
+def write_dashboard_bundle(data, output_dir='analysis_output/dashboard', max_points=DEFAULT_MAX_POINTS,
+                           method='lttb', metrics=None):
+    """Write a self-contained dashboard directory that works without network access.
+
+    The HTML shell references vendored Plotly by a content-hashed file name,
+    so browsers can cache it indefinitely, and loads the data from a
+    separate script. The shell and Plotly are only rewritten when they
+    change; refreshing the data rewrites just the data file.
+    """
+    metrics = metrics or Metrics()
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    with metrics.stage('dashboard.vendor_plotly'):
+        plotly_name = vendor_plotly(output_path)
+    with metrics.stage('dashboard.render'):
+        # Without network access there is no Font Awesome, so the titles go without icons
+        shell = render_shell(f'<script src="{plotly_name}"></script>', f'<script src="{DATA_FILE}"></script>',
+                             icons=False)
+        shell_path = output_path / SHELL_FILE
+        if not shell_path.exists() or shell_path.read_text(encoding='utf-8') != shell:
+            with atomic_write(shell_path) as f:
+                f.write(shell)
+    with metrics.stage('dashboard.data'):
+        with atomic_write(output_path / DATA_FILE) as f:
+            f.write(data_script(dashboard_data(data, max_points, method)))
+    return shell_path
+
 def main():
-    # Fix the file path to use underscore
-    with open('./analysis_output/analysis_report.json', 'r') as f:
-        data = json.load(f)
+    parser = argparse.ArgumentParser(description='Generate the shopping analytics dashboard')
+    parser.add_argument('--max-points', type=int, default=DEFAULT_MAX_POINTS,
+                        help='Maximum number of points per time series chart')
+    parser.add_argument('--downsample', choices=('lttb', 'minmax'), default='lttb',
+                        help='How long time series are reduced to --max-points')
+    parser.add_argument('--bundle', type=str, nargs='?', const='analysis_output/dashboard', default=None,
+                        help='Write an offline dashboard directory (default: analysis_output/dashboard) '
+                             'instead of a single dashboard.html that loads Plotly from a CDN')
+    parser.add_argument('--metrics', type=str, default=None,
+                        help='Write the timings of the dashboard stages to this JSON file')
+    parser.add_argument('--trace', type=str, default=None,
+                        help='Write a Chrome trace-event file of the dashboard stages')
+    args = parser.parse_args()
+    metrics = Metrics()
     
-    # Generate the dashboard HTML
-    html_content = generate_dashboard_html(data)
+    # Fix the file path to use underscore
+    with metrics.stage('dashboard.load_report'):
+        with open('./analysis_output/analysis_report.json', 'r') as f:
+            data = json.load(f)
     
-    # Save the HTML file
-    with open('./analysis_output/dashboard.html', 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    if args.bundle:
+        shell_path = write_dashboard_bundle(data, args.bundle, args.max_points, args.downsample, metrics)
+        print(f"Offline dashboard written to {shell_path}")
+    else:
+        # Generate the dashboard HTML
+        html_content = generate_dashboard_html(data, args.max_points, args.downsample, metrics)
+        
+        # Save the HTML file
+        with metrics.stage('dashboard.write'):
+            with open('./analysis_output/dashboard.html', 'w', encoding='utf-8') as f:
+                f.write(html_content)
+    metrics.save_files(args.metrics, args.trace)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import base64
+from typing import Dict, Tuple
+
+import numpy as np
+
+# ISO weeks start on Monday; day 0 of the epoch (1970-01-01) was a Thursday
+EPOCH_WEEKDAY = 3
+
+
+def daily_series(amounts: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Days since the epoch and cents of a {'YYYY-MM-DD': cents} mapping, sorted by day"""
+    days = np.array(list(amounts.keys()), dtype='datetime64[D]').astype(np.int64)
+    cents = np.fromiter(amounts.values(), dtype=np.int64, count=len(amounts))
+    order = np.argsort(days, kind='stable')
+    return days[order], cents[order]
+
+
+def rollup(days: np.ndarray, cents: np.ndarray, period: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Sum a sorted daily series per 'week' (keyed by its Monday) or 'month' (keyed by its first day)"""
+    if period == 'week':
+        keys = days - (days + EPOCH_WEEKDAY) % 7
+    elif period == 'month':
+        keys = days.astype('datetime64[D]').astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    else:
+        raise ValueError(f"Unknown rollup period: {period}")
+    periods, first = np.unique(keys, return_index=True)
+    if len(periods) == 0:
+        return periods, cents[:0]
+    return periods, np.add.reduceat(cents, first)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the points kept by largest-triangle-three-buckets downsampling.
+
+    Keeps the first and last point and, from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the average of the next bucket. Peaks survive,
+    so the downsampled line looks like the original.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        average_x = x[end:next_end].mean()
+        average_y = y[end:next_end].mean()
+        # Twice the triangle areas; the constant factor doesn't change the maximum
+        areas = np.abs((x[previous] - average_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (average_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def min_max(y: np.ndarray, num_buckets: int) -> np.ndarray:
+    """Indices of the lowest and highest point of each of num_buckets equal buckets, in order"""
+    n = len(y)
+    if 2 * num_buckets >= n or num_buckets < 1:
+        return np.arange(n)
+    bucket = np.arange(n) * num_buckets // n
+    # Within each bucket, the first index after sorting by value is its minimum and the last its maximum
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(num_buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int, method: str = 'lttb') -> Tuple[np.ndarray, np.ndarray]:
+    """At most max_points points of a series, chosen with 'lttb' or 'minmax'"""
+    if method == 'lttb':
+        kept = lttb(x, y, max_points)
+    elif method == 'minmax':
+        kept = min_max(y, max_points // 2)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    return x[kept], y[kept]
+
+
+def encode_int32(values: np.ndarray) -> str:
+    """Base64 of little-endian int32 values, decoded into an Int32Array by the dashboard"""
+    info = np.iinfo(np.int32)
+    if len(values) and (values.min() < info.min or values.max() > info.max):
+        raise ValueError("Values don't fit in 32-bit integers")
+    return base64.b64encode(np.ascontiguousarray(values, dtype='<i4').tobytes()).decode('ascii')
@@ -0,0 +1,148 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak memory is then left out
+    resource = None
+
+
+def peak_rss_bytes(children: bool = False) -> Optional[int]:
+    """Peak resident memory of this process, or of its finished child processes; None if unknown"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+
+def summarize_latencies(seconds: List[float]) -> Dict[str, Any]:
+    """Count, total, mean, median, 95th percentile and maximum of a list of durations"""
+    ordered = sorted(seconds)
+    return {
+        'count': len(ordered),
+        'total_seconds': sum(ordered),
+        'mean_seconds': sum(ordered) / len(ordered),
+        'p50_seconds': ordered[(len(ordered) - 1) // 2],
+        'p95_seconds': ordered[int(0.95 * (len(ordered) - 1))],
+        'max_seconds': ordered[-1],
+    }
+
+
+class Metrics:
+    """Timings, counters and memory of one run, written as a JSON summary and a Chrome trace.
+
+    stage() times a pipeline step such as loading receipts or rendering
+    charts; nested stages count towards their parent too. timed() records one
+    request, whose latencies are summarized per name. count() adds to a
+    counter and gauge() sets a value. Recording is cheap and thread-safe, so
+    components always record and the command line decides what to write.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc)
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.latencies: Dict[str, List[float]] = {}
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, Any] = {}
+        self._events: List[Dict[str, Any]] = []
+        self._threads: Dict[int, str] = {}
+
+    def _timestamp(self, moment: float) -> float:
+        """Microseconds since the run started, as trace events expect"""
+        return round((moment - self._origin) * 1e6, 1)
+
+    def _add_event(self, name: str, category: str, start: float, end: float, args: Dict[str, Any]):
+        thread = threading.current_thread()
+        self._threads[thread.ident] = thread.name
+        self._events.append({'name': name, 'cat': category, 'ph': 'X', 'ts': self._timestamp(start),
+                             'dur': self._timestamp(end) - self._timestamp(start),
+                             'pid': os.getpid(), 'tid': thread.ident, 'args': args})
+
+    @contextmanager
+    def stage(self, name: str, **args):
+        """Time a pipeline stage; the yielded dict can be filled with details for the trace"""
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            peak = peak_rss_bytes()
+            with self._lock:
+                stage = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0})
+                stage['calls'] += 1
+                stage['seconds'] += end - start
+                # The process peak so far: a stage that raised it is the one that used the memory
+                stage['peak_rss_bytes'] = peak
+                self._add_event(name, 'stage', start, end, args)
+                if peak is not None:
+                    self._events.append({'name': 'peak_rss_mb', 'ph': 'C', 'ts': self._timestamp(end),
+                                         'pid': os.getpid(), 'args': {'peak_rss_mb': peak / 1e6}})
+
+    @contextmanager
+    def timed(self, name: str, **args):
+        """Time one request, e.g. an HTTP call; the yielded dict can be filled with details for the trace"""
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.latencies.setdefault(name, []).append(end - start)
+                self._add_event(name, 'request', start, end, args)
+
+    def count(self, name: str, value: float = 1):
+        """Add to a counter"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: Any):
+        """Set a value, replacing the previous one"""
+        with self._lock:
+            self.gauges[name] = value
+
+    def summary(self) -> Dict[str, Any]:
+        """Everything recorded so far, with latencies summarized"""
+        with self._lock:
+            return {
+                'started_at': self.started_at.isoformat(),
+                'wall_seconds': time.perf_counter() - self._origin,
+                'peak_rss_bytes': peak_rss_bytes(),
+                # Chart rendering and batch scans run in worker processes
+                'children_peak_rss_bytes': peak_rss_bytes(children=True),
+                'stages': {name: dict(stage) for name, stage in self.stages.items()},
+                'latencies': {name: summarize_latencies(values) for name, values in self.latencies.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+            }
+
+    def save(self, path: str):
+        """Write the summary as JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def save_trace(self, path: str):
+        """Write every stage and request as Chrome trace events, for chrome://tracing or Perfetto"""
+        with self._lock:
+            names = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                     for tid, name in self._threads.items()]
+            events = names + list(self._events)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def save_files(self, metrics_file: Optional[str] = None, trace_file: Optional[str] = None):
+        """Write the JSON summary and the trace to whichever of the files are given"""
+        for path, save in ((metrics_file, self.save), (trace_file, self.save_trace)):
+            if path:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                save(path)
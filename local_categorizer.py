@@ -0,0 +1,309 @@
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from category_cache import normalize_description
+
+TOKEN_PATTERN = re.compile(r"[^\W\d_]+")
+# Store and house-brand words that say nothing about the product
+IGNORED_TOKENS = {'AH', 'AHB', 'BASIC', 'EXCELLENT', 'TERRA', 'BIO', 'BIOLOGISCH', 'BIOLOGISCHE'}
+MIN_KEYWORD_LENGTH = 3
+# Shorter keywords only match whole words (IJS, not PRIJS), never word endings or starts
+MIN_SUFFIX_LENGTH = 4
+MIN_PREFIX_LENGTH = 4
+
+# Confidence of a lexicon match on a single word. A word start is usually the modifier of a
+# Dutch compound (TOMATENSOEP is soup), so on its own it stays below the default threshold.
+EXACT_MATCH_CONFIDENCE = 0.95
+SUFFIX_MATCH_CONFIDENCE = 0.9
+PREFIX_MATCH_CONFIDENCE = 0.75
+
+# Category lines in prompt.txt, e.g. "- FRUIT (for fresh fruits)"
+PROMPT_CATEGORY_PATTERN = re.compile(r'^- ([A-Z][A-Z &]*?) \(', re.MULTILINE)
+PROMPT_QUOTED_PATTERN = re.compile(r'"([^"]+?),?"')
+PROMPT_BOLD_PATTERN = re.compile(r'\*\*([A-Z][A-Z &]*)\*\*')
+
+# Common words on AH receipts. Dutch compounds put the head noun last
+# (CHERRYTOMAAT, APPELSAP), so longer and word-final keywords win.
+SEED_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    'FRUIT': (
+        'APPEL', 'APPELS', 'ELSTAR', 'JONAGOLD', 'BANAAN', 'BANANEN', 'PEER', 'PEREN', 'SINAASAPPEL',
+        'SINAASAPPELS', 'MANDARIJN', 'MANDARIJNEN', 'CLEMENTINE', 'CLEMENTINES', 'CITROEN', 'CITROENEN',
+        'LIMOEN', 'AARDBEI', 'AARDBEIEN', 'FRAMBOZEN', 'BESSEN', 'DRUIVEN', 'KIWI', 'MANGO', 'ANANAS', 'MELOEN',
+        'WATERMELOEN', 'AVOCADO', 'NECTARINE', 'NECTARINES', 'PERZIK', 'PERZIKEN', 'PRUIMEN', 'GRANAATAPPEL',
+        'FRUIT', 'KERSEN', 'VIJGEN', 'DADELS',
+    ),
+    'VEGETABLES': (
+        'KOMKOMMER', 'TOMAAT', 'TOMATEN', 'PAPRIKA', 'SLA', 'IJSBERGSLA', 'VELDSLA', 'RUCOLA', 'ANDIJVIE',
+        'SPINAZIE', 'BROCCOLI', 'BLOEMKOOL', 'KOOL', 'SPRUITEN', 'SPRUITJES', 'WORTEL', 'WORTELEN', 'WORTELS',
+        'PEEN', 'WINTERPEEN', 'UIEN', 'KNOFLOOK', 'PREI', 'COURGETTE', 'AUBERGINE', 'CHAMPIGNONS',
+        'PADDENSTOELEN', 'SPERZIEBONEN', 'AARDAPPEL', 'AARDAPPELEN', 'KRIELTJES', 'ASPERGES', 'BIETEN',
+        'SELDERIJ', 'RADIJS', 'RADIJSJES', 'GROENTE', 'GROENTEN', 'PASTINAAK', 'POMPOEN', 'TAUGE', 'PAKSOI',
+        'VENKEL', 'SNOEPGROENTE',
+    ),
+    'MILK & YOGURT': (
+        'MELK', 'HALFVOLLE', 'KARNEMELK', 'YOGHURT', 'DRINKYOGHURT', 'KWARK', 'VLA', 'SKYR', 'KEFIR',
+        'SOJADRINK', 'HAVERDRINK', 'AMANDELDRINK', 'ALPRO', 'CHOCOMEL', 'TOETJE', 'ZUIVEL',
+    ),
+    'CHEESE': (
+        'KAAS', 'CHEDDAR', 'FETA', 'MOZZARELLA', 'PARMEZAAN', 'PARMIGIANO', 'BRIE', 'CAMEMBERT', 'GOUDA',
+        'BELEGEN', 'GEITENKAAS', 'ROOMKAAS', 'HUTTENKASE', 'GORGONZOLA', 'MASCARPONE', 'RICOTTA', 'GRUYERE',
+        'EMMENTALER', 'LEERDAMMER', 'MAASDAMMER', 'BOURSIN', 'BURRATA', 'HALLOUMI',
+    ),
+    'MEAT': (
+        'KIP', 'KIPFILET', 'KIPPENDIJ', 'KIPPENDIJEN', 'KIPPENBOUT', 'KIPPENBOUTEN', 'KIPDIJ', 'GEHAKT',
+        'RUNDERGEHAKT', 'HAM', 'SPEK', 'SPEKJES', 'BACON', 'WORST', 'ROOKWORST', 'SALAMI', 'CHORIZO',
+        'BIEFSTUK', 'RIBLAP', 'SCHNITZEL', 'KARBONADE', 'HAMBURGER', 'HAMBURGERS', 'BURGER', 'BURGERS',
+        'SHOARMA', 'VLEES', 'VLEESWAREN', 'SLAVINK', 'SLAVINKEN', 'SPARERIBS', 'CARPACCIO', 'RUNDVLEES',
+        'VARKENSHAAS', 'KALKOEN', 'PROSCIUTTO', 'PANCETTA', 'GYROS',
+    ),
+    'FISH & SEAFOOD': (
+        'ZALM', 'ZALMFILET', 'TONIJN', 'HARING', 'KABELJAUW', 'GARNALEN', 'MOSSELEN', 'MAKREEL', 'PANGASIUS',
+        'TILAPIA', 'VIS', 'SCAMPI', 'KIBBELING', 'FOREL', 'ANSJOVIS', 'KRAB', 'INKTVIS', 'SARDINES', 'SURIMI',
+        'SCHELVIS', 'KOOLVIS', 'GAMBA', 'GAMBAS',
+    ),
+    'BREAD': (
+        'BROOD', 'BROODJE', 'BROODJES', 'BAGUETTE', 'PISTOLET', 'PISTOLETS', 'WRAP', 'WRAPS', 'TORTILLA',
+        'TORTILLAS', 'NAAN', 'PIZZADEEG', 'BOLLEN', 'BOLLETJES', 'CIABATTA', 'PITA', 'PITABROODJES', 'BAGEL',
+        'BAGELS', 'VOLKOREN', 'BOTERHAM', 'KRENTENBOLLEN', 'FOCACCIA', 'BRIOCHE', 'DESEM',
+    ),
+    'PASTRIES': (
+        'CROISSANT', 'CROISSANTS', 'TAART', 'TAARTJE', 'TAARTJES', 'GEBAK', 'CAKE', 'DONUT', 'DONUTS', 'MUFFIN',
+        'MUFFINS', 'BROWNIE', 'BROWNIES', 'TOMPOUCE', 'TOMPOUCEN', 'APPELFLAP', 'SOEZEN', 'EIERKOEK', 'MOORKOP',
+        'VLAAI', 'CHOCOLADEBROODJE', 'CROISSANTJES',
+    ),
+    'CHIPS & CRACKERS': (
+        'CHIPS', 'CRACKERS', 'CRACKER', 'TUC', 'PRINGLES', 'LAYS', 'DORITOS', 'NACHOS', 'ZOUTJES',
+        'KAASSTENGELS', 'STENGELS', 'BUGLES', 'RIJSTWAFELS', 'RIJSTWAFEL', 'POPCORN', 'BESCHUIT', 'CRACOTTES',
+        'KNAPPERTJES', 'PAPRIKACHIPS', 'TORTILLACHIPS', 'BORRELNOOTJES', 'NOOTJES',
+    ),
+    'CANDY & CHOCOLATE': (
+        'CHOCOLADE', 'CHOCOLADEREEP', 'REEP', 'REPEN', 'SNOEP', 'SNOEPJES', 'DROP', 'DROPJES', 'KAUWGOM',
+        'MARS', 'SNICKERS', 'TWIX', 'HARIBO', 'MENTOS', 'WINEGUM', 'WINEGUMS', 'LOLLY', 'LOLLIES', 'PEPERMUNT',
+        'BONBONS', 'PRALINES', 'MILKA', 'KITKAT', 'TOBLERONE', 'SPEKKIES', 'ZUURTJES', 'TOFFEES',
+        'MARSHMALLOWS', 'PAASEITJES', 'CHOCOLADELETTER', 'KRUIDNOTEN',
+    ),
+    'COOKIES & BISCUITS': (
+        'KOEKJES', 'KOEK', 'KOEKEN', 'BISCUIT', 'BISCUITS', 'STROOPWAFEL', 'STROOPWAFELS', 'SPECULAAS',
+        'SPECULOOS', 'OREO', 'BASTOGNE', 'SPRITS', 'COOKIES', 'WAFELS', 'PENNYWAFELS', 'ONTBIJTKOEK',
+        'EVERGREEN', 'LIGA', 'SULTANA',
+    ),
+    'PREPARED MEALS': (
+        'MAALTIJD', 'MAALTIJDPAKKET', 'VERSPAKKET', 'LASAGNE', 'OVENSCHOTEL', 'STAMPPOT', 'NASI', 'BAMI',
+        'PAELLA', 'MACARONISCHOTEL', 'WOKMAALTIJD', 'BOWL', 'SUSHI',
+    ),
+    'SALADS': (
+        'SALADE', 'MAALTIJDSALADE', 'KOOLSLA', 'PASTASALADE', 'KIPSALADE', 'EIERSALADE', 'HUZARENSALADE',
+        'RAUWKOST',
+    ),
+    'SANDWICHES': (
+        'SANDWICH', 'SANDWICHES', 'TOSTI', 'TOSTIS', 'PANINI', 'CLUBSANDWICH', 'BELEGD',
+    ),
+    'WATER': (
+        'WATER', 'SPA', 'BRONWATER', 'MINERAALWATER', 'CHAUDFONTAINE', 'BRUISWATER', 'EVIAN', 'VITTEL',
+    ),
+    'SODA & JUICE': (
+        'COLA', 'CASSIS', 'SINAS', 'FANTA', 'SPRITE', 'SEVENUP', 'SAP', 'JUS', 'APPELSAP', 'SINAASAPPELSAP',
+        'FRISDRANK', 'LIMONADE', 'ICETEA', 'TONIC', 'TONICWATER', 'KOKOSWATER', 'RIVELLA', 'SMOOTHIE',
+        'SMOOTHIES', 'SIROOP', 'LIMONADESIROOP', 'DUBBELFRISS', 'ENERGIEDRANK', 'REDBULL', 'SCHWEPPES',
+        'ROOSVICEE', 'PEPSI', 'FRUITDRANK',
+    ),
+    'COFFEE & TEA': (
+        'KOFFIE', 'KOFFIEBONEN', 'KOFFIECUPS', 'KOFFIEPADS', 'CAPSULES', 'THEE', 'ROOIBOS', 'ESPRESSO', 'LUNGO',
+        'CAPPUCCINO', 'NESPRESSO', 'SENSEO', 'PICKWICK', 'EGBERTS', 'THEEZAKJES', 'OPLOSKOFFIE', 'FILTERKOFFIE',
+        'LATTE',
+    ),
+    'ALCOHOLIC BEVERAGES': (
+        'BIER', 'PILS', 'WIJN', 'HEINEKEN', 'GROLSCH', 'AMSTEL', 'BAVARIA', 'LEFFE', 'HOEGAARDEN', 'CORONA',
+        'PROSECCO', 'CAVA', 'CHAMPAGNE', 'WHISKY', 'WODKA', 'VODKA', 'RUM', 'GIN', 'JENEVER', 'LIKEUR', 'CIDER',
+        'MERLOT', 'CHARDONNAY', 'SAUVIGNON', 'CABERNET', 'RIOJA', 'MALBEC', 'SHIRAZ', 'PINOT', 'TRIPEL',
+        'RADLER', 'WITBIER', 'SPECIAALBIER', 'DESPERADOS', 'APEROL', 'SHERRY',
+    ),
+    'SPREADS': (
+        'PINDAKAAS', 'JAM', 'HAGELSLAG', 'CHOCOLADEPASTA', 'CHOCOPASTA', 'NUTELLA', 'APPELSTROOP', 'HONING',
+        'VLOKKEN', 'MUISJES', 'SPECULOOSPASTA', 'NOTENPASTA', 'AMANDELPASTA', 'CONFITUUR', 'VRUCHTENHAGEL',
+        'SANDWICHSPREAD', 'ZOETBELEG',
+    ),
+    'DIPS & SAUCES': (
+        'HUMMUS', 'SALSA', 'SAUS', 'PASTASAUS', 'KETCHUP', 'MAYONAISE', 'MAYO', 'MOSTERD', 'PESTO', 'DRESSING',
+        'SATESAUS', 'GUACAMOLE', 'TZATZIKI', 'SAMBAL', 'SOJASAUS', 'WOKSAUS', 'FRITESSAUS', 'DIP', 'DIPSAUS',
+        'AIOLI', 'SNACKSAUS', 'CURRYSAUS', 'KNOFLOOKSAUS', 'TAPENADE', 'SLASAUS', 'ROOMSAUS',
+    ),
+    'CANNED GOODS': (
+        'BONEN', 'KIDNEYBONEN', 'OLIJVEN', 'TOMATENBLOKJES', 'TOMATENPUREE', 'PASSATA', 'MAIS', 'KIKKERERWTEN',
+        'LINZEN', 'DOPERWTEN', 'KAPPERTJES', 'BLIK', 'AUGURKEN', 'ZILVERUITJES', 'ROOKVLEES',
+    ),
+    'PASTA & RICE': (
+        'PASTA', 'SPAGHETTI', 'PENNE', 'MACARONI', 'FUSILLI', 'TAGLIATELLE', 'FARFALLE', 'RIGATONI', 'RIJST',
+        'BASMATIRIJST', 'ZILVERVLIESRIJST', 'NOEDELS', 'MIE', 'MIENESTJES', 'COUSCOUS', 'BULGUR', 'QUINOA',
+        'GNOCCHI', 'RAVIOLI', 'TORTELLINI', 'LINGUINE', 'ORZO', 'CONCHIGLIE', 'TORTIGLIONI',
+    ),
+    'BREAKFAST CEREALS': (
+        'MUESLI', 'GRANOLA', 'CRUESLI', 'HAVERMOUT', 'CORNFLAKES', 'OATS', 'PORRIDGE', 'BRINTA', 'CEREALS',
+        'CEREAL', 'CHEERIOS', 'KELLOGGS', 'HAVERVLOKKEN',
+    ),
+    'BAKING SUPPLIES': (
+        'BLOEM', 'MEEL', 'BAKMEEL', 'ZELFRIJZEND', 'SUIKER', 'BASTERDSUIKER', 'POEDERSUIKER', 'BAKPOEDER',
+        'GIST', 'PANEERMEEL', 'VANILLESUIKER', 'CAKEMIX', 'BAKMIX', 'MAIZENA', 'CACAOPOEDER', 'RIETSUIKER',
+        'KRISTALSUIKER', 'GELATINE', 'BAKBLIK', 'BROODMIX', 'PANNENKOEKMIX',
+    ),
+    'HERBS & SPICES': (
+        'ZOUT', 'ZEEZOUT', 'PEPER', 'BOUILLON', 'BOUILLONBLOKJES', 'KRUIDENMIX', 'KRUIDEN', 'SPECERIJEN',
+        'OREGANO', 'BASILICUM', 'PETERSELIE', 'KANEEL', 'KERRIE', 'PAPRIKAPOEDER', 'NOOTMUSKAAT', 'KOMIJN',
+        'TIJM', 'ROZEMARIJN', 'LAURIER', 'CHILIVLOKKEN', 'KORIANDER', 'DILLE', 'BIESLOOK', 'GEMBER', 'KURKUMA',
+    ),
+    'EGGS': (
+        'EIEREN', 'SCHARRELEIEREN', 'SCHARREL', 'KWARTELEITJES',
+    ),
+    'FROZEN FOODS': (
+        'DIEPVRIES', 'ROOMIJS', 'IJS', 'IJSJES', 'MAGNUM', 'CORNETTO', 'FRIET', 'FRIETEN', 'PATAT', 'KROKET',
+        'KROKETTEN', 'FRIKANDEL', 'FRIKANDELLEN', 'BITTERBALLEN', 'PIZZA', 'VISSTICKS', 'DIEPVRIESPIZZA',
+        'IJSBLOKJES', 'LOEMPIA', 'LOEMPIAS',
+    ),
+    'CLEANING SUPPLIES': (
+        'AFWASMIDDEL', 'WASMIDDEL', 'ALLESREINIGER', 'REINIGER', 'SCHOONMAAK', 'VUILNISZAK', 'VUILNISZAKKEN',
+        'AFVALZAKKEN', 'WASVERZACHTER', 'VAATWAS', 'VAATWASTABLETTEN', 'DREFT', 'ROBIJN', 'SPONS', 'SPONZEN',
+        'SPONSJES', 'VAATDOEK', 'VAATDOEKEN', 'BLEEK', 'CHLOOR', 'TOILETBLOK', 'ONTKALKER', 'AJAX', 'DASH',
+        'PERSIL', 'OMO', 'WASPODS', 'AFWASBORSTEL', 'GLORIX', 'VANISH', 'SCHOONMAAKAZIJN',
+        'HUISHOUDHANDSCHOENEN', 'VLOERREINIGER',
+    ),
+    'PERSONAL CARE': (
+        'SHAMPOO', 'CONDITIONER', 'DOUCHEGEL', 'DOUCHE', 'DEODORANT', 'DEO', 'TANDPASTA', 'TANDENBORSTEL',
+        'MONDWATER', 'ZEEP', 'HANDZEEP', 'SCHEERMESJES', 'SCHEERGEL', 'SCHEERSCHUIM', 'MAANDVERBAND', 'TAMPONS',
+        'INLEGKRUISJES', 'VITAMINE', 'VITAMINES', 'PLEISTERS', 'DAGCREME', 'NACHTCREME', 'BODYLOTION',
+        'LIPPENBALSEM', 'MICELLAIR', 'NIVEA', 'DOVE', 'GILLETTE', 'PARACETAMOL', 'IBUPROFEN',
+        'WATTENSCHIJFJES', 'WATTENSTAAFJES', 'LUIERS', 'BILLENDOEKJES', 'ZONNEBRAND', 'HAARGEL', 'MULTIVITAMINE',
+        'PAMPERS',
+    ),
+    'PAPER PRODUCTS': (
+        'TOILETPAPIER', 'KEUKENPAPIER', 'KEUKENROL', 'KEUKENROLLEN', 'TISSUES', 'ZAKDOEKJES', 'SERVETTEN',
+        'PAPIER', 'BAKPAPIER', 'KOFFIEFILTERS', 'FILTERZAKJES',
+    ),
+    'PET SUPPLIES': (
+        'KATTENVOER', 'HONDENVOER', 'VOER', 'KATTENBAK', 'KATTENBAKKORRELS', 'KATTENSNOEPJES', 'HONDENSNACK',
+        'HONDENSNACKS', 'WHISKAS', 'FELIX', 'SHEBA', 'PEDIGREE', 'KATTEN', 'HONDEN', 'DIERENVOEDING',
+        'KATTENBROKKEN', 'HONDENBROKKEN', 'BROKKEN',
+    ),
+}
+
+
+def tokenize(description: str) -> List[str]:
+    """Words of a description that can identify the product"""
+    return [token for token in TOKEN_PATTERN.findall(normalize_description(description))
+            if token not in IGNORED_TOKENS]
+
+
+def parse_prompt_categories(prompt: str) -> List[str]:
+    """Category names listed in the prompt"""
+    return PROMPT_CATEGORY_PATTERN.findall(prompt)
+
+
+def parse_prompt_keywords(prompt: str, categories: Iterable[str]) -> Dict[str, str]:
+    """Keyword hints from the prompt, e.g. 'Words like "kaas," "cheddar," ... indicate **CHEESE**'"""
+    categories = set(categories)
+    keywords = {}
+    for line in prompt.splitlines():
+        named = [category for category in PROMPT_BOLD_PATTERN.findall(line) if category in categories]
+        # Lines comparing several categories don't tell which keyword belongs where
+        if len(set(named)) != 1:
+            continue
+        for quoted in PROMPT_QUOTED_PATTERN.findall(line):
+            for token in tokenize(quoted):
+                keywords.setdefault(token, named[0])
+    return keywords
+
+
+class LocalCategorizer:
+    """Offline product categorizer consulted before the LLM.
+
+    Each word of a description is matched against a keyword lexicon (the
+    seed keywords plus hints from prompt.txt), preferring whole words, then
+    word endings, then word starts; a word start alone is not enough to skip
+    the LLM. Words seen in products the LLM has
+    categorized before vote with their observed category share. Products
+    whose words agree are categorized locally; conflicting or missing
+    evidence leaves them to the LLM.
+    """
+
+    DEFAULT_MIN_CONFIDENCE = 0.8
+    # Times a word must have been seen in LLM results before it votes
+    MIN_TOKEN_SUPPORT = 2
+
+    def __init__(self, keywords: Dict[str, str], min_confidence: float = DEFAULT_MIN_CONFIDENCE):
+        self.keywords = keywords
+        self.min_confidence = min_confidence
+        self.max_keyword_length = max((len(keyword) for keyword in keywords), default=0)
+        self.token_categories: Dict[str, Counter] = defaultdict(Counter)
+
+    @classmethod
+    def from_prompt(cls, prompt: str, min_confidence: float = DEFAULT_MIN_CONFIDENCE) -> 'LocalCategorizer':
+        """Categorizer for the categories listed in the prompt, using the seed and prompt keywords"""
+        categories = parse_prompt_categories(prompt)
+        keywords = {}
+        for category, words in SEED_KEYWORDS.items():
+            if category in categories:
+                for word in words:
+                    keywords[word] = category
+        keywords.update(parse_prompt_keywords(prompt, categories))
+        keywords = {keyword: category for keyword, category in keywords.items()
+                    if len(keyword) >= MIN_KEYWORD_LENGTH}
+        return cls(keywords, min_confidence)
+
+    def learn(self, categories: Dict[str, str]):
+        """Count the categories the LLM gave to products containing each word"""
+        for description, category in categories.items():
+            # OTHER means the model wasn't sure, which says nothing about the words
+            if category == 'OTHER':
+                continue
+            for token in set(tokenize(description)):
+                self.token_categories[token][category] += 1
+
+    def _match_keyword(self, token: str) -> Optional[Tuple[str, float]]:
+        category = self.keywords.get(token)
+        if category is not None:
+            return category, EXACT_MATCH_CONFIDENCE
+        # Longest keyword the word ends with, then the longest it starts with
+        for start in range(max(1, len(token) - self.max_keyword_length), len(token) - MIN_SUFFIX_LENGTH + 1):
+            category = self.keywords.get(token[start:])
+            if category is not None:
+                return category, SUFFIX_MATCH_CONFIDENCE
+        for end in range(min(len(token) - 1, self.max_keyword_length), MIN_PREFIX_LENGTH - 1, -1):
+            category = self.keywords.get(token[:end])
+            if category is not None:
+                return category, PREFIX_MATCH_CONFIDENCE
+        return None
+
+    def _token_evidence(self, token: str) -> Optional[Tuple[str, float]]:
+        observed = self.token_categories.get(token)
+        if observed:
+            total = sum(observed.values())
+            if total >= self.MIN_TOKEN_SUPPORT:
+                category, count = observed.most_common(1)[0]
+                return category, count / total
+        return self._match_keyword(token)
+
+    def classify(self, description: str) -> Tuple[Optional[str], float]:
+        """Most likely category of a product and the confidence in it, or (None, 0.0)"""
+        scores: Dict[str, float] = defaultdict(float)
+        best: Dict[str, float] = {}
+        for token in tokenize(description):
+            evidence = self._token_evidence(token)
+            if evidence is None:
+                continue
+            category, confidence = evidence
+            scores[category] += confidence
+            best[category] = max(best.get(category, 0.0), confidence)
+        if not scores:
+            return None, 0.0
+        category = max(scores, key=scores.get)
+        # Words pointing at other categories lower the confidence
+        return category, best[category] * scores[category] / sum(scores.values())
+
+    def categorize(self, products: Iterable[str]) -> Dict[str, Tuple[str, float]]:
+        """Category and confidence of the products classified with at least min_confidence"""
+        categories = {}
+        for product in products:
+            category, confidence = self.classify(product)
+            if category is not None and confidence >= self.min_confidence:
+                categories[product] = (category, confidence)
+        return categories
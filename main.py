@@ -1,16 +1,28 @@
-import requests
 import json
 from datetime import datetime
-import webbrowser
-from typing import List, Dict, Any
-from typing_extensions import TypedDict
+from typing import List, Dict, Any, Iterable, Optional, Set, TypedDict
 import argparse
-from collections import Counter
-import matplotlib.pyplot as plt
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+from receipt_store import FetchCheckpoint, ReceiptStore
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from token_store import DEFAULT_TOKEN_FILE, TokenStore
+from instrumentation import Metrics
+from categorizer import ProductCategorizer
+from local_categorizer import LocalCategorizer
+from prompt_template import PromptTemplate
+from receipt_table import ReceiptTable
+from receipt_io import iter_receipts, iter_tables, load_receipts, save_receipts, summary_key
+from receipt_archive import ARCHIVE_SUFFIX, is_archive, read_table, write_archive
+from parsing import euros_to_cents, format_cents
+from report_state import ReportState
+from batch_runner import find_receipt_files, run_batch
+from charts import CHARTS, render_charts
+from warehouse import ReceiptWarehouse
+from report_engine import Aggregator, Report, ReportEngine, MostBoughtItems, standard_aggregators
 
 class ProductCategory(TypedDict):
     product_name: str 
@@ -19,20 +31,55 @@ class ProductCategory(TypedDict):
 class AHReceiptsFetcher:
     BASE_URL = "https://api.ah.nl"
     USER_AGENT = "Appie/8.22.3"
+    DEFAULT_WORKERS = 8
+    # Refresh the access token when it expires within this many seconds
+    REFRESH_MARGIN = 300
+    # Requests per second at most; the limiter slows down below this when the API pushes back
+    DEFAULT_RATE_LIMIT = 10.0
+    THROTTLE_STATUS_CODES = {429, 503}
+    MAX_THROTTLE_RETRIES = 5
+    # Responses of the refresh endpoint meaning the refresh token is no longer valid
+    REJECTED_REFRESH_STATUS_CODES = {400, 401}
     
-    def __init__(self):
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, pool_size: int = None,
+                 token_store: Optional[TokenStore] = None, rate_limit: float = DEFAULT_RATE_LIMIT,
+                 metrics: Optional[Metrics] = None):
+        self.max_workers = max(1, max_workers)
+        # Keep at least one pooled connection per worker so threads don't block on the pool
+        self.pool_size = pool_size or self.max_workers
+        # requests is only imported by the fetcher, so analysis-only runs start faster
+        import requests
+        from requests.adapters import HTTPAdapter
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.session.headers.update({
             'User-Agent': self.USER_AGENT,
             'Content-Type': 'application/json'
         })
         self.access_token = None
+        self.token_store = token_store
+        self._refresh_token = None
+        self._expires_at = None
+        # Only one thread refreshes an expired token; the others reuse the new one
+        self._token_lock = threading.Lock()
+        self.rate_limiter = AdaptiveRateLimiter(rate_limit)
+        # Stage timings and per-request latencies, shared with the analyzer in main()
+        self.metrics = metrics or Metrics()
+    
+    def _post(self, url, payload):
+        """POST a JSON payload to the auth API"""
+        with self.metrics.timed('http.post', url=url) as span:
+            response = self.session.post(url, json=payload)
+            span['status'] = response.status_code
+        return response
         
     def get_anonymous_token(self):
         """Get an anonymous access token"""
-        response = self.session.post(
+        response = self._post(
             f"{self.BASE_URL}/mobile-auth/v1/auth/token/anonymous",
-            json={"clientId": "appie"}
+            {"clientId": "appie"}
         )
         response.raise_for_status()
         return response.json()["access_token"]
@@ -42,6 +89,7 @@ class AHReceiptsFetcher:
         auth_url = "https://login.ah.nl/secure/oauth/authorize?client_id=appie&redirect_uri=appie://login-exit&response_type=code"
         print(f"Please login in your browser. After login, copy the 'code' parameter from the URL.")
         print(f"The URL will look like 'appie://login-exit?code=YOUR_CODE'")
+        import webbrowser
         webbrowser.open(auth_url)
         
         auth_code = input("Enter the authorization code: ")
@@ -49,9 +97,9 @@ class AHReceiptsFetcher:
     
     def get_user_token(self, auth_code):
         """Exchange authorization code for user access token"""
-        response = self.session.post(
+        response = self._post(
             f"{self.BASE_URL}/mobile-auth/v1/auth/token",
-            json={
+            {
                 "clientId": "appie",
                 "code": auth_code
             }
@@ -61,9 +109,9 @@ class AHReceiptsFetcher:
     
     def refresh_token(self, refresh_token):
         """Refresh the access token using a refresh token"""
-        response = self.session.post(
+        response = self._post(
             f"{self.BASE_URL}/mobile-auth/v1/auth/token/refresh",
-            json={
+            {
                 "clientId": "appie",
                 "refreshToken": refresh_token
             }
@@ -71,330 +119,483 @@ class AHReceiptsFetcher:
         response.raise_for_status()
         return response.json()
     
-    def get_receipts(self):
-        """Get list of receipts"""
+    def _set_tokens(self, token_response):
+        """Use the tokens from a token endpoint response, saving them for later runs"""
+        self.access_token = token_response["access_token"]
+        # The refresh token may rotate; keep the current one if the response has none
+        self._refresh_token = token_response.get("refresh_token") or self._refresh_token
+        expires_in = token_response.get("expires_in")
+        self._expires_at = time.time() + expires_in if expires_in else None
+        if self.token_store is not None:
+            self.token_store.save({
+                "access_token": self.access_token,
+                "refresh_token": self._refresh_token,
+                "expires_at": self._expires_at,
+            })
+    
+    def _token_expiring(self):
+        return self._expires_at is not None and self._expires_at - time.time() < self.REFRESH_MARGIN
+    
+    def refresh_access_token(self, expired_token=None):
+        """Refresh the access token; a no-op if another thread already replaced expired_token"""
+        with self._token_lock:
+            if expired_token is not None and self.access_token != expired_token:
+                return
+            if not self._refresh_token:
+                raise ValueError("Access token expired and there is no refresh token. Log in again.")
+            self.metrics.count('http.token_refreshes')
+            self._set_tokens(self.refresh_token(self._refresh_token))
+    
+    def _authorized_get(self, url):
+        """GET with the access token, refreshing it when it is about to expire or gets rejected"""
         if not self.access_token:
             raise ValueError("Not authenticated. Call authenticate() first.")
-            
-        response = self.session.get(
-            f"{self.BASE_URL}/mobile-services/v1/receipts",
-            headers={'Authorization': f'Bearer {self.access_token}'}
-        )
+        
+        token = self.access_token
+        if self._token_expiring():
+            self.refresh_access_token(token)
+            token = self.access_token
+        response = self._paced_get(url, token)
+        if response.status_code == 401 and self._refresh_token:
+            self.metrics.count('http.unauthorized_retries')
+            self.refresh_access_token(token)
+            response = self._paced_get(url, self.access_token)
         response.raise_for_status()
-        return response.json()
+        return response
+    
+    def _paced_get(self, url, token):
+        """GET through the shared rate limiter, waiting out 429/503 responses"""
+        for attempt in range(self.MAX_THROTTLE_RETRIES + 1):
+            # Time spent waiting for the limiter is recorded apart from the request itself
+            with self.metrics.timed('http.rate_limit_wait'):
+                self.rate_limiter.acquire()
+            with self.metrics.timed('http.get', url=url) as span:
+                response = self.session.get(url, headers={'Authorization': f'Bearer {token}'})
+                span['status'] = response.status_code
+            if response.status_code not in self.THROTTLE_STATUS_CODES:
+                self.rate_limiter.succeeded()
+                return response
+            # Every thread backs off: the rate is halved and Retry-After pauses all requests
+            self.metrics.count('http.throttled')
+            self.rate_limiter.throttled(parse_retry_after(response.headers.get('Retry-After')))
+        return response
+    
+    def get_receipts(self):
+        """Get list of receipts"""
+        return self._authorized_get(f"{self.BASE_URL}/mobile-services/v1/receipts").json()
     
     def get_receipt_details(self, transaction_id):
         """Get details for a specific receipt"""
-        if not self.access_token:
-            raise ValueError("Not authenticated. Call authenticate() first.")
-            
-        response = self.session.get(
-            f"{self.BASE_URL}/mobile-services/v2/receipts/{transaction_id}",
-            headers={'Authorization': f'Bearer {self.access_token}'}
-        )
-        response.raise_for_status()
-        return response.json()
+        return self._authorized_get(f"{self.BASE_URL}/mobile-services/v2/receipts/{transaction_id}").json()
+    
+    def _restore_login(self):
+        """Use the saved tokens, refreshing them if needed; False if the user must log in again"""
+        tokens = self.token_store.load() if self.token_store is not None else None
+        if not tokens:
+            return False
+        self.access_token = tokens.get("access_token")
+        self._refresh_token = tokens.get("refresh_token")
+        self._expires_at = tokens.get("expires_at")
+        if self.access_token and not self._token_expiring():
+            return True
+        if not self._refresh_token:
+            error = "the access token expired and no refresh token was saved"
+        else:
+            import requests
+            try:
+                self.refresh_access_token()
+                return True
+            except requests.HTTPError as e:
+                # Only a rejected refresh token is forgotten; network errors and outages fail this run
+                # and leave the saved login for the next one
+                if e.response is None or e.response.status_code not in self.REJECTED_REFRESH_STATUS_CODES:
+                    raise
+                error = str(e)
+        print(f"Warning: The saved login can't be used: {error}")
+        self.access_token = self._refresh_token = self._expires_at = None
+        self.token_store.clear()
+        return False
     
     def authenticate(self):
-        """Complete authentication flow"""
-        auth_code = self.get_auth_code()
-        token_response = self.get_user_token(auth_code)
-        self.access_token = token_response["access_token"]
-        return token_response
+        """Complete authentication flow, reusing the saved login from an earlier run if possible"""
+        with self.metrics.stage('fetch.authenticate'):
+            if self._restore_login():
+                print("Reusing saved login")
+                return {"access_token": self.access_token, "refresh_token": self._refresh_token}
+            auth_code = self.get_auth_code()
+            token_response = self.get_user_token(auth_code)
+            self._set_tokens(token_response)
+            return token_response
+
+    def _receipt_date(self, receipt):
+        """Local date string of a listing entry, as written to the JSON file"""
+        date = datetime.fromisoformat(receipt['transactionMoment'].replace('Z', '+00:00'))
+        return date.strftime('%Y-%m-%d %H:%M')
 
-    def fetch_and_save_receipts(self):
-        """Fetch receipts and save them to JSON file"""
-        receipts = self.get_receipts()
+    def _summary_key(self, receipt):
+        """summary_key of a listing entry, used to match entries saved without a transactionId"""
+        return summary_key({"date": self._receipt_date(receipt),
+                            "amount_cents": euros_to_cents(receipt['total']['amount']['amount'])})
+
+    def _build_receipt_entry(self, receipt, details):
+        """Convert a receipt listing entry and its details into our JSON format"""
+        products = [item for item in details['receiptUiItems'] if item['type'] == 'product' and 'amount' in item]
+        
+        receipt_entry = {
+            "transactionId": receipt['transactionId'],
+            "date": self._receipt_date(receipt),
+            "amount_cents": euros_to_cents(receipt['total']['amount']['amount']),
+            "products": []
+        }
         
-        receipt_data = []
-        for receipt in receipts:
-            date = datetime.fromisoformat(receipt['transactionMoment'].replace('Z', '+00:00'))
-            amount = receipt['total']['amount']['amount']
-            
+        for product in products:
+            qty = product.get('quantity', '1')
+            desc = product['description']
+            receipt_entry["products"].append({
+                "quantity": qty,
+                "description": desc,
+                "amount_cents": euros_to_cents(product['amount'])
+            })
+        return receipt_entry
+    
+    def _fetch_receipt_entry(self, receipt):
+        """Fetch details for one receipt, returning None if the request fails"""
+        import requests
+        try:
             details = self.get_receipt_details(receipt['transactionId'])
-            products = [item for item in details['receiptUiItems'] if item['type'] == 'product' and 'amount' in item]
-            
-            receipt_entry = {
-                "date": date.strftime('%Y-%m-%d %H:%M'),
-                "amount": f"€{amount:.2f}",
-                "products": []
-            }
-            
-            for product in products:
-                qty = product.get('quantity', '1')
-                desc = product['description']
-                product_amount = product['amount']
-                receipt_entry["products"].append({
-                    "quantity": qty,
-                    "description": desc,
-                    "amount": f"€{product_amount}"
-                })
-                
-            receipt_data.append(receipt_entry)
+            return self._build_receipt_entry(receipt, details)
+        except (requests.RequestException, KeyError, TypeError, ValueError) as e:
+            print(f"Warning: Could not fetch receipt {receipt.get('transactionId')}: {str(e)}")
+            self.metrics.count('fetch.failed_receipts')
+            return None
+
+    def fetch_receipt_entries(self, receipts, on_entry=None) -> List[Dict[str, Any]]:
+        """Fetch receipt details concurrently, keeping the listing order; on_entry sees each entry as it arrives"""
+        def fetch(receipt):
+            entry = self._fetch_receipt_entry(receipt)
+            if entry is not None and on_entry is not None:
+                on_entry(entry)
+            return entry
         
-        with open('ah_receipts.json', 'w', encoding='utf-8') as f:
-            json.dump(receipt_data, f, indent=2, ensure_ascii=False)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # map() yields results in submission order, so output stays deterministic
+            entries = list(executor.map(fetch, receipts))
         
-        return 'ah_receipts.json'
+        failed = sum(1 for entry in entries if entry is None)
+        if failed:
+            print(f"Warning: {failed} of {len(receipts)} receipts could not be fetched")
+        return [entry for entry in entries if entry is not None]
 
-class AHReceiptAnalyzer:
-    def __init__(self, json_file: str):
-        load_dotenv()
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.model = genai.GenerativeModel('gemini-1.5-flash-8b')
+    def fetch_and_save_receipts(self, json_file: str = 'ah_receipts.json', full_refresh: bool = False):
+        """Sync receipts into the local JSON file, fetching details only for new receipts"""
+        with self.metrics.stage('fetch.list_receipts'):
+            receipts = self.get_receipts()
+        store = ReceiptStore(json_file)
+        # Receipts fetched by an interrupted sync are not requested again
+        checkpoint = FetchCheckpoint(json_file)
+        resumed = checkpoint.load()
+        for entry in resumed:
+            store.add(entry)
+        if resumed:
+            print(f"Resuming an interrupted sync with {len(resumed)} receipts already fetched")
         
-        with open(json_file, 'r', encoding='utf-8') as f:
-            self.data = json.load(f)
-        self.process_data()
-    
-    def _convert_amount(self, amount_str: str) -> float:
-        """Helper method to convert amount strings to float"""
-        if not isinstance(amount_str, str):
-            return 0.0
-        if amount_str == '€None' or amount_str.startswith('€xx'):
-            return 0.0
-        try:
-            cleaned = amount_str.replace('€', '').replace(',', '.')
-            return float(cleaned)
-        except (ValueError, AttributeError):
-            return 0.0
+        if full_refresh:
+            # Legacy entries get the transactionId of their listing entry, so the re-fetched receipt
+            # replaces them instead of being saved next to them
+            for receipt in receipts:
+                store.adopt_legacy(receipt['transactionId'], self._summary_key(receipt))
+            fetched = {entry['transactionId'] for entry in resumed}
+            new_receipts = [receipt for receipt in receipts if receipt['transactionId'] not in fetched]
+        else:
+            new_receipts = [
+                receipt for receipt in receipts
+                if receipt['transactionId'] not in store
+                and not store.adopt_legacy(receipt['transactionId'], self._summary_key(receipt))
+            ]
+        print(f"{len(receipts)} receipts listed, {len(new_receipts)} new")
+        self.metrics.gauge('fetch.receipts_listed', len(receipts))
+        self.metrics.gauge('fetch.receipts_new', len(new_receipts))
+        self.metrics.gauge('fetch.receipts_resumed', len(resumed))
+        
+        with self.metrics.stage('fetch.details', receipts=len(new_receipts)):
+            for entry in self.fetch_receipt_entries(new_receipts, on_entry=checkpoint.append):
+                store.add(entry)
+        with self.metrics.stage('fetch.save'):
+            store.save(receipt['transactionId'] for receipt in receipts)
+        checkpoint.remove()
+        
+        return json_file
 
+class AHReceiptAnalyzer:
+    STREAM_CHUNK_SIZE = 1000
+    
+    def __init__(self, json_file: str, categorizer: Optional[ProductCategorizer] = None,
+                 stream: bool = False, db_path: str = None, state_file: str = None,
+                 metrics: Optional[Metrics] = None):
+        self.metrics = metrics or Metrics()
+        # Shared with other analyzers and the batch runner, so they use one cache and product index
+        self.categorizer = categorizer or ProductCategorizer(metrics=self.metrics)
+        self.extra_aggregators: List[Aggregator] = []
+        self._report = None
+        self.json_file = json_file
+        self.table = None
+        self.warehouse = None
+        self.report_state = None
+        self._aggregators: List[Aggregator] = []
+        
+        if db_path:
+            # Metrics run as SQL over the warehouse; only receipts it hasn't seen are imported
+            self.warehouse = ReceiptWarehouse(db_path)
+            with self.metrics.stage('warehouse_import'):
+                added = self.warehouse.import_receipts(iter_receipts(json_file))
+            print(f"Imported {added} new receipts into {db_path}")
+        elif state_file:
+            # Saved totals are restored when the report is built; only new receipts are read into tables
+            self.report_state = ReportState(state_file, json_file)
+        elif not stream and is_archive(json_file):
+            # Columns are mapped from the archive directly, without building receipt dicts
+            with self.metrics.stage('read_table'):
+                self.table = read_table(json_file)
+        elif not stream:
+            # In streaming mode receipts are read chunk by chunk while the report is computed
+            with self.metrics.stage('load_receipts'):
+                self.data = load_receipts(json_file)
+            self.process_data()
+    
     def process_data(self):
-        """Convert string amounts to float and dates to datetime"""
-        for receipt in self.data:
-            receipt['amount'] = self._convert_amount(receipt['amount'])
-            receipt['date'] = datetime.strptime(receipt['date'], '%Y-%m-%d %H:%M')
-            
-            for product in receipt['products']:
-                product['amount'] = self._convert_amount(product['amount'])
-    
-    def total_spending(self) -> float:
-        """Calculate total spending across all receipts"""
-        return sum(receipt['amount'] for receipt in self.data)
-    
-    def average_transaction(self) -> float:
-        """Calculate average transaction amount"""
-        return self.total_spending() / len(self.data)
-    
-    def most_bought_items(self, top_n: int = 10) -> List[tuple]:
+        """Parse amounts and dates into a columnar receipt table"""
+        with self.metrics.stage('process_data'):
+            self.table = ReceiptTable.from_receipts(self.data)
+        # The table holds everything the metrics need, so drop the parsed JSON tree
+        self.data = None
+    
+    def _tables(self) -> Iterable[ReceiptTable]:
+        """The loaded receipt table, or chunks of it read from disk in streaming mode"""
+        if self.table is not None:
+            return [self.table]
+        return iter_tables(self.json_file, self.STREAM_CHUNK_SIZE)
+    
+    def _aggregate(self, *aggregators: Aggregator) -> Dict[str, Any]:
+        """Run the given aggregators over the receipts in one scan"""
+        engine = ReportEngine(list(aggregators))
+        engine.scan(self._tables())
+        return engine.report()
+    
+    def register_aggregator(self, aggregator: Aggregator):
+        """Add a custom aggregator whose sections are appended to the report"""
+        self.extra_aggregators.append(aggregator)
+        self._report = None
+    
+    def get_report(self) -> Report:
+        """The analysis report, built once; sections are computed when first accessed"""
+        if self._report is None:
+            if self.warehouse is not None:
+                aggregators = self.warehouse.report_aggregators(self.categorizer.categorize, self.categorizer.canonical)
+            else:
+                aggregators = standard_aggregators(self.categorizer.categorize, self.categorizer.canonical)
+            self._aggregators = [*aggregators, *self.extra_aggregators]
+            tables = self._tables()
+            if self.report_state is not None:
+                if self.report_state.restore(self._aggregators):
+                    print(f"Restored report state for {len(self.report_state.receipt_keys)} receipts")
+                receipts = self.report_state.new_receipts(iter_receipts(self.json_file))
+                tables = ReceiptTable.iter_chunks(receipts, self.STREAM_CHUNK_SIZE)
+            self._report = Report(self._aggregators, tables, self.metrics)
+        return self._report
+    
+    def save_report_state(self):
+        """Persist the report's running totals so the next run only scans new receipts"""
+        if self.report_state is None:
+            return
+        self.get_report().scan()
+        self.report_state.save(self._aggregators)
+    
+    def total_spending(self) -> int:
+        """Calculate total spending across all receipts, in cents"""
+        return self.get_report()['total_spending']
+    
+    def average_transaction(self) -> int:
+        """Calculate average transaction amount, in cents"""
+        return self.get_report()['average_transaction']
+    
+    def most_bought_items(self, top_n: int = MostBoughtItems.DEFAULT_TOP_N) -> List[tuple]:
         """Get the most frequently bought items"""
-        excluded_items = {
-            'BONUSKAART', 'PINNEN', 'Waarvan', 'BONUS BOX', 
-            'AIRMILES NR. *', 'MIJN AH MILES', 'eSPAARZEGELS', 'eSPAARZEGEL',
-            'STATIEGELD', '+STATIEGELD', '-STATIEGELD', 'EMBALLAGE',
-            'Prijs per kg', 'BONUS', 'BONUSITEM', 'INCL.HEF.SUP'
-        }
-        
-        items = []
-        for receipt in self.data:
-            items.extend(product['description'] for product in receipt['products']
-                        if product['description'] not in excluded_items 
-                        and not product['description'].startswith('BONUS')
-                        and product['quantity'] is not None)  # Only include items with non-null quantity
-        return Counter(items).most_common(top_n)
-    
-    def bonus_savings(self) -> float:
-        """Calculate total bonus savings"""
-        total_bonus = 0
-        for receipt in self.data:
-            bonus_items = [p['amount'] for p in receipt['products'] 
-                         if isinstance(p['quantity'], str) and p['quantity'] == 'BONUS']
-            total_bonus += abs(sum(bonus_items))
-        return total_bonus
-    
-    def spending_by_day(self) -> Dict[str, float]:
-        """Calculate spending aggregated by day"""
-        daily_spending = {}
-        for receipt in self.data:
-            date_str = receipt['date'].strftime('%Y-%m-%d')
-            daily_spending[date_str] = daily_spending.get(date_str, 0) + receipt['amount']
-        return daily_spending
+        if top_n == MostBoughtItems.DEFAULT_TOP_N:
+            return self.get_report()['most_bought_items']
+        if self.warehouse is not None:
+            return self.warehouse.most_bought_items(top_n, self.categorizer.canonical)['most_bought_items']
+        return self._aggregate(MostBoughtItems(top_n, self.categorizer.canonical))['most_bought_items']
+    
+    def bonus_savings(self) -> int:
+        """Calculate total bonus savings, in cents"""
+        return self.get_report()['total_bonus_savings']
+    
+    def spending_by_day(self) -> Dict[str, int]:
+        """Calculate spending aggregated by day, in cents"""
+        return self.get_report()['spending_by_day']
 
-    def categorize_products(self) -> Dict[str, float]:
-        """Categorize products using Gemini LLM"""
-        # Collect all unique product descriptions
-        products = set()
-        for receipt in self.data:
-            for product in receipt['products']:
-                # Skip bonus entries, statiegeld, non-product items and items with null quantity
-                if (isinstance(product['quantity'], str) and product['quantity'] == 'BONUS' or
-                    any(skip in product['description'].upper() for skip in 
-                        ['STATIEGELD', 'BONUS', 'PINNEN', 'AIRMILES', 'WAARVAN', 'EMBALLAGE',
-                         'DIERENKAART', 'DISNEYSPAREN', 'ESPAARZEL', 'ESPAARZEGELS']) or
-                    product['quantity'] is None):  # Skip items with null quantity
-                    continue
-                products.add(product['description'])
-        # Create prompt for Gemini
-        with open('prompt.txt', 'r', encoding='utf-8') as f:
-            prompt = f.read() + "\n".join(sorted(products))
-            
-        try:
-            # Split products into smaller batches if needed
-            MAX_PRODUCTS_PER_BATCH = 50
-            products_list = list(products)
-            categories_map = {}
-            other_products = []  # Track products categorized as OTHER
-            
-            for i in range(0, len(products_list), MAX_PRODUCTS_PER_BATCH):
-                batch = products_list[i:i + MAX_PRODUCTS_PER_BATCH]
-                batch_prompt = prompt.replace("\n".join(sorted(products)), "\n".join(batch))
-                
-                response = self.model.generate_content(
-                    batch_prompt,
-                    generation_config=genai.GenerationConfig(
-                        temperature=0.1,
-                        candidate_count=1,
-                    )
-                )
-                
-                try:
-                    # Extract JSON from response
-                    response_text = response.text
-                    # Find the start and end of the JSON array
-                    start_idx = response_text.find('[')
-                    end_idx = response_text.rfind(']') + 1
-                    
-                    if start_idx >= 0 and end_idx > start_idx:
-                        json_str = response_text[start_idx:end_idx]
-                        batch_categories = json.loads(json_str)
-                        
-                        # Update categories map and track OTHER products
-                        for item in batch_categories:
-                            if isinstance(item, dict) and 'product_name' in item and 'category' in item:
-                                categories_map[item['product_name']] = item['category']
-                                if item['category'] == 'OTHER':
-                                    other_products.append(item['product_name'])
-                    
-                except json.JSONDecodeError as e:
-                    print(f"Warning: Could not parse batch {i//MAX_PRODUCTS_PER_BATCH + 1} response: {str(e)}")
-                    continue
-                
-            # Save OTHER category products to a separate file
-            output_path = Path('analysis_output')
-            output_path.mkdir(exist_ok=True)
-            with open(output_path / 'other_category_products.txt', 'w', encoding='utf-8') as f:
-                f.write("Products in OTHER category:\n")
-                for product in sorted(other_products):
-                    f.write(f"- {product}\n")
-                
-        except Exception as e:
-            print(f"Warning: Error processing AI categorization: {str(e)}. Using 'OTHER' as default category.")
-            categories_map = {}
-        
-        # Calculate spending by category
-        category_spending = {}
-        for receipt in self.data:
-            for product in receipt['products']:
-                # Skip bonus/action entries, null quantities and ensure amount is valid
-                if (isinstance(product['quantity'], str) and (product['quantity'] == 'BONUS' or product['quantity'] == 'ACTIE') or
-                    not isinstance(product['amount'], (int, float)) or
-                    product['quantity'] is None):  # Skip items with null quantity
-                    continue
-                category = categories_map.get(product['description'], 'OTHER')
-                category_spending[category] = category_spending.get(category, 0) + product['amount']
-        
-        return category_spending
+    def categorize_products(self) -> Dict[str, int]:
+        """Categorize products using Gemini LLM; returns spending per category in cents"""
+        return self.get_report()['spending_by_category']
     
     def generate_report(self) -> Dict[str, Any]:
-        """Generate a comprehensive analysis report"""
-        report = {
-            'total_spending': self.total_spending(),
-            'num_transactions': len(self.data),
-            'average_transaction': self.average_transaction(),
-            'total_bonus_savings': self.bonus_savings(),
-            'most_bought_items': self.most_bought_items(),
-            'spending_by_day': self.spending_by_day(),
-            'spending_by_category': self.categorize_products()
-        }
-        return report
+        """Generate a comprehensive analysis report; money amounts are integer cents, as amount_unit says"""
+        return {'amount_unit': 'cents', **self.get_report()}
     
-    def save_report(self, output_dir: str = 'analysis_output'):
-        """Save analysis results and generate visualizations"""
+    def save_report(self, output_dir: str = 'analysis_output', charts: Optional[Iterable[str]] = None):
+        """Save analysis results and render the selected charts (all by default; pass () to skip them)"""
         # Create output directory
         output_path = Path(output_dir)
         output_path.mkdir(exist_ok=True)
         
-        # Generate and save report
-        report = self.generate_report()
-        with open(output_path / 'analysis_report.json', 'w', encoding='utf-8') as f:
-            json.dump(report, f, indent=2)
-        
-        # Create spending by category pie chart
-        plt.figure(figsize=(10, 8))
-        categories = report.get('spending_by_category', {})
-        if not categories:  # Handle empty or None categories
-            print("Warning: No category spending data available")
-            categories = {}
-        
-        # Filter out negative values and sort by value
-        positive_categories = {k: v for k, v in categories.items() if v > 0}
+        # Generate and save report; sections not computed yet are timed as stages of their own
+        report = self.get_report()
+        with self.metrics.stage('write_report'):
+            with open(output_path / 'analysis_report.json', 'w', encoding='utf-8') as f:
+                json.dump(self.generate_report(), f, indent=2)
+        with self.metrics.stage('save_report_state'):
+            self.save_report_state()
         
-        if positive_categories:  # Only create pie chart if there are positive values
-            values = list(positive_categories.values())
-            labels = list(positive_categories.keys())
-            plt.pie(values, labels=labels, autopct='%1.1f%%')
-            plt.title('Spending by Category (Positive Values Only)')
-            plt.savefig(output_path / 'category_spending.png')
-        else:
-            print("Warning: No positive category spending values to create pie chart")
-        plt.close()
-        
-        # Create daily spending line chart
-        plt.figure(figsize=(12, 6))
-        daily_spending = report.get('spending_by_day', {})
-        if daily_spending:
-            dates = list(daily_spending.keys())
-            amounts = list(daily_spending.values())
-            plt.plot(dates, amounts, marker='o')
-            plt.xticks(rotation=45)
-            plt.title('Daily Spending')
-            plt.xlabel('Date')
-            plt.ylabel('Amount (€)')
-            plt.tight_layout()
-            plt.savefig(output_path / 'daily_spending.png')
-        else:
-            print("Warning: No daily spending data available")
-        plt.close()
+        # Charts render in worker processes; matplotlib is only imported when one is selected
+        with self.metrics.stage('render_charts'):
+            render_charts(report, output_dir, charts)
 
 def main():
     parser = argparse.ArgumentParser(description='AH Receipts Fetcher and Analyzer')
     parser.add_argument('--fetch', action='store_true', help='Fetch new receipts from AH')
     parser.add_argument('--process-json', type=str, help='Process existing JSON file')
+    parser.add_argument('--workers', type=int, default=AHReceiptsFetcher.DEFAULT_WORKERS,
+                        help='Number of concurrent receipt detail requests when fetching')
+    parser.add_argument('--pool-size', type=int, default=None,
+                        help='HTTP connection pool size per host (defaults to --workers)')
+    parser.add_argument('--receipts-file', type=str, default='ah_receipts.json',
+                        help='Local receipts file to sync into; use a .jsonl suffix for JSON Lines')
+    parser.add_argument('--rate-limit', type=float, default=AHReceiptsFetcher.DEFAULT_RATE_LIMIT,
+                        help='Maximum receipt requests per second; lowered automatically when AH throttles')
+    parser.add_argument('--token-file', type=str, default=str(DEFAULT_TOKEN_FILE),
+                        help='Where the AH login is kept between runs, so scheduled syncs need no browser login')
+    parser.add_argument('--full-refresh', action='store_true',
+                        help='Re-download details for all receipts instead of only new ones')
+    parser.add_argument('--convert', nargs=2, metavar=('SOURCE', 'TARGET'), default=None,
+                        help=f'Convert a receipts file between formats by suffix (.json, .jsonl, {ARCHIVE_SUFFIX})')
+    parser.add_argument('--compression', choices=('zstd', 'gzip', 'none'), default=None,
+                        help=f'Compression of {ARCHIVE_SUFFIX} archives written by --convert (default: zstd if '
+                             'installed, else gzip; none keeps columns memory-mappable)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Read the receipts file incrementally instead of loading it at once')
+    parser.add_argument('--db', type=str, default=None,
+                        help='Import receipts into this SQLite database and compute the report with SQL')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Keep report totals in analysis_output/report_state.json and only process new receipts')
+    parser.add_argument('--local-confidence', type=float, default=LocalCategorizer.DEFAULT_MIN_CONFIDENCE,
+                        help='Minimum confidence for categorizing a product locally instead of with Gemini '
+                             '(above 1 sends every product to Gemini)')
+    parser.add_argument('--no-dedup', action='store_true',
+                        help='Treat every receipt spelling of a product as a separate product')
+    parser.add_argument('--receipt-width', type=int, default=None,
+                        help='Characters your receipts print per description; descriptions this long are '
+                             'grouped with the longer name they were cut off from')
+    parser.add_argument('--max-prompt-tokens', type=int, default=PromptTemplate.DEFAULT_MAX_PROMPT_TOKENS,
+                        help='Token budget of each categorization prompt, including the instructions')
+    parser.add_argument('--reuse-prompt-prefix', action='store_true',
+                        help='Give Gemini the prompt.txt instructions as a fixed system instruction; '
+                             'requests then only carry the product list')
+    parser.add_argument('--batch', type=str, default=None,
+                        help='Analyze every receipts file in this directory (or matching this glob) as a '
+                             'separate account, plus a merged cross-account report')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                        help='Number of worker processes scanning receipt files in --batch mode')
+    parser.add_argument('--charts', type=str, default=None,
+                        help=f"Comma-separated charts to render (default: all of {', '.join(CHARTS)})")
+    parser.add_argument('--no-charts', action='store_true',
+                        help='Only write the JSON report, without rendering charts')
+    parser.add_argument('--llm-concurrency', type=int, default=ProductCategorizer.DEFAULT_LLM_CONCURRENCY,
+                        help='Number of product batches sent to Gemini concurrently')
+    parser.add_argument('--metrics', type=str, default=None,
+                        help='Write stage timings, HTTP and Gemini request statistics and peak memory to this JSON file')
+    parser.add_argument('--trace', type=str, default=None,
+                        help='Write a Chrome trace-event file of the run (open in chrome://tracing or Perfetto)')
     
     args = parser.parse_args()
+    state_file = str(Path('analysis_output') / 'report_state.json') if args.incremental else None
+    charts = () if args.no_charts else args.charts.split(',') if args.charts else None
+    if charts and not set(charts) <= CHARTS.keys():
+        parser.error(f"--charts must be a comma-separated subset of {', '.join(CHARTS)}")
+    if args.rate_limit <= 0:
+        parser.error("--rate-limit must be positive")
+    if args.receipt_width is not None and args.receipt_width <= 0:
+        parser.error("--receipt-width must be positive")
+    
+    # Recorded even when a command fails, so a slow or broken run can still be examined
+    metrics = Metrics()
+    try:
+        run(args, charts, state_file, metrics)
+    finally:
+        metrics.save_files(args.metrics, args.trace)
+
+def run(args, charts, state_file, metrics):
+    """Run the commands selected on the command line"""
+    categorizer = ProductCategorizer(llm_concurrency=args.llm_concurrency, local_confidence=args.local_confidence,
+                                     dedup_products=not args.no_dedup, receipt_width=args.receipt_width,
+                                     max_prompt_tokens=args.max_prompt_tokens,
+                                     reuse_prompt_prefix=args.reuse_prompt_prefix, metrics=metrics)
+    if args.convert:
+        source, target = args.convert
+        if is_archive(target):
+            write_archive(target, iter_receipts(source), args.compression)
+        else:
+            save_receipts(target, iter_receipts(source))
+        print(f"Converted {source} ({os.path.getsize(source)} bytes) to {target} ({os.path.getsize(target)} bytes)")
     
     if args.fetch:
         print("Starting receipt fetching process...")
-        fetcher = AHReceiptsFetcher()
+        fetcher = AHReceiptsFetcher(max_workers=args.workers, pool_size=args.pool_size,
+                                    token_store=TokenStore(args.token_file), rate_limit=args.rate_limit,
+                                    metrics=metrics)
         print("Starting authentication process...")
         auth_data = fetcher.authenticate()
         print("Successfully authenticated!")
         
         print("\nFetching receipts...")
-        json_file = fetcher.fetch_and_save_receipts()
+        json_file = fetcher.fetch_and_save_receipts(args.receipts_file, full_refresh=args.full_refresh)
         print(f"\nReceipts have been saved to {json_file}")
         
         # Automatically analyze the fetched receipts
         print("\nAnalyzing fetched receipts...")
-        analyzer = AHReceiptAnalyzer(json_file)
-        analyzer.save_report()
+        analyzer = AHReceiptAnalyzer(json_file, categorizer, stream=args.stream, db_path=args.db,
+                                     state_file=state_file, metrics=metrics)
+        analyzer.save_report(charts=charts)
     
     if args.process_json:
         print(f"\nAnalyzing receipts from {args.process_json}...")
-        analyzer = AHReceiptAnalyzer(args.process_json)
-        analyzer.save_report()
+        analyzer = AHReceiptAnalyzer(args.process_json, categorizer, stream=args.stream, db_path=args.db,
+                                     state_file=state_file, metrics=metrics)
+        analyzer.save_report(charts=charts)
         print("\nAnalysis complete! Check the 'analysis_output' directory for results.")
         
-        # Print some quick insights
-        report = analyzer.generate_report()
+        # Print some quick insights, reusing the sections computed for the saved report
+        report = analyzer.get_report()
         print(f"\nQuick insights:")
-        print(f"Total spending: €{report['total_spending']:.2f}")
+        print(f"Total spending: {format_cents(report['total_spending'])}")
         print(f"Number of transactions: {report['num_transactions']}")
-        print(f"Average transaction: €{report['average_transaction']:.2f}")
-        print(f"Total bonus savings: €{report['total_bonus_savings']:.2f}")
+        print(f"Average transaction: {format_cents(report['average_transaction'])}")
+        print(f"Total bonus savings: {format_cents(report['total_bonus_savings'])}")
         print("\nTop 10 most bought items:")
         for item, count in report['most_bought_items'][:10]:
             print(f"- {item}: {count} times")
+    
+    if args.batch:
+        files = find_receipt_files(args.batch)
+        if not files:
+            print(f"Warning: No receipt files found for {args.batch}")
+            return
+        print(f"\nAnalyzing {len(files)} receipt files from {args.batch}...")
+        # Products are categorized here, with one cache shared by all accounts; workers scan the receipts
+        with metrics.stage('batch', files=len(files)):
+            report = run_batch(files, categorizer.categorize, categorizer.canonical, processes=args.processes)
+        print("\nBatch analysis complete! Per-account reports are in 'analysis_output/accounts'.")
+        print(f"Total spending across accounts: {format_cents(report['total_spending'])}")
+        print(f"Number of transactions: {report['num_transactions']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,65 @@
+import re
+from typing import Any, Dict
+
+# Amounts as written to ah_receipts.json: "€12.34", "€1,99", "€-0.50", "-€0.50", ...
+AMOUNT_PATTERN = re.compile(r'\s*(-?)€?\s*(-?)(\d*)(?:[.,](\d*))?\s*')
+
+# Receipts repeat the same prices over and over, so parsed amounts are cached
+MAX_CACHE_SIZE = 1 << 16
+_cents_cache: Dict[str, int] = {}
+
+
+def _parse_cents(amount_str: str) -> int:
+    """Parse an amount string into integer cents; unparseable amounts count as 0"""
+    match = AMOUNT_PATTERN.fullmatch(amount_str)
+    if match is None:
+        # '€None', '€xx.xx' placeholders and other junk
+        return 0
+    sign_before, sign_after, whole, fraction = match.groups()
+    if not whole and not fraction:
+        return 0
+    fraction = fraction or ''
+    cents = int(whole or 0) * 100 + int((fraction + '00')[:2])
+    if len(fraction) > 2 and fraction[2] >= '5':
+        # Round half up on the third decimal, like round(float * 100) would for our inputs
+        cents += 1
+    return -cents if (sign_before or sign_after) else cents
+
+
+def parse_cents(amount: Any) -> int:
+    """Convert a stored amount to integer cents, caching repeated strings.
+
+    Integers are already cents (the amount_cents fields written by the
+    fetcher); strings are the "€x.xx" amounts of older receipt files.
+    """
+    if isinstance(amount, int):
+        return amount
+    if not isinstance(amount, str):
+        return 0
+    cents = _cents_cache.get(amount)
+    if cents is None:
+        if len(_cents_cache) >= MAX_CACHE_SIZE:
+            _cents_cache.clear()
+        cents = _cents_cache[amount] = _parse_cents(amount)
+    return cents
+
+
+def euros_to_cents(amount: Any) -> int:
+    """Convert an amount from the AH API (a euro number or string) to integer cents"""
+    if isinstance(amount, (int, float)):
+        return round(amount * 100)
+    if isinstance(amount, str):
+        return parse_cents(amount)
+    return 0
+
+
+def cents_to_euros(cents: int) -> float:
+    """Convert integer cents to euros, for plotting only"""
+    return cents / 100
+
+
+def format_cents(cents: int) -> str:
+    """Format integer cents as a euro amount, e.g. 1234 -> '€12.34'"""
+    sign = '-' if cents < 0 else ''
+    whole, fraction = divmod(abs(cents), 100)
+    return f"€{sign}{whole}.{fraction:02d}"
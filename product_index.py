@@ -0,0 +1,174 @@
+import re
+import zlib
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from category_cache import normalize_description
+
+# Weight, volume and count suffixes such as "500G", "1,5 L", "6X33CL", "4 ST"
+QUANTITY_PATTERN = re.compile(
+    r'\b\d+(?:[.,]\d+)?\s*(?:X\s*\d+(?:[.,]\d+)?\s*)?(?:KG|GRAM|GR|G|ML|CL|LTR|L|STUKS|STK|ST)\b')
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s+%]")
+DIGITS_PATTERN = re.compile(r'\d+')
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def canonical_form(description: str) -> str:
+    """Description without case, punctuation and quantity suffixes, e.g. 'AH Halfvolle melk 1L' -> 'AH HALFVOLLE MELK'"""
+    text = QUANTITY_PATTERN.sub(' ', normalize_description(description))
+    return ' '.join(PUNCTUATION_PATTERN.sub(' ', text).split())
+
+
+class ProductIndex:
+    """Groups receipt descriptions that name the same product.
+
+    Descriptions with the same canonical form (ignoring spaces) are the same
+    product. Other near-duplicates - typos and, if receipt_width is given,
+    descriptions cut off at that width - are found with MinHash
+    locality-sensitive hashing on character shingles, so each new
+    description is only compared with the few indexed forms sharing a hash
+    band. A form that only extends another (AH TOMATEN, AH TOMATENSOEP) is
+    a different product unless the shorter one was cut off. Each product is
+    named after its longest, least truncated variant.
+    """
+
+    SHINGLE_SIZE = 3
+    NUM_BANDS = 10
+    ROWS_PER_BAND = 3
+    # Candidates whose signatures agree on fewer hashes than this share are not compared further
+    MIN_ESTIMATED_JACCARD = 0.5
+    # SequenceMatcher ratio above which two forms are spelling variants
+    MIN_SIMILARITY = 0.92
+    # A truncated form must still hold this share of the full form
+    MIN_TRUNCATED_SHARE = 0.7
+
+    def __init__(self, receipt_width: Optional[int] = None):
+        # Characters printed per description; only descriptions this long can be truncated
+        self.receipt_width = receipt_width
+        # Fixed seed, so the same descriptions always group the same way
+        rng = np.random.default_rng(0)
+        num_hashes = self.NUM_BANDS * self.ROWS_PER_BAND
+        self._hash_a = rng.integers(1, MERSENNE_PRIME, num_hashes, dtype=np.uint64)
+        self._hash_b = rng.integers(0, MERSENNE_PRIME, num_hashes, dtype=np.uint64)
+        self._products: Dict[str, int] = {}
+        self._form_products: Dict[str, int] = {}
+        self._forms: List[Tuple[str, str, List[str], bool]] = []
+        self._signatures = np.empty((64, num_hashes), dtype=np.uint64)
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+        self._names: List[str] = []
+        self._name_lengths: List[int] = []
+
+    def __len__(self) -> int:
+        """Number of distinct products"""
+        return len(self._names)
+
+    def _signature(self, compact: str) -> Optional[np.ndarray]:
+        shingles = {compact[i:i + self.SHINGLE_SIZE] for i in range(len(compact) - self.SHINGLE_SIZE + 1)}
+        if not shingles:
+            return None
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) % MERSENNE_PRIME for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        return ((self._hash_a[:, None] * hashes[None, :] + self._hash_b[:, None]) % MERSENNE_PRIME).min(axis=1)
+
+    def _bands(self, signature: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+        for band in range(self.NUM_BANDS):
+            yield band, signature[band * self.ROWS_PER_BAND:(band + 1) * self.ROWS_PER_BAND].tobytes()
+
+    def _is_truncated(self, description: str) -> bool:
+        """Whether a description fills the receipt width, so its end may have been cut off"""
+        return self.receipt_width is not None and len(description.strip()) >= self.receipt_width
+
+    def _same_product(self, form: str, compact: str, truncated: bool,
+                      other_form: str, other_compact: str, other_truncated: bool) -> bool:
+        (shorter, shorter_truncated), (longer, _) = sorted(
+            ((form, truncated), (other_form, other_truncated)), key=lambda variant: len(variant[0]))
+        if longer.startswith(shorter):
+            # Dutch compounds extend their first word (AH APPELSAP, AH APPELSAPJES), so only a
+            # description cut off in the middle of a word by the receipt width is the same product
+            return (shorter_truncated and len(shorter) >= self.MIN_TRUNCATED_SHARE * len(longer)
+                    and longer[len(shorter)] != ' ')
+        # Upper bound of the ratio from the lengths alone, before building a matcher
+        if 2 * min(len(compact), len(other_compact)) < self.MIN_SIMILARITY * (len(compact) + len(other_compact)):
+            return False
+        matcher = SequenceMatcher(None, compact, other_compact, autojunk=False)
+        return matcher.quick_ratio() >= self.MIN_SIMILARITY and matcher.ratio() >= self.MIN_SIMILARITY
+
+    def _match(self, form: str, compact: str, digits: List[str], truncated: bool,
+               signature: Optional[np.ndarray]) -> Optional[int]:
+        if signature is None:
+            return None
+        candidates = set()
+        for band in self._bands(signature):
+            candidates.update(self._buckets.get(band, ()))
+        if not candidates:
+            return None
+        form_ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        # Share of agreeing hashes estimates the Jaccard similarity of the shingle sets
+        agreement = np.count_nonzero(self._signatures[form_ids] == signature, axis=1)
+        likely = agreement >= self.MIN_ESTIMATED_JACCARD * len(signature)
+        form_ids, agreement = form_ids[likely], agreement[likely]
+        # Most similar candidates first, earlier forms first among equals
+        for form_id in form_ids[np.lexsort((form_ids, -agreement))].tolist():
+            other_form, other_compact, other_digits, other_truncated = self._forms[form_id]
+            # Numbers usually tell variants apart (KAAS 30+ vs KAAS 48+)
+            if digits == other_digits and self._same_product(form, compact, truncated,
+                                                             other_form, other_compact, other_truncated):
+                return self._form_products[other_compact]
+        return None
+
+    def add(self, description: str) -> int:
+        """Id of the product a description names, adding it to the index if new"""
+        product = self._products.get(description)
+        if product is not None:
+            return product
+
+        form = canonical_form(description)
+        compact = form.replace(' ', '')
+        product = self._form_products.get(compact)
+        if product is None:
+            digits = DIGITS_PATTERN.findall(compact)
+            truncated = self._is_truncated(description)
+            signature = self._signature(compact)
+            product = self._match(form, compact, digits, truncated, signature)
+            if product is None:
+                product = len(self._names)
+                self._names.append(description)
+                self._name_lengths.append(-1)
+            self._form_products[compact] = product
+            if signature is not None:
+                form_id = len(self._forms)
+                self._forms.append((form, compact, digits, truncated))
+                if form_id == len(self._signatures):
+                    self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+                self._signatures[form_id] = signature
+                for band in self._bands(signature):
+                    self._buckets[band].append(form_id)
+
+        # Prefer the least truncated variant, then receipt-style upper case, then the shortest
+        # description (without a quantity suffix)
+        name = self._names[product]
+        if ((len(form), description.isupper(), -len(description))
+                > (self._name_lengths[product], name.isupper(), -len(name))):
+            self._names[product] = description
+            self._name_lengths[product] = len(form)
+        self._products[description] = product
+        return product
+
+    def canonical(self, description: str) -> str:
+        """Name of the product a description refers to"""
+        return self._names[self.add(description)]
+
+    def group(self, descriptions: Iterable[str]) -> Dict[str, List[str]]:
+        """Descriptions grouped by the name of the product they refer to"""
+        descriptions = list(descriptions)
+        for description in descriptions:
+            self.add(description)
+        # Names are only final once every description has been added
+        groups: Dict[str, List[str]] = defaultdict(list)
+        for description in descriptions:
+            groups[self.canonical(description)].append(description)
+        return dict(groups)
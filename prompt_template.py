@@ -0,0 +1,70 @@
+import re
+from typing import List
+
+# Rough stand-in for the model tokenizer: words split into pieces of up to four characters,
+# plus every punctuation mark. It overestimates slightly, which keeps batches within budget.
+TOKEN_PATTERN = re.compile(r'\w{1,4}|[^\w\s]')
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate number of model tokens in a text, without a network call"""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+class PromptTemplate:
+    """Categorization prompt: the static instructions from prompt.txt followed by products.
+
+    The header is prepared and its tokens are counted once. Each batch prompt
+    is built from the header and that batch's products only, so building all
+    prompts takes time linear in the number of products. pack() fills batches
+    up to a token budget for both the prompt and the expected reply.
+    """
+
+    DEFAULT_MAX_PROMPT_TOKENS = 8192
+    DEFAULT_MAX_OUTPUT_TOKENS = 2048
+    # Reply tokens per product on top of its name: {"product_name": "...", "category": "..."},
+    OUTPUT_TOKENS_PER_PRODUCT = 20
+
+    def __init__(self, instructions: str, max_prompt_tokens: int = DEFAULT_MAX_PROMPT_TOKENS,
+                 max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS):
+        self.instructions = instructions
+        self.header = instructions.rstrip() + "\n\n"
+        self.header_tokens = estimate_tokens(self.header)
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_output_tokens = max_output_tokens
+
+    @classmethod
+    def from_file(cls, path: str = 'prompt.txt', **kwargs) -> 'PromptTemplate':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(f.read(), **kwargs)
+
+    def build(self, batch: List[str]) -> str:
+        """Full prompt for a batch of products"""
+        return self.header + self.build_products(batch)
+
+    def build_products(self, batch: List[str]) -> str:
+        """Only the product list, for models that already hold the header as their system instruction"""
+        return "\n".join(batch)
+
+    def pack(self, products: List[str]) -> List[List[str]]:
+        """Split products into batches that fit the prompt and reply token budgets, in one pass"""
+        batches = []
+        batch: List[str] = []
+        prompt_tokens = self.header_tokens
+        output_tokens = 0
+        for product in products:
+            # One more token for the newline separating products
+            tokens = estimate_tokens(product) + 1
+            product_output = tokens + self.OUTPUT_TOKENS_PER_PRODUCT
+            if batch and (prompt_tokens + tokens > self.max_prompt_tokens
+                          or output_tokens + product_output > self.max_output_tokens):
+                batches.append(batch)
+                batch = []
+                prompt_tokens = self.header_tokens
+                output_tokens = 0
+            batch.append(product)
+            prompt_tokens += tokens
+            output_tokens += product_output
+        if batch:
+            batches.append(batch)
+        return batches
@@ -0,0 +1,90 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given as seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveRateLimiter:
+    """Token bucket shared by all request threads, slowing down when the server pushes back.
+
+    acquire() takes a token, waiting for the bucket to refill at `rate`
+    tokens per second. throttled() halves the rate, empties the bucket and,
+    given a Retry-After delay, holds every request until it has passed.
+    Each succeeded() call raises the rate again by `increase`, up to
+    max_rate (additive increase, multiplicative decrease). Requests already
+    in flight when the server starts throttling fail together, so the rate
+    is halved at most once per `cooldown` seconds.
+    """
+
+    def __init__(self, rate: float = 10.0, burst: Optional[float] = None, min_rate: float = 0.5,
+                 max_rate: Optional[float] = None, increase: float = 0.1, cooldown: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        if rate <= 0 or min_rate <= 0:
+            raise ValueError("Rate limits must be positive")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.increase = increase
+        self.cooldown = cooldown
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._decreased_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Wait until a request may be sent"""
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            # Sleep outside the lock, so other threads can check the bucket meanwhile
+            self.sleep(wait)
+
+    def throttled(self, retry_after: Optional[float] = None):
+        """Record a 429/503 response, optionally with the server's Retry-After delay in seconds"""
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            if self._decreased_at is None or now - self._decreased_at >= self.cooldown:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._decreased_at = now
+            self._tokens = 0.0
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+    def succeeded(self):
+        """Record a response that wasn't throttled"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
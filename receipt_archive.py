@@ -0,0 +1,215 @@
+import gzip
+import json
+import mmap
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from atomic_file import atomic_write
+from receipt_table import ReceiptTable
+
+ARCHIVE_SUFFIX = '.ahr'
+MAGIC = b'AHRCPT\x00\x01'
+VERSION = 1
+# Column data starts on this boundary, so uncompressed columns can be mapped as aligned arrays
+ALIGNMENT = 64
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 9
+
+# Numeric columns: name -> on-disk dtype (little-endian), matching the ReceiptTable column dtypes
+ARRAY_COLUMNS = {
+    'receipt_dates': '<i8',
+    'receipt_cents': '<i8',
+    'item_receipt': '<i4',
+    'item_description': '<i4',
+    'item_kind': '|i1',
+    'item_cents': '<i8',
+    'item_quantity': '<i4',
+}
+# Dictionaries stored as JSON lists: the line items refer to them by index
+LIST_COLUMNS = ('descriptions', 'quantities', 'transaction_ids')
+
+
+def is_archive(path) -> bool:
+    """Whether a receipts file uses the compressed columnar format"""
+    return Path(path).suffix == ARCHIVE_SUFFIX
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def default_compression() -> str:
+    """zstd when the optional zstandard package is installed, gzip otherwise"""
+    return 'zstd' if _zstd() is not None else 'gzip'
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        zstandard = _zstd()
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package: pip install zstandard")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if codec == 'none':
+        return data
+    raise ValueError(f"Unknown compression: {codec}")
+
+
+def _decompress(data, codec: str) -> bytes:
+    if codec == 'zstd':
+        zstandard = _zstd()
+        if zstandard is None:
+            raise ValueError("This receipts archive is zstd-compressed; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'gzip':
+        # zlib reads the gzip container directly (wbits=31), without gzip's file-object layer
+        return zlib.decompress(data, wbits=31)
+    raise ValueError(f"Unknown compression: {codec}")
+
+
+def write_archive(path, receipts: Iterable[Dict[str, Any]], compression: Optional[str] = None):
+    """Write receipts atomically as a columnar archive with a description dictionary and cent amounts.
+
+    The file holds a magic number, a JSON header with each column's dtype,
+    offset and codec, then every column compressed separately. With
+    compression='none' the columns are stored raw and read_table() maps them
+    into memory without copying.
+    """
+    compression = compression or default_compression()
+    receipts = receipts if isinstance(receipts, list) else list(receipts)
+    table = ReceiptTable.from_receipts(receipts)
+    quantities = [product['quantity'] for receipt in receipts for product in receipt['products']]
+    quantity_ids = {quantity: i for i, quantity in enumerate(dict.fromkeys(quantities))}
+
+    columns: Dict[str, Tuple[Dict[str, Any], bytes]] = {}
+    arrays = {
+        'receipt_dates': table.receipt_dates.view(np.int64),
+        'receipt_cents': table.receipt_cents,
+        'item_receipt': table.item_receipt,
+        'item_description': table.item_description,
+        'item_kind': table.item_kind,
+        'item_cents': table.item_cents,
+        'item_quantity': np.array([quantity_ids[quantity] for quantity in quantities], dtype=np.int32),
+    }
+    for name, dtype in ARRAY_COLUMNS.items():
+        raw = np.ascontiguousarray(arrays[name], dtype=dtype).tobytes()
+        columns[name] = ({'dtype': dtype, 'length': len(arrays[name])}, raw)
+    lists = {
+        'descriptions': table.descriptions,
+        'quantities': list(quantity_ids),
+        'transaction_ids': [receipt.get('transactionId') for receipt in receipts],
+    }
+    for name in LIST_COLUMNS:
+        columns[name] = ({'dtype': 'json'}, json.dumps(lists[name], ensure_ascii=False).encode('utf-8'))
+
+    blobs = {}
+    for name, (info, raw) in columns.items():
+        # A list is always decoded in full, so it is compressed even for a mappable archive
+        codec = compression if compression != 'none' or info['dtype'] != 'json' else default_compression()
+        blobs[name] = _compress(raw, codec)
+        info.update(codec=codec, size=len(blobs[name]))
+
+    # The header records absolute offsets, so its own length is fixed before they are assigned
+    header = {'version': VERSION, 'num_receipts': table.num_receipts, 'num_items': table.num_items,
+              'columns': {name: dict(info, offset=0) for name, (info, _) in columns.items()}}
+    header_size = len(json.dumps(header).encode('utf-8')) + 32 * len(columns)
+    offset = _align(len(MAGIC) + 4 + header_size)
+    for name, (info, _) in columns.items():
+        header['columns'][name]['offset'] = offset
+        offset = _align(offset + info['size'])
+    header_bytes = json.dumps(header).encode('utf-8').ljust(header_size)
+
+    with atomic_write(path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', header_size) + header_bytes)
+        for name in columns:
+            f.write(b'\0' * (header['columns'][name]['offset'] - f.tell()))
+            f.write(blobs[name])
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class ReceiptArchive:
+    """A receipts archive opened for reading, with its columns memory-mapped"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a receipts archive")
+            header_size, = struct.unpack('<I', f.read(4))
+            self.header = json.loads(f.read(header_size))
+            if self.header.get('version') != VERSION:
+                raise ValueError(f"Unsupported receipts archive version {self.header.get('version')}")
+            # Empty files can't be mapped; an archive always has its header, so this never is
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def column(self, name: str):
+        """A numeric column as an array, or a dictionary column as a list"""
+        info = self.header['columns'][name]
+        if info['codec'] == 'none':
+            # Zero-copy view on the mapped file
+            return np.frombuffer(self._mmap, dtype=info['dtype'], count=info['length'], offset=info['offset'])
+        data = _decompress(memoryview(self._mmap)[info['offset']:info['offset'] + info['size']], info['codec'])
+        if info['dtype'] == 'json':
+            return json.loads(data)
+        return np.frombuffer(data, dtype=info['dtype'])
+
+    def table(self) -> ReceiptTable:
+        """The receipts as a ReceiptTable, without building per-receipt dicts"""
+        return ReceiptTable(
+            self.column('receipt_dates').view('datetime64[m]'),
+            self.column('receipt_cents'),
+            self.column('item_receipt'),
+            self.column('item_description'),
+            self.column('item_kind'),
+            self.column('item_cents'),
+            self.column('descriptions'),
+        )
+
+    def receipts(self) -> Iterator[Dict[str, Any]]:
+        """The receipts in the ah_receipts.json format"""
+        table = self.table()
+        quantities = self.column('quantities')
+        item_quantity = self.column('item_quantity')
+        transaction_ids = self.column('transaction_ids')
+        dates = np.datetime_as_string(table.receipt_dates, unit='m')
+        ends = np.cumsum(np.bincount(table.item_receipt, minlength=table.num_receipts)).tolist()
+        item_description = table.item_description.tolist()
+        item_cents = table.item_cents.tolist()
+        item_quantity = item_quantity.tolist()
+        receipt_cents = table.receipt_cents.tolist()
+        start = 0
+        for i, end in enumerate(ends):
+            entry = {}
+            if transaction_ids[i] is not None:
+                entry['transactionId'] = transaction_ids[i]
+            entry['date'] = dates[i].replace('T', ' ')
+            entry['amount_cents'] = receipt_cents[i]
+            entry['products'] = [{
+                'quantity': quantities[item_quantity[j]],
+                'description': table.descriptions[item_description[j]],
+                'amount_cents': item_cents[j],
+            } for j in range(start, end)]
+            start = end
+            yield entry
+
+
+def read_table(path) -> ReceiptTable:
+    """Load a receipts archive straight into a ReceiptTable"""
+    return ReceiptArchive(path).table()
+
+
+def iter_archive_receipts(path) -> Iterator[Dict[str, Any]]:
+    """Read the receipts of an archive one at a time, as dicts"""
+    return ReceiptArchive(path).receipts()
@@ -0,0 +1,170 @@
+import json
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+from atomic_file import atomic_write
+from parsing import parse_cents
+from receipt_archive import is_archive, iter_archive_receipts, read_table, write_archive
+from receipt_table import ReceiptTable
+
+READ_CHUNK_SIZE = 1 << 16
+WHITESPACE = ' \t\r\n'
+LEGACY_KEY_PREFIX = 'legacy:'
+
+
+def is_jsonl(path) -> bool:
+    """Whether a receipts file uses the JSON Lines variant (one receipt per line)"""
+    return Path(path).suffix == '.jsonl'
+
+
+def summary_key(receipt: Dict[str, Any]) -> str:
+    """Date and amount in cents of a receipt, e.g. '2024-03-01 10:00|1234'.
+
+    Entries written before receipts carried a transactionId are matched on it
+    when a sync lists them with one. It doesn't change when --convert
+    rewrites the amount.
+    """
+    amount = receipt['amount_cents'] if 'amount_cents' in receipt else receipt.get('amount')
+    return f"{receipt.get('date')}|{parse_cents(amount)}"
+
+
+def legacy_key(summary: str, occurrence: int) -> str:
+    """Key of the occurrence-th receipt without a transactionId with this summary_key in a file"""
+    return f"{LEGACY_KEY_PREFIX}{summary}#{occurrence}"
+
+
+def parse_legacy_key(key: str) -> Optional[Tuple[str, int]]:
+    """summary_key and occurrence of a legacy_key, or None for a transactionId"""
+    if not key.startswith(LEGACY_KEY_PREFIX):
+        return None
+    summary, occurrence = key[len(LEGACY_KEY_PREFIX):].rsplit('#', 1)
+    return summary, int(occurrence)
+
+
+class ReceiptKeys:
+    """Keys of the receipts in a file, matched against the keys of receipts stored before.
+
+    A receipt is keyed by its transactionId. One written without it is keyed
+    by its summary_key and how many receipts before it in the file shared
+    that summary, so receipts that look identical stay distinct. A receipt
+    whose transactionId is new but whose summary matches a stored legacy key
+    is that receipt after a sync attached the id (ReceiptStore.adopt_legacy):
+    it takes over the key with the highest occurrence, so the legacy receipts
+    still in the file keep theirs.
+    """
+
+    def __init__(self, known: Set[str]):
+        # Updated in place as receipts are added
+        self.known = known
+        self._occurrences: Counter = Counter()
+        self._adoptable: Dict[str, List[int]] = defaultdict(list)
+        for key in known:
+            parsed = parse_legacy_key(key)
+            if parsed is not None:
+                self._adoptable[parsed[0]].append(parsed[1])
+        for occurrences in self._adoptable.values():
+            occurrences.sort()
+
+    def add(self, receipt: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        """Key of the file's next receipt, and the stored key it matches (None for a new receipt)"""
+        summary = summary_key(receipt)
+        key = receipt.get('transactionId')
+        if not key:
+            key = legacy_key(summary, self._occurrences[summary])
+            self._occurrences[summary] += 1
+            if key in self.known:
+                return key, key
+        elif key in self.known:
+            return key, key
+        elif self._adoptable.get(summary):
+            previous = legacy_key(summary, self._adoptable[summary].pop())
+            self.known.discard(previous)
+            self.known.add(key)
+            return key, previous
+        self.known.add(key)
+        return key, None
+
+
+def _iter_json_array(f: TextIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array one at a time, reading the file in chunks"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    in_array = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in WHITESPACE:
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise ValueError("Unexpected end of receipts file")
+            buffer, pos = f.read(chunk_size), 0
+            eof = not buffer
+            continue
+
+        char = buffer[pos]
+        if not in_array:
+            if char != '[':
+                raise ValueError("Receipts file must contain a JSON array")
+            in_array = True
+            pos += 1
+        elif char == ']':
+            return
+        elif char == ',':
+            pos += 1
+        else:
+            try:
+                element, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Most likely the element continues in the next chunk
+                more = f.read(chunk_size)
+                if not more:
+                    raise
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            yield element
+
+
+def iter_receipts(path) -> Iterator[Dict[str, Any]]:
+    """Read receipts one at a time from a .json array, .jsonl or .ahr archive file"""
+    if is_archive(path):
+        yield from iter_archive_receipts(path)
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        if is_jsonl(path):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_array(f)
+
+
+def load_receipts(path) -> List[Dict[str, Any]]:
+    """Read all receipts from a .json array, .jsonl or .ahr archive file"""
+    if is_jsonl(path) or is_archive(path):
+        return list(iter_receipts(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_tables(path, chunk_size: int = 1000) -> Iterator[ReceiptTable]:
+    """Receipt tables of a file: an archive is mapped as one table, JSON is parsed chunk_size receipts at a time"""
+    if is_archive(path):
+        yield read_table(path)
+    else:
+        yield from ReceiptTable.iter_chunks(iter_receipts(path), chunk_size)
+
+
+def save_receipts(path, receipts: Iterable[Dict[str, Any]]):
+    """Write receipts atomically, as a JSON array, JSON Lines or a columnar archive depending on the suffix"""
+    if is_archive(path):
+        write_archive(path, receipts)
+        return
+    with atomic_write(path) as f:
+        if is_jsonl(path):
+            for receipt in receipts:
+                f.write(json.dumps(receipt, ensure_ascii=False))
+                f.write('\n')
+        else:
+            json.dump(list(receipts), f, indent=2, ensure_ascii=False)
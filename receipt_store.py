@@ -0,0 +1,125 @@
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from receipt_io import iter_receipts, save_receipts, summary_key
+
+
+class ReceiptStore:
+    """Local receipts file (.json or .jsonl) keyed by transactionId, used for incremental syncs"""
+
+    def __init__(self, path: str = 'ah_receipts.json'):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        # Entries written before receipts carried a transactionId, by summary_key (date and amount in
+        # cents); several receipts can share one, e.g. two identical purchases in the same minute
+        self.legacy: Dict[str, List[Dict[str, Any]]] = {}
+        self.load()
+
+    def load(self):
+        """Load existing receipts from disk, if any"""
+        if not self.path.exists():
+            return
+        for entry in iter_receipts(self.path):
+            transaction_id = entry.get('transactionId')
+            if transaction_id:
+                self.entries[transaction_id] = entry
+            else:
+                self.legacy.setdefault(summary_key(entry), []).append(entry)
+
+    def __contains__(self, transaction_id: str) -> bool:
+        return transaction_id in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries) + sum(len(entries) for entries in self.legacy.values())
+
+    def adopt_legacy(self, transaction_id: str, summary: str) -> bool:
+        """Attach a transactionId to one legacy entry with the given summary_key"""
+        entries = self.legacy.get(summary)
+        if not entries:
+            return False
+        # The last one, so the others keep their order in the file
+        entry = entries.pop()
+        if not entries:
+            del self.legacy[summary]
+        entry['transactionId'] = transaction_id
+        self.entries[transaction_id] = entry
+        return True
+
+    def add(self, entry: Dict[str, Any]):
+        """Add or replace a receipt entry"""
+        self.entries[entry['transactionId']] = entry
+
+    def ordered_entries(self, transaction_ids: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Return entries in the given transaction order, followed by any others we still hold"""
+        ordered = []
+        seen = set()
+        for transaction_id in transaction_ids or []:
+            if transaction_id in self.entries and transaction_id not in seen:
+                ordered.append(self.entries[transaction_id])
+                seen.add(transaction_id)
+        # Receipts no longer in the AH listing are kept, so history never shrinks
+        ordered.extend(entry for transaction_id, entry in self.entries.items() if transaction_id not in seen)
+        ordered.extend(entry for entries in self.legacy.values() for entry in entries)
+        return ordered
+
+    def save(self, transaction_ids: Optional[Iterable[str]] = None):
+        """Write all entries to disk atomically"""
+        save_receipts(self.path, self.ordered_entries(transaction_ids))
+
+
+class FetchCheckpoint:
+    """Receipt entries fetched so far in an unfinished sync, one JSON line each.
+
+    Every entry is appended and flushed as soon as it is fetched, so an
+    interrupted sync loses at most the receipt in flight. The next sync
+    starts from these entries; the checkpoint is removed once the receipts
+    file has been written.
+    """
+
+    def __init__(self, receipts_path):
+        receipts_path = Path(receipts_path)
+        self.path = receipts_path.with_name(receipts_path.name + '.partial.jsonl')
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Entries saved by an interrupted sync"""
+        if not self.path.exists():
+            return []
+        entries = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A line cut off when the previous sync was killed
+                    continue
+        return entries
+
+    def _ends_mid_line(self) -> bool:
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return False
+        with open(self.path, 'rb') as f:
+            f.seek(-1, 2)
+            return f.read(1) != b'\n'
+
+    def append(self, entry: Dict[str, Any]):
+        """Record a fetched entry; safe to call from several threads"""
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+                if self._ends_mid_line():
+                    self._file.write('\n')
+            self._file.write(line)
+            self._file.flush()
+
+    def remove(self):
+        """Delete the checkpoint after the sync completed"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,146 @@
+from itertools import chain, islice
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from parsing import parse_cents
+
+# Line item quantity kinds
+QTY_REGULAR = 0
+QTY_NONE = 1
+QTY_BONUS = 2
+QTY_ACTIE = 3
+
+
+# Quantities with a special meaning; everything else is a regular quantity
+QUANTITY_KINDS = {None: QTY_NONE, 'BONUS': QTY_BONUS, 'ACTIE': QTY_ACTIE}
+
+
+class Interner(dict):
+    """Maps values to ids 0, 1, 2, ... in order of first occurrence"""
+
+    def __missing__(self, value):
+        self[value] = i = len(self)
+        return i
+
+
+class CentsLookup(dict):
+    """Maps stored amounts to cents, parsing each distinct amount once"""
+
+    def __missing__(self, amount):
+        self[amount] = cents = parse_cents(amount)
+        return cents
+
+
+class KindLookup(dict):
+    """Maps quantities to their QTY_ kind"""
+
+    def __missing__(self, quantity):
+        self[quantity] = QTY_REGULAR
+        return QTY_REGULAR
+
+
+def amount_column(records: List[Dict[str, Any]]) -> List[Any]:
+    """amount_cents of every record, falling back to the "€x.xx" amount of files written by older versions"""
+    key = 'amount_cents' if records and 'amount_cents' in records[0] else 'amount'
+    try:
+        return list(map(itemgetter(key), records))
+    except KeyError:
+        # Only some records were written in the new format
+        return [record['amount_cents'] if 'amount_cents' in record else record['amount'] for record in records]
+
+
+def first_seen_order(keys: np.ndarray) -> np.ndarray:
+    """Unique values of keys, ordered by their first occurrence"""
+    uniques, first_idx = np.unique(keys, return_index=True)
+    return uniques[np.argsort(first_idx, kind='stable')]
+
+
+class ReceiptTable:
+    """Columnar view of a receipts file.
+
+    Receipts are stored as parallel arrays of timestamps and amounts in
+    integer cents. Line items live in one flat table holding the receipt
+    index, an interned description id, the quantity kind and the amount.
+    """
+
+    def __init__(self, receipt_dates: np.ndarray, receipt_cents: np.ndarray,
+                 item_receipt: np.ndarray, item_description: np.ndarray,
+                 item_kind: np.ndarray, item_cents: np.ndarray, descriptions: List[str]):
+        self.receipt_dates = receipt_dates
+        self.receipt_cents = receipt_cents
+        self.item_receipt = item_receipt
+        self.item_description = item_description
+        self.item_kind = item_kind
+        self.item_cents = item_cents
+        self.descriptions = descriptions
+
+    @classmethod
+    def from_receipts(cls, receipts: Iterable[Dict[str, Any]]) -> 'ReceiptTable':
+        """Build a table from receipts in the ah_receipts.json format.
+
+        Amounts are read from amount_cents, falling back to the "€x.xx"
+        amount strings of files written by older versions.
+        """
+        receipts = receipts if isinstance(receipts, list) else list(receipts)
+        # Each column is read with one map() over the receipt dicts, so the loop runs in C; only
+        # distinct descriptions, amounts and quantities reach the Python code in the lookups
+        product_lists = list(map(itemgetter('products'), receipts))
+        products = list(chain.from_iterable(product_lists))
+        num_items = len(products)
+        description_ids = Interner()
+        cents = CentsLookup()
+        kinds = KindLookup(QUANTITY_KINDS)
+
+        return cls(
+            # NumPy parses the 'YYYY-MM-DD HH:MM' dates itself and raises ValueError on anything else
+            np.array(list(map(itemgetter('date'), receipts)), dtype='datetime64[m]'),
+            np.fromiter(map(cents.__getitem__, amount_column(receipts)), dtype=np.int64, count=len(receipts)),
+            np.repeat(np.arange(len(receipts), dtype=np.int32), list(map(len, product_lists))),
+            np.fromiter(map(description_ids.__getitem__, map(itemgetter('description'), products)),
+                        dtype=np.int32, count=num_items),
+            np.fromiter(map(kinds.__getitem__, map(itemgetter('quantity'), products)),
+                        dtype=np.int8, count=num_items),
+            np.fromiter(map(cents.__getitem__, amount_column(products)), dtype=np.int64, count=num_items),
+            list(description_ids),
+        )
+
+    @classmethod
+    def iter_chunks(cls, receipts: Iterable[Dict[str, Any]], chunk_size: int = 1000) -> Iterator['ReceiptTable']:
+        """Build one table per chunk_size receipts, so only one chunk is in memory at a time"""
+        receipts = iter(receipts)
+        while True:
+            chunk = list(islice(receipts, chunk_size))
+            if not chunk:
+                return
+            yield cls.from_receipts(chunk)
+
+    @property
+    def num_receipts(self) -> int:
+        return len(self.receipt_cents)
+
+    @property
+    def num_items(self) -> int:
+        return len(self.item_cents)
+
+    def description_mask(self, predicate: Callable[[str], bool]) -> np.ndarray:
+        """Per-line-item mask of descriptions matching predicate, evaluated once per description"""
+        matches = np.fromiter((predicate(d) for d in self.descriptions), dtype=bool, count=len(self.descriptions))
+        return matches[self.item_description]
+
+    @staticmethod
+    def group_sum(keys: np.ndarray, weights: np.ndarray,
+                  labels: Optional[List[Any]] = None) -> Dict[Any, int]:
+        """Sum integer weights (cents) per key, in order of each key's first occurrence"""
+        if len(keys) == 0:
+            return {}
+        # bincount accumulates in float64, which is exact for cent sums below 2**53
+        sums = np.bincount(keys, weights=weights)
+        order = first_seen_order(keys)
+        return {(labels[k] if labels is not None else k): int(sums[k]) for k in order}
+
+    def daily_keys(self):
+        """Day index of each receipt, plus the 'YYYY-MM-DD' label of every day index"""
+        days, receipt_day = np.unique(self.receipt_dates.astype('datetime64[D]'), return_inverse=True)
+        return receipt_day, list(days.astype(str))
@@ -0,0 +1,379 @@
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from instrumentation import Metrics
+from receipt_table import ReceiptTable, QTY_NONE, QTY_BONUS, QTY_ACTIE, first_seen_order
+
+# Line item kinds
+KIND_PRODUCT = 0
+KIND_BONUS = 1
+KIND_ACTIE = 2
+KIND_STATIEGELD = 3
+KIND_NON_PRODUCT = 4
+
+# Receipt lines that are never counted as purchases
+EXCLUDED_ITEMS = {
+    'BONUSKAART', 'PINNEN', 'Waarvan', 'BONUS BOX',
+    'AIRMILES NR. *', 'MIJN AH MILES', 'eSPAARZEGELS', 'eSPAARZEGEL',
+    'STATIEGELD', '+STATIEGELD', '-STATIEGELD', 'EMBALLAGE',
+    'Prijs per kg', 'BONUS', 'BONUSITEM', 'INCL.HEF.SUP'
+}
+
+# Substrings (of the upper-cased description) marking lines that are not sent for categorization
+NON_PRODUCT_MARKERS = ['STATIEGELD', 'BONUS', 'PINNEN', 'AIRMILES', 'WAARVAN', 'EMBALLAGE',
+                       'DIERENKAART', 'DISNEYSPAREN', 'ESPAARZEL', 'ESPAARZEGELS']
+DEPOSIT_MARKERS = ('STATIEGELD', 'EMBALLAGE')
+
+
+class ClassifiedItems:
+    """Line items of a receipt table, classified once for all aggregators"""
+
+    def __init__(self, table: ReceiptTable):
+        self.table = table
+        # Description rules are evaluated once per unique description, not per line item
+        counted = np.empty(len(table.descriptions), dtype=bool)
+        categorizable = np.empty(len(table.descriptions), dtype=bool)
+        deposit = np.empty(len(table.descriptions), dtype=bool)
+        for i, description in enumerate(table.descriptions):
+            upper = description.upper()
+            counted[i] = description not in EXCLUDED_ITEMS and not description.startswith('BONUS')
+            categorizable[i] = not any(marker in upper for marker in NON_PRODUCT_MARKERS)
+            deposit[i] = any(marker in upper for marker in DEPOSIT_MARKERS)
+
+        qty = table.item_kind
+        desc = table.item_description
+        self.bonus = qty == QTY_BONUS
+        self.actie = qty == QTY_ACTIE
+        has_quantity = qty != QTY_NONE
+        # Items counted in most_bought_items
+        self.purchase = counted[desc] & has_quantity
+        # Items whose description is sent to the model for categorization
+        self.categorizable = categorizable[desc] & has_quantity & ~self.bonus
+        # Items included in spending per category
+        self.spend = has_quantity & ~self.bonus & ~self.actie
+
+        self.kind = np.full(table.num_items, KIND_PRODUCT, dtype=np.int8)
+        self.kind[~categorizable[desc] | ~has_quantity] = KIND_NON_PRODUCT
+        self.kind[deposit[desc] & has_quantity] = KIND_STATIEGELD
+        self.kind[self.actie] = KIND_ACTIE
+        self.kind[self.bonus] = KIND_BONUS
+
+
+def add_to(totals: Dict[str, int], other: Dict[str, int]):
+    """Add other's values to totals key by key"""
+    for key, value in other.items():
+        totals[key] = totals.get(key, 0) + value
+
+
+def combine_counts(counts: Dict[str, int], canonical: Callable[[str], str]) -> Dict[str, int]:
+    """Sum counts per canonical name, in order of first occurrence"""
+    # A name can still change while canonical() sees new variants, so settle all names first
+    for description in counts:
+        canonical(description)
+    combined: Dict[str, int] = {}
+    for description, count in counts.items():
+        name = canonical(description)
+        combined[name] = combined.get(name, 0) + count
+    return combined
+
+
+class Aggregator:
+    """Base class for report aggregators.
+
+    update() is called once per classified chunk of receipts; result() returns
+    the report sections named in `sections`, in that order. Money amounts are
+    integer cents. Aggregators that compute their sections some other way,
+    such as a database query, set needs_scan to False.
+
+    Aggregators that can be updated incrementally return their running totals
+    as JSON-serializable data from state() and accept it back in load_state().
+    merge_state() adds the totals of another aggregator of the same kind, e.g.
+    one that scanned the receipts of another account.
+    """
+    sections: Tuple[str, ...] = ()
+    needs_scan = True
+
+    def update(self, items: ClassifiedItems):
+        raise NotImplementedError
+
+    def result(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def state(self) -> Optional[Dict[str, Any]]:
+        """Running totals to persist between runs, or None if this aggregator can't be persisted"""
+        return None
+
+    def load_state(self, state: Dict[str, Any]):
+        raise NotImplementedError
+
+    def merge_state(self, state: Dict[str, Any]):
+        raise NotImplementedError
+
+
+class QueryAggregator(Aggregator):
+    """Report sections computed by a callable instead of a scan over the receipts"""
+    needs_scan = False
+
+    def __init__(self, sections: Tuple[str, ...], query: Callable[[], Dict[str, Any]]):
+        self.sections = sections
+        self.query = query
+
+    def update(self, items: ClassifiedItems):
+        pass
+
+    def result(self) -> Dict[str, Any]:
+        return self.query()
+
+
+class ReceiptTotals(Aggregator):
+    sections = ('total_spending', 'num_transactions', 'average_transaction')
+
+    def __init__(self):
+        self.total_cents = 0
+        self.count = 0
+
+    def update(self, items: ClassifiedItems):
+        self.total_cents += int(items.table.receipt_cents.sum())
+        self.count += items.table.num_receipts
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            'total_spending': self.total_cents,
+            'num_transactions': self.count,
+            # An account without receipts has no average; 0 keeps merged batch reports writable
+            'average_transaction': round(self.total_cents / self.count) if self.count else 0,
+        }
+
+    def state(self) -> Optional[Dict[str, Any]]:
+        return {'total_cents': self.total_cents, 'count': self.count}
+
+    def load_state(self, state: Dict[str, Any]):
+        self.total_cents = state['total_cents']
+        self.count = state['count']
+
+    def merge_state(self, state: Dict[str, Any]):
+        self.total_cents += state['total_cents']
+        self.count += state['count']
+
+
+class BonusSavings(Aggregator):
+    sections = ('total_bonus_savings',)
+
+    def __init__(self):
+        self.total_cents = 0
+
+    def update(self, items: ClassifiedItems):
+        table = items.table
+        per_receipt = np.bincount(table.item_receipt[items.bonus], weights=table.item_cents[items.bonus],
+                                  minlength=table.num_receipts)
+        self.total_cents += int(np.abs(per_receipt).sum())
+
+    def result(self) -> Dict[str, Any]:
+        return {'total_bonus_savings': self.total_cents}
+
+    def state(self) -> Optional[Dict[str, Any]]:
+        return {'total_cents': self.total_cents}
+
+    def load_state(self, state: Dict[str, Any]):
+        self.total_cents = state['total_cents']
+
+    def merge_state(self, state: Dict[str, Any]):
+        self.total_cents += state['total_cents']
+
+
+class MostBoughtItems(Aggregator):
+    """Most frequently bought items.
+
+    Counts are kept per receipt description. If canonical is given, it maps
+    each description to a product name and counts of descriptions naming the
+    same product are combined in result().
+    """
+    sections = ('most_bought_items',)
+    DEFAULT_TOP_N = 10
+
+    def __init__(self, top_n: int = DEFAULT_TOP_N, canonical: Optional[Callable[[str], str]] = None):
+        self.top_n = top_n
+        self.canonical = canonical
+        self.counts: Dict[str, int] = {}
+
+    def update(self, items: ClassifiedItems):
+        counted = items.table.item_description[items.purchase]
+        if len(counted) == 0:
+            return
+        counts = np.bincount(counted)
+        for i in first_seen_order(counted):
+            description = items.table.descriptions[i]
+            self.counts[description] = self.counts.get(description, 0) + int(counts[i])
+
+    def result(self) -> Dict[str, Any]:
+        counts = combine_counts(self.counts, self.canonical) if self.canonical is not None else self.counts
+        # Stable sort keeps first-seen order for ties, like Counter.most_common
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return {'most_bought_items': ranked[:self.top_n]}
+
+    def state(self) -> Optional[Dict[str, Any]]:
+        return {'counts': self.counts}
+
+    def load_state(self, state: Dict[str, Any]):
+        self.counts = dict(state['counts'])
+
+    def merge_state(self, state: Dict[str, Any]):
+        add_to(self.counts, state['counts'])
+
+
+class SpendingByDay(Aggregator):
+    sections = ('spending_by_day',)
+
+    def __init__(self):
+        self.daily_cents: Dict[str, int] = {}
+
+    def update(self, items: ClassifiedItems):
+        table = items.table
+        receipt_day, day_labels = table.daily_keys()
+        for day, cents in table.group_sum(receipt_day, table.receipt_cents, day_labels).items():
+            self.daily_cents[day] = self.daily_cents.get(day, 0) + cents
+
+    def result(self) -> Dict[str, Any]:
+        return {'spending_by_day': dict(self.daily_cents)}
+
+    def state(self) -> Optional[Dict[str, Any]]:
+        return {'daily_cents': self.daily_cents}
+
+    def load_state(self, state: Dict[str, Any]):
+        self.daily_cents = dict(state['daily_cents'])
+
+    def merge_state(self, state: Dict[str, Any]):
+        add_to(self.daily_cents, state['daily_cents'])
+
+
+class SpendingByCategory(Aggregator):
+    """Spending per product category.
+
+    Categories are only known once every product has been seen, so the scan
+    collects the products to categorize along with spending per description;
+    categorize() is called once, from result().
+    """
+    sections = ('spending_by_category',)
+
+    def __init__(self, categorize: Callable[[Set[str]], Dict[str, str]]):
+        self.categorize = categorize
+        self.products: Set[str] = set()
+        self.description_cents: Dict[str, int] = {}
+
+    def update(self, items: ClassifiedItems):
+        table = items.table
+        self.products.update(table.descriptions[i] for i in np.unique(table.item_description[items.categorizable]))
+        spending = table.group_sum(table.item_description[items.spend], table.item_cents[items.spend],
+                                   table.descriptions)
+        for description, cents in spending.items():
+            self.description_cents[description] = self.description_cents.get(description, 0) + cents
+
+    def result(self) -> Dict[str, Any]:
+        categories_map = self.categorize(self.products)
+        category_cents = {}
+        for description, cents in self.description_cents.items():
+            category = categories_map.get(description, 'OTHER')
+            category_cents[category] = category_cents.get(category, 0) + cents
+        return {'spending_by_category': category_cents}
+
+    def state(self) -> Optional[Dict[str, Any]]:
+        # Categories themselves aren't persisted: categorize() answers known products from its cache
+        return {'products': sorted(self.products), 'description_cents': self.description_cents}
+
+    def load_state(self, state: Dict[str, Any]):
+        self.products = set(state['products'])
+        self.description_cents = dict(state['description_cents'])
+
+    def merge_state(self, state: Dict[str, Any]):
+        self.products.update(state['products'])
+        add_to(self.description_cents, state['description_cents'])
+
+
+def standard_aggregators(categorize: Callable[[Set[str]], Dict[str, str]],
+                         canonical: Optional[Callable[[str], str]] = None) -> List[Aggregator]:
+    """Aggregators for the sections of the standard analysis report"""
+    return [
+        ReceiptTotals(),
+        BonusSavings(),
+        MostBoughtItems(canonical=canonical),
+        SpendingByDay(),
+        SpendingByCategory(categorize),
+    ]
+
+
+class ReportEngine:
+    """Feeds every chunk of receipts through all aggregators in a single scan"""
+
+    def __init__(self, aggregators: Optional[List[Aggregator]] = None):
+        self.aggregators: List[Aggregator] = list(aggregators or [])
+
+    def register(self, aggregator: Aggregator):
+        """Add an aggregator; its sections are appended to the report"""
+        self.aggregators.append(aggregator)
+
+    def scan(self, tables: Iterable[ReceiptTable]):
+        """Classify each chunk's line items once and feed them to every aggregator"""
+        for table in tables:
+            items = ClassifiedItems(table)
+            for aggregator in self.aggregators:
+                aggregator.update(items)
+
+    def report(self) -> Dict[str, Any]:
+        """Collect the sections of all aggregators, in registration order"""
+        report = {}
+        for aggregator in self.aggregators:
+            report.update(aggregator.result())
+        return report
+
+
+class Report(Mapping):
+    """Analysis report whose sections are computed on first access and cached.
+
+    The first access to a scanned section runs the single scan that feeds
+    every aggregator needing one. Each aggregator's result() - where expensive
+    work such as LLM categorization happens - only runs when one of its
+    sections is requested. Both are timed as stages in `metrics`.
+    """
+
+    def __init__(self, aggregators: List[Aggregator], tables: Iterable[ReceiptTable],
+                 metrics: Optional[Metrics] = None):
+        self._engine = ReportEngine([aggregator for aggregator in aggregators if aggregator.needs_scan])
+        self._tables = tables
+        self._metrics = metrics or Metrics()
+        self._scanned = False
+        self._owners = {section: aggregator for aggregator in aggregators for section in aggregator.sections}
+        self._sections: Dict[str, Any] = {}
+
+    def scan(self):
+        """Run the scan over the receipts, unless it has already run"""
+        if not self._scanned:
+            with self._metrics.stage('scan'):
+                self._engine.scan(self._counted(self._tables))
+            self._scanned = True
+
+    def _counted(self, tables: Iterable[ReceiptTable]) -> Iterator[ReceiptTable]:
+        for table in tables:
+            self._metrics.count('scan.receipts', table.num_receipts)
+            self._metrics.count('scan.items', table.num_items)
+            yield table
+
+    def __getitem__(self, section: str) -> Any:
+        if section not in self._sections:
+            aggregator = self._owners[section]
+            if aggregator.needs_scan:
+                self.scan()
+            with self._metrics.stage(f"report.{type(aggregator).__name__}"):
+                self._sections.update(aggregator.result())
+        return self._sections[section]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._owners)
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    def computed_sections(self) -> List[str]:
+        """Sections computed so far"""
+        return [section for section in self._owners if section in self._sections]
@@ -0,0 +1,86 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Set
+
+from atomic_file import atomic_write
+from receipt_io import ReceiptKeys
+from report_engine import Aggregator
+
+
+class ReportState:
+    """Persisted aggregator totals plus the receipts they already include.
+
+    Restoring the state lets a report be brought up to date by scanning only
+    receipts added since the last run. The state belongs to one receipts file;
+    if that changes, or a report aggregator has no saved state, the report is
+    rebuilt from scratch. Delete the state file to force a rebuild, e.g. after
+    re-downloading receipt details with --full-refresh.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, receipts_file: str):
+        self.path = Path(path)
+        self.receipts_file = str(receipts_file)
+        self.receipt_keys: Set[str] = set()
+
+    @staticmethod
+    def _aggregator_key(aggregator: Aggregator) -> str:
+        return ','.join(aggregator.sections)
+
+    def restore(self, aggregators: List[Aggregator]) -> bool:
+        """Load saved totals into the scanning aggregators; False if the report must be rebuilt"""
+        self.receipt_keys = set()
+        if not self.path.exists():
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read report state {self.path}: {e}")
+            return False
+        if saved.get('version') != self.VERSION or saved.get('receipts_file') != self.receipts_file:
+            return False
+
+        states: Dict[str, Any] = saved.get('aggregators', {})
+        scanning = [aggregator for aggregator in aggregators if aggregator.needs_scan]
+        if any(self._aggregator_key(aggregator) not in states for aggregator in scanning):
+            return False
+        for aggregator in scanning:
+            aggregator.load_state(states[self._aggregator_key(aggregator)])
+        self.receipt_keys = set(saved['receipts'])
+        return True
+
+    def new_receipts(self, receipts: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yield only receipts not yet included in the totals, recording them as included.
+
+        Receipts are keyed as in ReceiptKeys, so a receipt that was included
+        before it had a transactionId is recognized by its date and amount, and
+        recorded under the transactionId from then on.
+        """
+        keys = ReceiptKeys(self.receipt_keys)
+        for receipt in receipts:
+            if keys.add(receipt)[1] is None:
+                yield receipt
+
+    def save(self, aggregators: List[Aggregator]):
+        """Write the totals of the scanning aggregators to disk atomically"""
+        states = {}
+        for aggregator in aggregators:
+            if not aggregator.needs_scan:
+                continue
+            state = aggregator.state()
+            if state is None:
+                print(f"Warning: {type(aggregator).__name__} has no persistent state; "
+                      f"the next run will rebuild the report from scratch")
+                continue
+            states[self._aggregator_key(aggregator)] = state
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(self.path) as f:
+            json.dump({
+                'version': self.VERSION,
+                'receipts_file': self.receipts_file,
+                'receipts': sorted(self.receipt_keys),
+                'aggregators': states,
+            }, f, ensure_ascii=False)
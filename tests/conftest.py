@@ -0,0 +1,24 @@
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+# The modules live at the repository root, next to main.py
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Temporary working directory holding prompt.txt; the analyzer writes analysis_output/ here"""
+    monkeypatch.chdir(tmp_path)
+    shutil.copy(REPO_ROOT / 'prompt.txt', tmp_path / 'prompt.txt')
+    return tmp_path
+
+
+def write_receipts(path, receipts):
+    """Write receipts as a JSON array and return the path as a string"""
+    Path(path).write_text(json.dumps(receipts), encoding='utf-8')
+    return str(path)
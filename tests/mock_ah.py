@@ -0,0 +1,109 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set
+
+DESCRIPTIONS = ['AH HALFVOLLE MELK', 'KOMKOMMER', 'AVOCADO']
+
+
+class MockAHServer:
+    """Local stand-in for the AH API, serving a listing of num_receipts receipts and their details.
+
+    Faults are injected by changing attributes while it runs: details of
+    `failing_ids` answer 500, the next `throttled` detail requests answer 429
+    with `retry_after`, and expire_token() makes the current access token
+    answer 401 until it is refreshed. Detail requests are counted per
+    transactionId in `detail_requests`.
+    """
+
+    def __init__(self, num_receipts: int = 20):
+        self.num_receipts = num_receipts
+        self.access_token = 'token-1'
+        self.refresh_token = 'refresh-1'
+        self.refreshes = 0
+        self.failing_ids: Set[str] = set()
+        self.throttled = 0
+        self.retry_after = '0.1'
+        self.detail_requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self) -> 'MockAHServer':
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def tokens(self) -> Dict[str, Any]:
+        """Token response for the current tokens, as the fetcher saves it"""
+        return {"access_token": self.access_token, "refresh_token": self.refresh_token, "expires_in": 3600}
+
+    def expire_token(self):
+        """Reject the current access token until the fetcher refreshes it"""
+        self.access_token = f'expired-{self.refreshes}'
+
+    def transaction_ids(self) -> List[str]:
+        return [f'T{i:03d}' for i in range(self.num_receipts)]
+
+    def listing(self) -> List[Dict[str, Any]]:
+        return [{"transactionId": transaction_id,
+                 "transactionMoment": f"2024-03-{i % 28 + 1:02d}T10:{i % 60:02d}:00Z",
+                 "total": {"amount": {"amount": 2.5 + i}}}
+                for i, transaction_id in enumerate(self.transaction_ids())]
+
+    def details(self, transaction_id: str) -> Dict[str, Any]:
+        i = int(transaction_id[1:])
+        return {"receiptUiItems": [
+            {"type": "product", "quantity": "1", "description": DESCRIPTIONS[i % 3], "amount": 2.5 + i},
+            {"type": "text", "description": "BONUSKAART xx1234"},
+        ]}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not self.path.endswith('/token/refresh'):
+                    return self._send(404, {})
+                with server._lock:
+                    if payload.get('refreshToken') != server.refresh_token:
+                        return self._send(401, {"error": "invalid refresh token"})
+                    server.refreshes += 1
+                    server.access_token = f'token-{server.refreshes + 1}'
+                    server.refresh_token = f'refresh-{server.refreshes + 1}'
+                    self._send(200, server.tokens)
+
+            def do_GET(self):
+                with server._lock:
+                    if self.headers.get('Authorization') != f'Bearer {server.access_token}':
+                        return self._send(401, {"error": "invalid token"})
+                    if self.path.endswith('/v1/receipts'):
+                        return self._send(200, server.listing())
+                    transaction_id = self.path.rsplit('/', 1)[-1]
+                    server.detail_requests[transaction_id] = server.detail_requests.get(transaction_id, 0) + 1
+                    if server.throttled > 0:
+                        server.throttled -= 1
+                        return self._send(429, {}, {'Retry-After': server.retry_after})
+                    if transaction_id in server.failing_ids:
+                        return self._send(500, {"error": "backend unavailable"})
+                self._send(200, server.details(transaction_id))
+
+        return Handler
@@ -0,0 +1,77 @@
+import json
+import threading
+import time
+from typing import Dict, List
+
+
+class StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubModel:
+    """Stands in for the Gemini model, answering each product of a prompt from a fixed mapping.
+
+    Products are the lines after the prompt's last blank line; unknown
+    products get `default`. Every prompt is recorded in `prompts`.
+    """
+
+    def __init__(self, categories: Dict[str, str] = None, default: str = 'OTHER'):
+        self.categories = categories or {}
+        self.default = default
+        self.prompts: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def calls(self) -> int:
+        return len(self.prompts)
+
+    def products(self, prompt: str) -> List[str]:
+        """Products listed in a prompt"""
+        return [line for line in prompt.rsplit('\n\n', 1)[-1].split('\n') if line.strip()]
+
+    def reply(self, prompt: str) -> StubResponse:
+        """Reply categorizing every product of the prompt"""
+        return StubResponse(json.dumps([{"product_name": product,
+                                         "category": self.categories.get(product, self.default)}
+                                        for product in self.products(prompt)]))
+
+    def generate_content(self, prompt, generation_config=None):
+        with self._lock:
+            self.prompts.append(prompt)
+        return self.reply(prompt)
+
+
+class ScriptedModel(StubModel):
+    """StubModel whose first replies follow a script, for injecting faults.
+
+    Each script entry is used for one call, in order: an exception is
+    raised, a string is returned as the reply text, and None gives the
+    normal reply. Calls take `delay` seconds; the most calls in flight at
+    once is kept in `max_in_flight`.
+    """
+
+    def __init__(self, script=(), categories: Dict[str, str] = None, default: str = 'OTHER',
+                 delay: float = 0.0):
+        super().__init__(categories, default)
+        self.script = list(script)
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def generate_content(self, prompt, generation_config=None):
+        with self._lock:
+            self.prompts.append(prompt)
+            step = self.script.pop(0) if self.script else None
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if isinstance(step, Exception):
+            raise step
+        if isinstance(step, str):
+            return StubResponse(step)
+        return self.reply(prompt)
@@ -0,0 +1,27 @@
+import os
+import stat
+
+import pytest
+
+from atomic_file import atomic_write
+
+
+def test_failed_write_keeps_the_previous_file(tmp_path):
+    path = tmp_path / 'receipts.json'
+    path.write_text('[]', encoding='utf-8')
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as f:
+            f.write('[{"date": ')
+            raise RuntimeError('disk full')
+    assert path.read_text(encoding='utf-8') == '[]'
+    assert os.listdir(tmp_path) == ['receipts.json']
+
+
+def test_permissions_apply_to_the_new_file(tmp_path):
+    path = tmp_path / 'token.json'
+    with atomic_write(path, permissions=0o600) as f:
+        f.write('{}')
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+    with atomic_write(path, 'wb') as f:
+        f.write(b'{"access_token": "a"}')
+    assert path.read_bytes() == b'{"access_token": "a"}'
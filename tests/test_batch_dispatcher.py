@@ -0,0 +1,57 @@
+import json
+
+from categorizer import BatchDispatcher
+from stubs import ScriptedModel
+
+
+class ResourceExhausted(Exception):
+    """Like google.api_core's rate limit error"""
+    code = 429
+
+
+def build_prompt(products):
+    return 'Categorize these products:\n\n' + '\n'.join(products)
+
+
+def products(count):
+    return [f'PRODUCT {i}' for i in range(count)]
+
+
+def test_batches_run_concurrently_up_to_the_limit():
+    model = ScriptedModel(default='SNACKS', delay=0.05)
+    dispatcher = BatchDispatcher(model, max_concurrency=4, batch_size=5)
+    categories = dispatcher.dispatch(products(40), build_prompt)
+    assert categories == {product: 'SNACKS' for product in products(40)}
+    assert model.calls == 8
+    assert model.max_in_flight == 4
+
+
+def test_rate_limits_are_retried_with_backoff():
+    model = ScriptedModel([ResourceExhausted('429 Resource has been exhausted'), ConnectionError('reset')])
+    sleeps = []
+    dispatcher = BatchDispatcher(model, sleep=sleeps.append)
+    assert dispatcher.dispatch(products(3), build_prompt) == {product: 'OTHER' for product in products(3)}
+    assert model.calls == 3
+    assert len(sleeps) == 2
+    assert dispatcher.metrics.counters['llm.retries'] == 2
+
+
+def test_only_products_missing_from_a_reply_are_requested_again():
+    partial = json.dumps([{"product_name": "PRODUCT 0", "category": "DAIRY"}])
+    model = ScriptedModel(['Sorry, I can not help with that', partial])
+    dispatcher = BatchDispatcher(model, sleep=lambda seconds: None)
+    categories = dispatcher.dispatch(products(3), build_prompt)
+    assert categories == {'PRODUCT 0': 'DAIRY', 'PRODUCT 1': 'OTHER', 'PRODUCT 2': 'OTHER'}
+    assert [model.products(prompt) for prompt in model.prompts] == [products(3), products(3), products(3)[1:]]
+    assert dispatcher.metrics.counters['llm.parse_errors'] == 1
+    assert dispatcher.metrics.counters['llm.reprompts'] == 2
+
+
+def test_a_failed_batch_keeps_the_categories_of_the_others():
+    model = ScriptedModel([PermissionError('API key not valid')])
+    finished = []
+    dispatcher = BatchDispatcher(model, max_concurrency=1, batch_size=2, sleep=lambda seconds: None)
+    categories = dispatcher.dispatch(products(4), build_prompt, on_batch=finished.append)
+    assert categories == {'PRODUCT 2': 'OTHER', 'PRODUCT 3': 'OTHER'}
+    assert finished == [categories]
+    assert dispatcher.metrics.counters['llm.failed_batches'] == 1
@@ -0,0 +1,50 @@
+import pytest
+
+from category_cache import CategoryCache
+from categorizer import ProductCategorizer
+from conftest import write_receipts
+from main import AHReceiptAnalyzer
+from stubs import StubModel
+
+
+def test_local_categories_keep_their_source_and_confidence(tmp_path):
+    cache = CategoryCache('prompt', 'model', str(tmp_path))
+    cache.update({'AH HUMMUS': 'DIPS & SAUCES'})
+    cache.update_local({'Komkommer': ('VEGETABLES', 0.95), 'AH TOMATEN': ('VEGETABLES', 0.85)})
+    cache.save()
+
+    cache = CategoryCache('prompt', 'model', str(tmp_path))
+    assert cache.lookup(['AH HUMMUS', 'KOMKOMMER', 'AH TOMATEN'], 0.8) == {
+        'AH HUMMUS': 'DIPS & SAUCES', 'KOMKOMMER': 'VEGETABLES', 'AH TOMATEN': 'VEGETABLES'}
+    # A stricter threshold sends the less confident local answers to the model again
+    assert cache.lookup(['AH HUMMUS', 'KOMKOMMER', 'AH TOMATEN'], 0.9) == {
+        'AH HUMMUS': 'DIPS & SAUCES', 'KOMKOMMER': 'VEGETABLES'}
+    # Only the model's answers train the local categorizer
+    assert cache.model_categories() == {'AH HUMMUS': 'DIPS & SAUCES'}
+
+
+@pytest.fixture
+def receipts_file(workdir):
+    products = ['CHERRYTOMATEN', 'CHERRYTOMATEN HUMMUS', 'CHERRYTOMATEN PESTO', 'KOMKOMMER', 'AH BAPAO']
+    return write_receipts(workdir / 'receipts.json', [
+        {"transactionId": "AH1", "date": "2024-03-01 10:00", "amount_cents": 100 * len(products),
+         "products": [{"quantity": "1", "description": product, "amount_cents": 100} for product in products]}])
+
+
+def categorize(receipts_file, model):
+    categorizer = ProductCategorizer(cache_dir='cache')
+    categorizer.model = model
+    return AHReceiptAnalyzer(receipts_file, categorizer).categorize_products()
+
+
+def test_rerun_on_unchanged_data_makes_no_model_calls(receipts_file):
+    # The model's answers split the votes of CHERRYTOMATEN, which was categorized locally
+    model = StubModel({'CHERRYTOMATEN HUMMUS': 'DIPS & SAUCES', 'CHERRYTOMATEN PESTO': 'VEGETABLES',
+                       'AH BAPAO': 'PREPARED MEALS'})
+    first = categorize(receipts_file, model)
+    assert sorted(product for prompt in model.prompts for product in model.products(prompt)) == [
+        'AH BAPAO', 'CHERRYTOMATEN HUMMUS', 'CHERRYTOMATEN PESTO']
+
+    rerun = StubModel()
+    assert categorize(receipts_file, rerun) == first
+    assert rerun.calls == 0
@@ -0,0 +1,48 @@
+import json
+
+from categorizer import ProductCategorizer
+from conftest import write_receipts
+from dashboard import FONT_AWESOME_CDN_URL, dashboard_data, generate_dashboard_html, write_dashboard_bundle
+from main import AHReceiptAnalyzer
+from stubs import StubModel
+
+
+def analyzer(workdir):
+    receipts_file = write_receipts(workdir / 'receipts.json', [
+        {"transactionId": "AH1", "date": "2024-03-01 10:00", "amount_cents": 1234,
+         "products": [{"quantity": "1", "description": "KOMKOMMER", "amount_cents": 1234}]},
+        {"transactionId": "AH2", "date": "2024-04-01 10:00", "amount_cents": 566,
+         "products": [{"quantity": "1", "description": "AH BAPAO", "amount_cents": 566}]},
+    ])
+    categorizer = ProductCategorizer(cache_dir='cache')
+    categorizer.model = StubModel(default='PREPARED MEALS')
+    return AHReceiptAnalyzer(receipts_file, categorizer)
+
+
+def test_dashboard_renders_generated_report_in_euros(workdir):
+    report = analyzer(workdir).generate_report()
+    assert report['amount_unit'] == 'cents'
+
+    stats = dashboard_data(report)['stats']
+    assert stats['total_spending'] == '€18.00'
+    assert stats['average_transaction'] == 'Avg €9.00'
+    assert dashboard_data(report)['categories'] == {'VEGETABLES': 12.34, 'PREPARED MEALS': 5.66}
+    assert '"total_spending": "\\u20ac18.00"' in generate_dashboard_html(report)
+
+
+def test_saved_report_matches_generated_report(workdir):
+    report_analyzer = analyzer(workdir)
+    report_analyzer.save_report(charts=())
+    with open(workdir / 'analysis_output' / 'analysis_report.json', encoding='utf-8') as f:
+        saved = json.load(f)
+    assert saved == json.loads(json.dumps(report_analyzer.generate_report()))
+
+
+def test_offline_bundle_has_no_icons(workdir):
+    report = analyzer(workdir).generate_report()
+    html = generate_dashboard_html(report)
+    assert FONT_AWESOME_CDN_URL in html and 'class="fas fa-wallet"' in html
+
+    shell = write_dashboard_bundle(report, str(workdir / 'dashboard')).read_text(encoding='utf-8')
+    assert 'fa-' not in shell and '://' not in shell
+    assert '<div class="stat-card-title">Total Spending</div>' in shell
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from main import AHReceiptsFetcher
+from mock_ah import MockAHServer
+from receipt_io import load_receipts
+from receipt_store import FetchCheckpoint
+
+
+@pytest.fixture
+def server():
+    with MockAHServer() as server:
+        yield server
+
+
+def logged_in_fetcher(server, **kwargs):
+    """Fetcher talking to the mock server, logged in with its current tokens"""
+    fetcher = AHReceiptsFetcher(max_workers=4, rate_limit=1000, **kwargs)
+    fetcher.BASE_URL = server.url
+    fetcher._set_tokens(server.tokens)
+    return fetcher
+
+
+def test_failed_details_are_skipped_and_fetched_on_the_next_sync(server, tmp_path):
+    receipts_file = str(tmp_path / 'receipts.json')
+    server.failing_ids = {'T003', 'T011'}
+    fetcher = logged_in_fetcher(server)
+    fetcher.fetch_and_save_receipts(receipts_file)
+
+    expected = [transaction_id for transaction_id in server.transaction_ids() if transaction_id not in server.failing_ids]
+    # Saved in listing order, whichever worker finished first
+    assert [entry['transactionId'] for entry in load_receipts(receipts_file)] == expected
+    assert fetcher.metrics.counters['fetch.failed_receipts'] == 2
+
+    server.failing_ids = set()
+    server.detail_requests.clear()
+    logged_in_fetcher(server).fetch_and_save_receipts(receipts_file)
+    assert server.detail_requests == {'T003': 1, 'T011': 1}
+    assert [entry['transactionId'] for entry in load_receipts(receipts_file)] == server.transaction_ids()
+
+
+def test_rejected_token_is_refreshed_once_for_all_workers(server):
+    fetcher = logged_in_fetcher(server)
+    server.expire_token()
+
+    entries = fetcher.fetch_receipt_entries(server.listing())
+    assert [entry['transactionId'] for entry in entries] == server.transaction_ids()
+    assert server.refreshes == 1
+    assert fetcher.access_token == server.access_token
+    assert fetcher.metrics.counters['http.token_refreshes'] == 1
+
+
+def test_throttled_requests_wait_for_retry_after_and_slow_down(server):
+    server.throttled = 3
+    server.retry_after = '0.2'
+    fetcher = logged_in_fetcher(server)
+
+    started = time.monotonic()
+    entries = fetcher.fetch_receipt_entries(server.listing())
+    assert time.monotonic() - started >= 0.2
+    assert [entry['transactionId'] for entry in entries] == server.transaction_ids()
+    assert sum(server.detail_requests.values()) == server.num_receipts + 3
+    assert fetcher.metrics.counters['http.throttled'] == 3
+    assert fetcher.rate_limiter.rate < 1000
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_interrupted_sync_resumes_from_the_checkpoint(server, tmp_path, monkeypatch):
+    receipts_file = tmp_path / 'receipts.json'
+    checkpointed = []
+    lock = threading.Lock()
+    append = FetchCheckpoint.append
+
+    def append_until_interrupted(checkpoint, entry):
+        with lock:
+            if len(checkpointed) == 8:
+                raise Interrupted()
+            checkpointed.append(entry['transactionId'])
+            append(checkpoint, entry)
+
+    monkeypatch.setattr(FetchCheckpoint, 'append', append_until_interrupted)
+    with pytest.raises(Interrupted):
+        logged_in_fetcher(server).fetch_and_save_receipts(str(receipts_file))
+    assert not receipts_file.exists()
+    monkeypatch.undo()
+
+    server.detail_requests.clear()
+    logged_in_fetcher(server).fetch_and_save_receipts(str(receipts_file))
+    # Only receipts missing from the checkpoint are requested again
+    assert set(server.detail_requests) == set(server.transaction_ids()) - set(checkpointed)
+    assert [entry['transactionId'] for entry in load_receipts(receipts_file)] == server.transaction_ids()
+    assert not FetchCheckpoint(receipts_file).path.exists()
@@ -0,0 +1,41 @@
+import pytest
+
+from conftest import REPO_ROOT
+from local_categorizer import LocalCategorizer
+from prompt_template import PromptTemplate
+
+
+@pytest.fixture
+def categorizer():
+    return LocalCategorizer.from_prompt(PromptTemplate.from_file(str(REPO_ROOT / 'prompt.txt')).instructions)
+
+
+@pytest.mark.parametrize('product, category', [
+    ('KOMKOMMER', 'VEGETABLES'),
+    ('AH HALFVOLLE MELK', 'MILK & YOGURT'),
+    ('CHERRYTOMATEN', 'VEGETABLES'),
+    ('AH SINAASAPPELSAP', 'SODA & JUICE'),
+    ('AH SPA BLAUW', 'WATER'),
+    ('AH ROOMIJS VANILLE', 'FROZEN FOODS'),
+])
+def test_known_products_are_categorized_locally(categorizer, product, category):
+    assert categorizer.categorize([product])[product][0] == category
+
+
+@pytest.mark.parametrize('product', [
+    # Only the modifier at the start of the compound is known
+    'AH TOMATENSOEP',
+    'KAASSOUFFLE',
+    # A three-letter keyword at the end of a longer word (IJS)
+    'AH PRIJS',
+    # Words pointing at different categories
+    'MICELLAIR WATER',
+])
+def test_uncertain_products_are_left_to_the_llm(categorizer, product):
+    assert categorizer.categorize([product]) == {}
+
+
+def test_learned_votes_outweigh_keywords(categorizer):
+    categorizer.learn({'AH SOEPGROENTE': 'VEGETABLES', 'UNOX TOMATENSOEP': 'PREPARED MEALS',
+                       'AH TOMATENSOEP KIP': 'PREPARED MEALS'})
+    assert categorizer.categorize(['HONIG TOMATENSOEP']) == {'HONIG TOMATENSOEP': ('PREPARED MEALS', 1.0)}
@@ -0,0 +1,33 @@
+import pytest
+
+from product_index import ProductIndex
+
+
+@pytest.mark.parametrize('shorter, longer', [
+    ('AH SINAASAPPELS', 'AH SINAASAPPELSAP'),
+    ('AH TOMATEN', 'AH TOMATENSOEP'),
+    ('AH ROOMBOTER', 'AH ROOMBOTERKOEK'),
+    ('AH APPELSAP', 'AH APPELSAPJES'),
+])
+def test_compound_words_are_separate_products(shorter, longer):
+    index = ProductIndex(receipt_width=16)
+    assert index.add(shorter) != index.add(longer)
+    assert index.group([shorter, longer]) == {shorter: [shorter], longer: [longer]}
+
+
+def test_description_at_receipt_width_is_truncated():
+    index = ProductIndex(receipt_width=16)
+    assert index.group(['AH HALFVOLLE MEL', 'AH HALFVOLLE MELK']) == {
+        'AH HALFVOLLE MELK': ['AH HALFVOLLE MEL', 'AH HALFVOLLE MELK']}
+
+
+def test_truncation_needs_a_receipt_width():
+    index = ProductIndex()
+    assert index.add('AH HALFVOLLE MEL') != index.add('AH HALFVOLLE MELK')
+
+
+def test_spelling_variants_are_grouped():
+    index = ProductIndex()
+    assert index.add('AH Halfvolle melk 1L') == index.add('AH HALFVOLLE MELK') == index.add('AH HALFVOLE MELK')
+    assert index.canonical('AH Halfvolle melk 1L') == 'AH HALFVOLLE MELK'
+    assert index.add('JONGE KAAS 30+') != index.add('JONGE KAAS 48+')
@@ -0,0 +1,34 @@
+import json
+
+from receipt_io import summary_key
+from receipt_store import ReceiptStore
+
+
+def legacy_receipt(description):
+    return {"date": "2024-03-01 10:00", "amount_cents": 250,
+            "products": [{"quantity": "1", "description": description, "amount_cents": 250}]}
+
+
+def test_entries_sharing_a_date_and_amount_are_kept(tmp_path):
+    path = tmp_path / 'receipts.json'
+    path.write_text(json.dumps([legacy_receipt('AH MELK'), legacy_receipt('AH BROOD')]), encoding='utf-8')
+
+    store = ReceiptStore(str(path))
+    assert len(store) == 2
+    store.save()
+    assert json.loads(path.read_text(encoding='utf-8')) == [legacy_receipt('AH MELK'), legacy_receipt('AH BROOD')]
+
+
+def test_legacy_entries_are_adopted_one_at_a_time(tmp_path):
+    path = tmp_path / 'receipts.json'
+    path.write_text(json.dumps([legacy_receipt('AH MELK'), legacy_receipt('AH BROOD')]), encoding='utf-8')
+    summary = summary_key(legacy_receipt('AH MELK'))
+
+    store = ReceiptStore(str(path))
+    assert store.adopt_legacy('T1', summary)
+    assert store.adopt_legacy('T2', summary)
+    assert not store.adopt_legacy('T3', summary)
+    store.save(['T1', 'T2'])
+    saved = json.loads(path.read_text(encoding='utf-8'))
+    assert [receipt['transactionId'] for receipt in saved] == ['T1', 'T2']
+    assert sorted(receipt['products'][0]['description'] for receipt in saved) == ['AH BROOD', 'AH MELK']
@@ -0,0 +1,27 @@
+import pytest
+
+from receipt_table import QTY_ACTIE, QTY_BONUS, QTY_NONE, QTY_REGULAR, ReceiptTable
+
+
+def test_columns_mix_cent_and_legacy_amounts():
+    table = ReceiptTable.from_receipts([
+        {"date": "2024-03-01 10:00", "amount": "€3,50",
+         "products": [{"quantity": "1", "description": "AH MELK", "amount": "€1,25"},
+                      {"quantity": "BONUS", "description": "BONUS AH MELK", "amount": "€-0.50"}]},
+        {"date": "2024-03-02 18:30", "amount_cents": 400,
+         "products": [{"quantity": None, "description": "PINNEN", "amount_cents": 400},
+                      {"quantity": "ACTIE", "description": "AH MELK", "amount_cents": 125},
+                      {"quantity": "2", "description": "AH BROOD", "amount": "€2.99"}]},
+    ])
+    assert list(table.receipt_dates.astype(str)) == ['2024-03-01T10:00', '2024-03-02T18:30']
+    assert list(table.receipt_cents) == [350, 400]
+    assert list(table.item_receipt) == [0, 0, 1, 1, 1]
+    assert table.descriptions == ['AH MELK', 'BONUS AH MELK', 'PINNEN', 'AH BROOD']
+    assert list(table.item_description) == [0, 1, 2, 0, 3]
+    assert list(table.item_kind) == [QTY_REGULAR, QTY_BONUS, QTY_NONE, QTY_ACTIE, QTY_REGULAR]
+    assert list(table.item_cents) == [125, -50, 400, 125, 299]
+
+
+def test_malformed_dates_are_rejected():
+    with pytest.raises(ValueError):
+        ReceiptTable.from_receipts([{"date": "2024-13-01 10:00", "amount_cents": 0, "products": []}])
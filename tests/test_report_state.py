@@ -0,0 +1,34 @@
+import json
+
+from main import AHReceiptAnalyzer
+
+
+def receipt(day, description, cents, transaction_id=None):
+    entry = {"date": f"2024-03-{day:02d} 10:00", "amount_cents": cents,
+             "products": [{"quantity": "1", "description": description, "amount_cents": cents}]}
+    if transaction_id:
+        entry["transactionId"] = transaction_id
+    return entry
+
+
+def update(tmp_path, receipts):
+    """Write the receipts file and bring the incremental report up to date; returns the report totals"""
+    receipts_file = tmp_path / 'receipts.json'
+    receipts_file.write_text(json.dumps(receipts), encoding='utf-8')
+    analyzer = AHReceiptAnalyzer(str(receipts_file), state_file=str(tmp_path / 'report_state.json'))
+    report = analyzer.get_report()
+    totals = report['num_transactions'], report['total_spending']
+    analyzer.save_report_state()
+    return totals
+
+
+def test_receipts_are_counted_once_across_runs(tmp_path):
+    legacy = [receipt(1, 'AH MELK', 250), receipt(1, 'AH BROOD', 250), receipt(2, 'AH KAAS', 500)]
+    assert update(tmp_path, legacy) == (3, 1000)
+    assert update(tmp_path, legacy) == (3, 1000)
+
+    # A sync attached transactionIds, first to one of the identical-looking receipts
+    assert update(tmp_path, [legacy[0], dict(legacy[1], transactionId='T2'), legacy[2]]) == (3, 1000)
+    synced = [dict(entry, transactionId=f'T{i}') for i, entry in enumerate(legacy, 1)]
+    assert update(tmp_path, synced) == (3, 1000)
+    assert update(tmp_path, synced + [receipt(3, 'AH MELK', 250, 'T4')]) == (4, 1250)
@@ -0,0 +1,30 @@
+from warehouse import ReceiptWarehouse
+
+
+def receipt(day, description, cents, transaction_id=None):
+    entry = {"date": f"2024-03-{day:02d} 10:00", "amount_cents": cents,
+             "products": [{"quantity": "1", "description": description, "amount_cents": cents}]}
+    if transaction_id:
+        entry["transactionId"] = transaction_id
+    return entry
+
+
+def test_receipts_sharing_a_date_and_amount_are_imported_once_each(tmp_path):
+    legacy = [receipt(1, 'AH MELK', 250), receipt(1, 'AH BROOD', 250), receipt(2, 'AH KAAS', 500)]
+    warehouse = ReceiptWarehouse(str(tmp_path / 'receipts.db'))
+    assert warehouse.import_receipts(legacy) == 3
+    assert warehouse.import_receipts(legacy) == 0
+    assert warehouse.receipt_totals()['num_transactions'] == 3
+
+
+def test_adopted_transaction_ids_take_over_stored_rows(tmp_path):
+    legacy = [receipt(1, 'AH MELK', 250), receipt(1, 'AH BROOD', 250), receipt(2, 'AH KAAS', 500)]
+    warehouse = ReceiptWarehouse(str(tmp_path / 'receipts.db'))
+    warehouse.import_receipts(legacy)
+
+    # A sync attached a transactionId to one of the identical-looking receipts, then to all of them
+    assert warehouse.import_receipts([legacy[0], dict(legacy[1], transactionId='T2'), legacy[2]]) == 0
+    synced = [dict(entry, transactionId=f'T{i}') for i, entry in enumerate(legacy, 1)]
+    assert warehouse.import_receipts(synced) == 0
+    assert warehouse.receipt_totals() == {'total_spending': 1000, 'num_transactions': 3, 'average_transaction': 333}
+    assert warehouse.import_receipts(synced + [receipt(3, 'AH MELK', 250, 'T4')]) == 1
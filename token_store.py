@@ -0,0 +1,44 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from atomic_file import atomic_write
+
+DEFAULT_TOKEN_FILE = Path.home() / '.ah_receipts' / 'token.json'
+
+
+class TokenStore:
+    """AH access and refresh token pair persisted between runs.
+
+    The file is created readable by the current user only, in a directory
+    only that user can enter, and replaced atomically so a crash during a
+    refresh never leaves a truncated token file behind.
+    """
+
+    def __init__(self, path: str = DEFAULT_TOKEN_FILE):
+        self.path = Path(path)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """The saved tokens ({access_token, refresh_token, expires_at}), or None if there are none"""
+        if not self.path.exists():
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                tokens = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read saved login {self.path}: {e}")
+            return None
+        if not tokens.get('access_token') and not tokens.get('refresh_token'):
+            return None
+        return tokens
+
+    def save(self, tokens: Dict[str, Any]):
+        """Persist the tokens, replacing the saved ones"""
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        # Only readable by the user, from the moment the file is created
+        with atomic_write(self.path, permissions=0o600) as f:
+            json.dump(tokens, f)
+
+    def clear(self):
+        """Forget the saved tokens, e.g. after the refresh token was rejected"""
+        self.path.unlink(missing_ok=True)
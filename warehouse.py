@@ -0,0 +1,207 @@
+import sqlite3
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from receipt_io import ReceiptKeys
+from receipt_table import ReceiptTable
+from report_engine import (ClassifiedItems, QueryAggregator, KIND_BONUS, MostBoughtItems, combine_counts)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS receipts (
+    id INTEGER PRIMARY KEY,
+    transaction_id TEXT NOT NULL UNIQUE,
+    date TEXT NOT NULL,
+    amount_cents INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS line_items (
+    receipt_id INTEGER NOT NULL REFERENCES receipts(id),
+    description TEXT NOT NULL,
+    quantity TEXT,
+    kind INTEGER NOT NULL,
+    is_purchase INTEGER NOT NULL,
+    is_categorizable INTEGER NOT NULL,
+    is_spend INTEGER NOT NULL,
+    amount_cents INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS product_categories (
+    description TEXT PRIMARY KEY,
+    category TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_receipts_date ON receipts(date);
+CREATE INDEX IF NOT EXISTS idx_line_items_receipt ON line_items(receipt_id);
+CREATE INDEX IF NOT EXISTS idx_line_items_description ON line_items(description);
+CREATE INDEX IF NOT EXISTS idx_product_categories_category ON product_categories(category);
+"""
+
+
+class ReceiptWarehouse:
+    """SQLite store of receipts, line items and product categories.
+
+    Line items are classified once on import, so report metrics and ad-hoc
+    questions run as indexed SQL aggregates without loading the receipts
+    into Python. Dates are 'YYYY-MM-DD HH:MM' strings and amounts are cents.
+    """
+
+    IMPORT_CHUNK_SIZE = 1000
+
+    def __init__(self, path: str = 'receipts.db'):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def import_receipts(self, receipts: Iterable[Dict[str, Any]]) -> int:
+        """Add receipts not stored yet, returning how many were added.
+
+        Receipts without a transactionId are keyed as in ReceiptKeys. One whose
+        transactionId is new but whose date and amount match a receipt stored
+        without one is the same receipt: the stored row takes over the
+        transactionId instead of a second row being added.
+        """
+        keys = ReceiptKeys({row[0] for row in self.conn.execute("SELECT transaction_id FROM receipts")})
+        next_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM receipts").fetchone()[0]
+        added = 0
+        receipts = iter(receipts)
+        while True:
+            chunk = list(islice(receipts, self.IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            new = []
+            adopted = []
+            for receipt in chunk:
+                key, stored_key = keys.add(receipt)
+                if stored_key is None:
+                    new.append((key, receipt))
+                elif stored_key != key:
+                    adopted.append((key, stored_key))
+            self.conn.executemany("UPDATE receipts SET transaction_id = ? WHERE transaction_id = ?", adopted)
+            if new:
+                self._insert([receipt for _, receipt in new], [key for key, _ in new], next_id)
+                next_id += len(new)
+                added += len(new)
+        self.conn.commit()
+        if added:
+            # Refresh planner statistics for the new data
+            self.conn.execute("PRAGMA optimize")
+        return added
+
+    def _insert(self, receipts: List[Dict[str, Any]], keys: List[str], first_id: int):
+        table = ReceiptTable.from_receipts(receipts)
+        items = ClassifiedItems(table)
+        receipt_ids = np.arange(first_id, first_id + len(receipts))
+        self.conn.executemany(
+            "INSERT INTO receipts (id, transaction_id, date, amount_cents) VALUES (?, ?, ?, ?)",
+            zip(receipt_ids.tolist(), keys, (receipt['date'] for receipt in receipts), table.receipt_cents.tolist()))
+        quantities = [product['quantity'] for receipt in receipts for product in receipt['products']]
+        self.conn.executemany(
+            "INSERT INTO line_items (receipt_id, description, quantity, kind, is_purchase, is_categorizable, "
+            "is_spend, amount_cents) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            zip(receipt_ids[table.item_receipt].tolist(),
+                (table.descriptions[i] for i in table.item_description.tolist()),
+                (None if quantity is None else str(quantity) for quantity in quantities),
+                items.kind.tolist(), items.purchase.tolist(), items.categorizable.tolist(),
+                items.spend.tolist(), table.item_cents.tolist()))
+
+    # Report metrics
+
+    def receipt_totals(self) -> Dict[str, Any]:
+        total, count = self.conn.execute("SELECT COALESCE(SUM(amount_cents), 0), COUNT(*) FROM receipts").fetchone()
+        return {
+            'total_spending': total,
+            'num_transactions': count,
+            'average_transaction': round(total / count) if count else 0,
+        }
+
+    def bonus_savings(self) -> Dict[str, Any]:
+        (total,) = self.conn.execute(
+            "SELECT COALESCE(SUM(ABS(bonus)), 0) FROM "
+            "(SELECT SUM(amount_cents) AS bonus FROM line_items WHERE kind = ? GROUP BY receipt_id)",
+            (KIND_BONUS,)).fetchone()
+        return {'total_bonus_savings': total}
+
+    def most_bought_items(self, top_n: int = MostBoughtItems.DEFAULT_TOP_N,
+                          canonical: Optional[Callable[[str], str]] = None) -> Dict[str, Any]:
+        if canonical is not None:
+            # Variants of a product are combined in Python, from one count per distinct description
+            rows = self.conn.execute(
+                "SELECT description, COUNT(*) FROM line_items WHERE is_purchase "
+                "GROUP BY description ORDER BY MIN(rowid)").fetchall()
+            ranked = sorted(combine_counts(dict(rows), canonical).items(), key=lambda item: item[1], reverse=True)
+            return {'most_bought_items': ranked[:top_n]}
+        # Ties are broken by first occurrence, like the in-memory report
+        rows = self.conn.execute(
+            "SELECT description, COUNT(*) FROM line_items WHERE is_purchase "
+            "GROUP BY description ORDER BY COUNT(*) DESC, MIN(rowid) LIMIT ?", (top_n,)).fetchall()
+        return {'most_bought_items': [tuple(row) for row in rows]}
+
+    def spending_by_day(self) -> Dict[str, Any]:
+        rows = self.conn.execute(
+            "SELECT substr(date, 1, 10) AS day, SUM(amount_cents) FROM receipts "
+            "GROUP BY day ORDER BY MIN(id)").fetchall()
+        return {'spending_by_day': dict(rows)}
+
+    def categorizable_products(self) -> Set[str]:
+        """Distinct product descriptions that are sent for categorization"""
+        rows = self.conn.execute("SELECT DISTINCT description FROM line_items WHERE is_categorizable")
+        return {row[0] for row in rows}
+
+    def store_categories(self, categories: Dict[str, str]):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO product_categories (description, category) VALUES (?, ?)",
+            categories.items())
+        self.conn.commit()
+
+    def spending_by_category(self, categorize: Callable[[Set[str]], Dict[str, str]]) -> Dict[str, Any]:
+        # categorize() answers known products from its cache, so this stays in sync with prompt changes
+        self.store_categories(categorize(self.categorizable_products()))
+        rows = self.conn.execute(
+            "SELECT COALESCE(pc.category, 'OTHER'), SUM(li.amount_cents) FROM line_items li "
+            "LEFT JOIN product_categories pc ON pc.description = li.description "
+            "WHERE li.is_spend GROUP BY 1 ORDER BY MIN(li.rowid)").fetchall()
+        return {'spending_by_category': dict(rows)}
+
+    def report_aggregators(self, categorize: Callable[[Set[str]], Dict[str, str]],
+                           canonical: Optional[Callable[[str], str]] = None) -> List[QueryAggregator]:
+        """Aggregators answering the standard report sections with SQL"""
+        return [
+            QueryAggregator(('total_spending', 'num_transactions', 'average_transaction'), self.receipt_totals),
+            QueryAggregator(('total_bonus_savings',), self.bonus_savings),
+            QueryAggregator(('most_bought_items',), lambda: self.most_bought_items(canonical=canonical)),
+            QueryAggregator(('spending_by_day',), self.spending_by_day),
+            QueryAggregator(('spending_by_category',), lambda: self.spending_by_category(categorize)),
+        ]
+
+    # Ad-hoc queries
+
+    def category_spending(self, category: str, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        """Cents spent on a category between start (inclusive) and end (exclusive), as 'YYYY-MM-DD'"""
+        query = ("SELECT COALESCE(SUM(li.amount_cents), 0) FROM product_categories pc "
+                 "JOIN line_items li ON li.description = pc.description "
+                 "JOIN receipts r ON r.id = li.receipt_id "
+                 "WHERE pc.category = ? AND li.is_spend")
+        params: List[Any] = [category]
+        query, params = self._date_range(query, params, start, end)
+        return self.conn.execute(query, params).fetchone()[0]
+
+    def top_items(self, limit: int = 10, start: Optional[str] = None,
+                  end: Optional[str] = None) -> List[Tuple[str, int]]:
+        """Most bought items between start (inclusive) and end (exclusive), as 'YYYY-MM-DD'"""
+        # CROSS JOIN pins the join order: narrow receipts by date first, then fetch their line items
+        query = ("SELECT li.description, COUNT(*) FROM receipts r "
+                 "CROSS JOIN line_items li ON li.receipt_id = r.id WHERE li.is_purchase")
+        query, params = self._date_range(query, [], start, end)
+        query += " GROUP BY li.description ORDER BY COUNT(*) DESC, MIN(li.rowid) LIMIT ?"
+        return [tuple(row) for row in self.conn.execute(query, params + [limit])]
+
+    def _date_range(self, query: str, params: List[Any], start: Optional[str], end: Optional[str]):
+        if start:
+            query += " AND r.date >= ?"
+            params.append(start)
+        if end:
+            query += " AND r.date < ?"
+            params.append(end)
+        return query, params